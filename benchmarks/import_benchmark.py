@@ -0,0 +1,85 @@
+"""
+Import-time benchmark: times common rosiellm imports in fresh interpreters and fails if any is over its budget.
+
+The `rosiellm` command, worker processes and code that only reads configuration or cached results pay for every
+import on each start, so the package keeps its heavy dependencies (the OpenAI client, paramiko, cryptography,
+python-dotenv) and the HTTP stack out of import time and loads them when a session is created. Besides the timings,
+each check names the modules its import must not load, which catches regressions regardless of how fast the machine
+is; tests/test_imports.py runs the same checks (without the timings) with the test suite.
+
+Usage:
+    python benchmarks/import_benchmark.py --runs 7 --json imports.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+HEAVY = ('openai', 'paramiko', 'cryptography', 'dotenv')
+# the HTTP stack (httpx, or httpx2 for openai 3) is loaded once a RosieLLM creates its first client
+LIGHT = HEAVY + ('httpx', 'httpx2')
+# (import statement, budget in ms for the import itself, modules it must not load)
+CHECKS = [
+    ('import rosiellm', 50, LIGHT),
+    ('import rosiellm.RosieCLI', 50, LIGHT),
+    ('from rosiellm.RosiePresets import VLLMOptions', 50, LIGHT),
+    ('from rosiellm.RosieSizing import plan_job', 50, LIGHT),
+    ('from rosiellm.RosieCache import ResponseCache', 50, LIGHT),
+    ('from rosiellm import HTTPConfig', 50, LIGHT),
+    # the client classes themselves, whose features are imported by the methods that use them
+    ('from rosiellm import RosieLLM', 100, LIGHT + ('asyncio',)),
+    ('from rosiellm import RosieLLMPool', 100, LIGHT + ('asyncio',)),
+]
+
+# runs in the child interpreter: time the statement, then report which of the watched modules it loaded
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {watched!r} if m in sys.modules]}}))
+"""
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per import (the median is used).')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='Multiply every budget, e.g. on slow CI machines.')
+    parser.add_argument('--json', help='Write the results to this file.')
+    return parser.parse_args()
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+def probe(statement, watched):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    code = PROBE.format(statement=statement, watched=tuple(watched))
+    out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    args = parse_args()
+    results = []
+    failed = False
+    print(f"{'import':<48}  {'median':>8}  {'budget':>8}")
+    for statement, budget, forbidden in CHECKS:
+        runs = [probe(statement, forbidden) for _ in range(args.runs)]
+        seconds = median([r['seconds'] for r in runs])
+        loaded = sorted(set(m for r in runs for m in r['loaded']))
+        budget_ms = budget * args.budget_scale
+        ok = seconds * 1000 <= budget_ms and not loaded
+        failed |= not ok
+        note = '' if ok else (f"  loads {', '.join(loaded)}" if loaded else '  over budget')
+        print(f"{statement:<48}  {seconds * 1000:7.1f}ms  {budget_ms:7.0f}ms{note}")
+        results.append({'import': statement, 'median_ms': seconds * 1000, 'budget_ms': budget_ms,
+                        'loaded': loaded, 'ok': ok})
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
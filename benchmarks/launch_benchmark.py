@@ -0,0 +1,95 @@
+"""
+Startup benchmark: launches RosieLLM against a local fake of Rosie and reports how long each launch phase takes.
+
+The fake cluster (rosiellm.RosieMock) speaks SSH/SFTP, emulates sbatch/squeue/sacct/scancel, writes a vLLM
+startup log and serves a mock OpenAI-compatible endpoint, so the client-side launch path (auth, SSH, sbatch
+upload and submit, queue polling, log tailing, health checks) can be measured without a GPU or cluster access.
+The remote delays are synthetic and configurable; what the benchmark measures is the overhead the client adds
+on top of them.
+
+Usage:
+    python benchmarks/launch_benchmark.py --runs 5 --queue-delay 1 --model-load-delay 2 --json results.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='Number of launches to time.')
+    parser.add_argument('--queue-delay', type=float, default=1.0, help='Seconds each job stays PENDING.')
+    parser.add_argument('--container-delay', type=float, default=1.0, help='Seconds until vllm is available in the container.')
+    parser.add_argument('--model-load-delay', type=float, default=2.0, help='Seconds spent loading weights.')
+    parser.add_argument('--cuda-graph-delay', type=float, default=0.5, help='Seconds spent capturing CUDA graphs.')
+    parser.add_argument('--server-start-delay', type=float, default=0.5, help='Seconds until Uvicorn is serving.')
+    parser.add_argument('--poll-interval', type=float, default=0.25, help='Seconds between log reads and health checks.')
+    parser.add_argument('--json', help='Write every run\'s report to this file.')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # keep the benchmark's sessions and node rankings out of ~/.rosiellm
+    os.environ.setdefault('ROSIELLM_STATE_DIR', tempfile.mkdtemp(prefix='rosiellm-bench-'))
+    import importlib
+    from rosiellm import RosieLLM
+    from rosiellm.RosieMock import MockVLLMServer, FakeRosieCluster
+    from rosiellm.RosieMetrics import percentile
+    from rosiellm.RosieSSH import RosieSSH, RosieAuth
+    from rosiellm.RosieTiming import LaunchTimer
+
+    vllm = MockVLLMServer(healthy=False).start()
+    # route the health checks and the OpenAI client to the mock server instead of Open OnDemand
+    importlib.import_module('rosiellm.RosieLLM').ROSIE_WEB_URL = vllm.url
+    cluster = FakeRosieCluster(vllm=vllm,
+                               queue_delay=args.queue_delay,
+                               container_delay=args.container_delay,
+                               model_load_delay=args.model_load_delay,
+                               cuda_graph_delay=args.cuda_graph_delay,
+                               server_start_delay=args.server_start_delay).start()
+
+    reports = []
+    try:
+        for run in range(args.runs):
+            vllm.healthy = False
+            ssh_timer = LaunchTimer()
+            start = time.perf_counter()
+            with ssh_timer.phase('key_derivation'):
+                auth = RosieAuth(cluster.username, cluster.password)
+            rosie_ssh = RosieSSH(cluster.username, cluster.address, rosie_auth=auth, timer=ssh_timer)
+            rosie_ssh.connect()
+            llm = RosieLLM(job_name=f'bench-{run}', rosie_ssh=rosie_ssh, reattach=False, use_as_openai_client=False)
+            ready = llm.wait_until_ready(on_event=lambda event: None, poll_interval=args.poll_interval, timeout=120)
+            wall = time.perf_counter() - start
+
+            report = llm.launch_report()
+            report['phases'] = {**ssh_timer.report()['phases'], **report['phases']}
+            report['wall'] = wall
+            report['ready'] = ready
+            reports.append(report)
+            print(f"run {run + 1}/{args.runs}: {'ready' if ready else 'NOT READY'} in {wall:.3f}s")
+
+            llm.close()
+            llm.manager.cancel_vllm_server()
+            llm.manager.poller.stop()
+            rosie_ssh.close()
+    finally:
+        cluster.stop()
+
+    phases = list(dict.fromkeys(name for report in reports for name in report['phases']))
+    width = max([len(name) for name in phases] + [5])
+    print(f"\n{'phase':<{width}}  {'p50':>8}  {'p90':>8}  {'max':>8}")
+    for name in phases + ['wall']:
+        values = [r['wall'] if name == 'wall' else r['phases'][name] for r in reports if name == 'wall' or name in r['phases']]
+        print(f"{name:<{width}}  {percentile(values, 0.5):8.3f}  {percentile(values, 0.9):8.3f}  {max(values):8.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'runs': reports}, f, indent=2)
+    return 0 if all(r['ready'] for r in reports) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
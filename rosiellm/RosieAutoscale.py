@@ -0,0 +1,130 @@
+import time
+import logging
+from threading import Thread, Event
+from typing import Optional
+
+from rosiellm.RosieMetrics import percentile
+
+logger = logging.getLogger(__name__)
+
+class Autoscaler:
+    """
+    Grows and shrinks a RosieLLMPool with its load, so GPUs on the shared partition are only held while they're used.
+    Every `interval` seconds it looks at the pool's client-side signals:
+      - queueing delay, estimated as the median latency of recent requests minus the uncongested latency
+        (the lowest 10th percentile seen so far), and
+      - requests in flight per running replica.
+    If either crosses its threshold another replica is launched, one at a time: none while a replica is still being
+    submitted or loading its model. Running replicas that have been idle for `idle_timeout` seconds (counted from
+    when they came up at the earliest) are cancelled, down to `min_replicas` running ones, which are always kept warm.
+    """
+    def __init__(self,
+                 pool,
+                 min_replicas: int = 1,
+                 max_replicas: int = 4,
+                 queue_delay_threshold: float = 2.0,
+                 max_in_flight: int = 32,
+                 idle_timeout: float = 900.0,
+                 window: float = 60.0,
+                 interval: float = 10.0):
+        """
+        Initialize the autoscaler (call start() to begin scaling).
+        Args:
+            pool (RosieLLMPool): The pool to scale.
+            min_replicas (int, optional): Replicas always kept running. Defaults to 1.
+            max_replicas (int, optional): Upper bound on replicas, including ones being launched. Defaults to 4.
+            queue_delay_threshold (float, optional): Estimated queueing delay (seconds) that triggers a new replica. Defaults to 2.
+            max_in_flight (int, optional): Requests in flight per running replica that trigger a new replica. Defaults to 32.
+            idle_timeout (float, optional): Seconds without requests after which a replica is cancelled. Defaults to 900.
+            window (float, optional): Seconds of request latencies the queueing delay is estimated from. Defaults to 60.
+            interval (float, optional): Seconds between scaling decisions. Defaults to 10.
+        """
+        if not 1 <= min_replicas <= max_replicas:
+            raise ValueError("Autoscaler needs 1 <= min_replicas <= max_replicas.")
+        self.pool = pool
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.queue_delay_threshold = queue_delay_threshold
+        self.max_in_flight = max_in_flight
+        self.idle_timeout = idle_timeout
+        self.window = window
+        self.interval = interval
+        self.baseline = None
+        self._running_since = {} # id(replica) -> when it was first seen running
+        self._stop = Event()
+        self._thread = None
+
+    def start(self) -> 'Autoscaler':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = Thread(target=self._run, name='RosieAutoscaler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def queue_delay(self) -> Optional[float]:
+        """
+        The estimated time recent requests spent queued, or None without recent requests.
+        """
+        latencies = self.pool.recent_latencies(self.window)
+        if not latencies:
+            return None
+        floor = percentile(latencies, 0.1)
+        self.baseline = floor if self.baseline is None else min(self.baseline, floor)
+        return max(0.0, percentile(latencies, 0.5) - self.baseline)
+
+    def step(self) -> Optional[str]:
+        """
+        Makes one scaling decision and starts acting on it.
+        Returns:
+            str: "scale_up", "scale_down" or None.
+        """
+        pool = self.pool
+        replicas = list(pool.replicas)
+        total = len(replicas) + pool.launching
+        running = pool.running_replicas()
+        # replicas still loading their model will take load soon, launching more for the same demand would overshoot
+        pending = pool.launching + sum(1 for r in replicas if not r.isRunning)
+        in_flight = sum(pool.in_flight)
+        delay = self.queue_delay()
+        per_replica = in_flight / max(1, len(running))
+        now = time.time()
+        self._running_since = {id(r): self._running_since.get(id(r), now) for r in running}
+
+        if total < self.min_replicas:
+            return self._scale_up(f"only {total} of {self.min_replicas} warm replicas")
+        if total < self.max_replicas and not pending:
+            if delay is not None and delay > self.queue_delay_threshold:
+                return self._scale_up(f"estimated queueing delay is {delay:.1f}s")
+            if running and per_replica > self.max_in_flight:
+                return self._scale_up(f"{per_replica:.0f} requests in flight per replica")
+
+        if len(running) > self.min_replicas:
+            # a replica's requests only start once it's running, so it isn't idle for longer than it has been up
+            idle = [(min(pool.idle_seconds(r), now - self._running_since[id(r)]), r) for r in running]
+            seconds, replica = max(idle, key=lambda item: item[0])
+            if seconds >= self.idle_timeout:
+                logger.info(f"Scaling down: {replica.manager.job_name} has been idle for {seconds:.0f}s")
+                Thread(target=pool.remove_replica, args=(replica,), daemon=True).start()
+                return 'scale_down'
+        return None
+
+    def _scale_up(self, reason: str) -> str:
+        logger.info(f"Scaling up: {reason}")
+        Thread(target=self._add_replica, daemon=True).start()
+        return 'scale_up'
+
+    def _add_replica(self) -> None:
+        try:
+            self.pool.add_replica()
+        except Exception as e:
+            logger.error(f"Failed to launch a replica: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except Exception as e:
+                logger.warning(f"Autoscaler step failed: {e}")
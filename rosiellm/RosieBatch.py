@@ -0,0 +1,220 @@
+import os
+import json
+import queue
+import random
+import asyncio
+import logging
+from dataclasses import dataclass
+from threading import Thread, Event
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    import openai
+    from openai.types.chat import ChatCompletion
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BatchResult:
+    """
+    The outcome of one request in a batch.
+    Attributes:
+        index (int): The position of the request in the batch.
+        request (dict): The request that was sent (None for results loaded from a checkpoint).
+        response (ChatCompletion): The completion, or None if the request failed.
+        error (Exception): The last error if the request failed after all retries, otherwise None.
+        attempts (int): How many times the request was sent (0 for results loaded from a checkpoint).
+    """
+    index: int
+    request: Optional[Dict[str, Any]] = None
+    response: Optional['ChatCompletion'] = None
+    error: Optional[Exception] = None
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether a failed request is worth retrying: connection errors, timeouts, 429s and 5xx responses.
+    """
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def load_checkpoint(path: str) -> Dict[int, 'ChatCompletion']:
+    """
+    Reads the completed results of a previous run from a JSONL checkpoint.
+    Args:
+        path (str): The checkpoint file. A missing file is treated as empty.
+    Returns:
+        dict: The saved completions, keyed by request index.
+    """
+    from openai.types.chat import ChatCompletion
+
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if 'error' in entry:
+                    # a request an offline batch (see RosieOffline) couldn't run, sent again
+                    continue
+                done[int(entry['index'])] = ChatCompletion.model_validate(entry['response'])
+            except (ValueError, KeyError, TypeError) as e:
+                # a partial last line is expected if the previous run was interrupted mid-write
+                logger.warning(f"Skipping unreadable line {line_num} of checkpoint {path}: {e}")
+    return done
+
+async def run_batch(client: 'openai.AsyncOpenAI',
+                    requests: Iterable[Dict[str, Any]],
+                    max_concurrency: int = 32,
+                    ordered: bool = False,
+                    max_retries: int = 3,
+                    checkpoint: str = None,
+                    backoff: float = 1.0,
+                    max_backoff: float = 30.0) -> AsyncIterator[BatchResult]:
+    """
+    Sends chat completion requests with at most max_concurrency in flight, yielding results as they finish.
+    Requests are pulled from the iterable lazily, so it can be a generator over a large dataset.
+    Args:
+        client (AsyncOpenAI): The client to send requests with.
+        requests (Iterable[dict]): Keyword arguments for chat.completions.create, one dict per request.
+        max_concurrency (int): The maximum number of requests in flight at once.
+        ordered (bool): If True, results are yielded in request order.
+        max_retries (int): How many times a transient failure is retried, with exponential backoff and jitter.
+        checkpoint (str, optional): A JSONL file completed results are appended to and resumed from.
+        backoff (float): Seconds to wait before the first retry.
+        max_backoff (float): Upper bound on the wait between retries.
+    Returns:
+        AsyncIterator[BatchResult]: The results.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+    done = load_checkpoint(checkpoint) if checkpoint else {}
+    checkpoint_file = open(checkpoint, 'a') if checkpoint else None
+    # bounded so workers wait for a slow consumer instead of buffering every result
+    results: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency)
+    pending = iter(enumerate(requests))
+
+    async def send(index: int, request: Dict[str, Any]) -> BatchResult:
+        for attempt in range(1, max_retries + 2):
+            try:
+                response = await client.chat.completions.create(**request)
+                return BatchResult(index, request, response=response, attempts=attempt)
+            except Exception as e:
+                if attempt > max_retries or not is_transient(e):
+                    return BatchResult(index, request, error=e, attempts=attempt)
+                delay = min(max_backoff, backoff * 2 ** (attempt - 1))
+                logger.info(f"Request {index} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def worker() -> None:
+        for index, request in pending:
+            if index in done:
+                await results.put(BatchResult(index, response=done.pop(index)))
+                continue
+            await results.put(await send(index, request))
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+    finished = asyncio.ensure_future(asyncio.gather(*workers))
+    finished.add_done_callback(lambda _: asyncio.ensure_future(results.put(None)))
+
+    buffer: Dict[int, BatchResult] = {}
+    next_index = 0
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            if checkpoint_file and result.ok and result.attempts:
+                checkpoint_file.write(json.dumps({'index': result.index, 'response': result.response.model_dump()}) + '\n')
+                checkpoint_file.flush()
+            if not ordered:
+                yield result
+                continue
+            buffer[result.index] = result
+            while next_index in buffer:
+                yield buffer.pop(next_index)
+                next_index += 1
+        # surface errors raised by the request iterable itself
+        finished.result()
+    finally:
+        for w in workers:
+            w.cancel()
+        if checkpoint_file:
+            checkpoint_file.close()
+
+_DONE = object()
+
+def iterate_in_thread(make_iterator: Callable[[Any], AsyncIterator], make_client: Callable[[], Any],
+                      max_buffered: int = 32) -> Iterator:
+    """
+    Drives an async iterator on a private event loop in a background thread and yields its items synchronously.
+    This works whether or not the caller already has a running event loop (e.g. in a notebook).
+    Args:
+        make_iterator (Callable): Builds the async iterator from a client created on the background loop.
+        make_client (Callable): Builds the async client, which must be bound to the loop that uses it.
+        max_buffered (int): The most items waiting for the caller. Once reached, the async iterator is paused
+            until the caller catches up, so a slow consumer doesn't end up holding every result in memory.
+    Returns:
+        Iterator: The items of the async iterator.
+    """
+    items = queue.Queue(maxsize=max(1, max_buffered))
+    stop = Event()
+
+    def offer(item: Any) -> bool:
+        # blocks while the buffer is full, gives up once the caller has stopped iterating
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def drive() -> None:
+        client = make_client()
+        try:
+            iterator = make_iterator(client)
+            try:
+                async for item in iterator:
+                    try:
+                        items.put_nowait(item)
+                    except queue.Full:
+                        if not await asyncio.to_thread(offer, item):
+                            break
+                    if stop.is_set():
+                        break
+            finally:
+                await iterator.aclose()
+        finally:
+            await client.close()
+
+    def run() -> None:
+        try:
+            asyncio.run(drive())
+        except BaseException as e:
+            offer(e)
+        finally:
+            offer(_DONE)
+
+    thread = Thread(target=run, name='RosieBatch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
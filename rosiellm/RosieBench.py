@@ -0,0 +1,259 @@
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+from rosiellm.RosieMetrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# filler for synthetic prompts; most tokenizers encode each of these as one token
+PROMPT_WORDS = ('the', 'of', 'and', 'to', 'in', 'is', 'for', 'on', 'that', 'with', 'as', 'it', 'at', 'by', 'from',
+                'this', 'be', 'are', 'or', 'an', 'was', 'not', 'but', 'all', 'can', 'one', 'more', 'has', 'new', 'time')
+PERCENTILES = (0.5, 0.9, 0.99)
+
+@dataclass(frozen=True)
+class LengthDistribution:
+    """
+    A distribution of token counts, written as "N" (always N), "uniform:LOW:HIGH" or "normal:MEAN:STDDEV".
+    Samples are rounded and at least 1.
+    """
+    kind: str
+    a: float
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LengthDistribution':
+        kind, *values = str(spec).split(':')
+        try:
+            if not values:
+                return cls('fixed', int(kind))
+            if kind in ('uniform', 'normal') and len(values) == 2:
+                dist = cls(kind, float(values[0]), float(values[1]))
+                if kind == 'uniform' and dist.a > dist.b:
+                    raise ValueError(f"uniform needs LOW <= HIGH, got {spec}")
+                return dist
+        except ValueError as e:
+            raise ValueError(f"Invalid length distribution '{spec}': {e}")
+        raise ValueError(f"Invalid length distribution '{spec}', expected N, uniform:LOW:HIGH or normal:MEAN:STDDEV.")
+
+    def sample(self, rng: random.Random) -> int:
+        if self.kind == 'uniform':
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == 'normal':
+            value = rng.gauss(self.a, self.b)
+        else:
+            value = self.a
+        return max(1, round(value))
+
+    def __str__(self) -> str:
+        return str(int(self.a)) if self.kind == 'fixed' else f"{self.kind}:{self.a:g}:{self.b:g}"
+
+@dataclass
+class BenchConfig:
+    """
+    What a benchmark sends.
+    Attributes:
+        concurrency (int): The most requests in flight at once.
+        rate (float, optional): Requests started per second, with Poisson arrivals. None starts a new request as soon
+            as one finishes (a closed loop at `concurrency`).
+        requests (int, optional): Requests to send. Defaults to 100 unless `duration` is set.
+        duration (float, optional): Seconds to keep starting requests for.
+        prompt_tokens (str): The prompt length distribution (see LengthDistribution).
+        output_tokens (str): The max_tokens distribution.
+        stream (bool): Whether to stream responses, which is needed to measure TTFT.
+        ignore_eos (bool): Ask vLLM to generate exactly max_tokens, so output lengths follow the distribution.
+        model (str, optional): The model to request. Defaults to the first one the server lists.
+        seed (int): Seeds the lengths, prompts and arrival times, so runs are comparable.
+    """
+    concurrency: int = 8
+    rate: Optional[float] = None
+    requests: Optional[int] = None
+    duration: Optional[float] = None
+    prompt_tokens: str = '128'
+    output_tokens: str = '128'
+    stream: bool = True
+    ignore_eos: bool = True
+    model: Optional[str] = None
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {self.concurrency}.")
+        if self.rate is not None and self.rate <= 0:
+            raise ValueError(f"rate must be positive, got {self.rate}.")
+        if self.requests is None and self.duration is None:
+            self.requests = 100
+        # fail on a bad spec before any request is sent
+        LengthDistribution.parse(self.prompt_tokens)
+        LengthDistribution.parse(self.output_tokens)
+
+@dataclass
+class RequestResult:
+    """
+    One benchmark request. Times are seconds since the benchmark started.
+    """
+    start: float
+    end: float
+    ttft: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    error: Optional[str] = None
+
+    @property
+    def latency(self) -> float:
+        return self.end - self.start
+
+    @property
+    def tpot(self) -> Optional[float]:
+        # time per output token after the first
+        if self.ttft is None or self.completion_tokens < 2:
+            return None
+        return (self.latency - self.ttft) / (self.completion_tokens - 1)
+
+@dataclass
+class BenchReport:
+    """
+    The results of a benchmark run, summarized by summary() and printed by str().
+    """
+    config: BenchConfig
+    target: str
+    duration: float
+    results: List[RequestResult]
+
+    def summary(self) -> Dict[str, Any]:
+        ok = [r for r in self.results if r.error is None]
+        completion_tokens = sum(r.completion_tokens for r in ok)
+        prompt_tokens = sum(r.prompt_tokens for r in ok)
+        duration = max(self.duration, 1e-9)
+        errors = {}
+        for r in self.results:
+            if r.error is not None:
+                errors[r.error] = errors.get(r.error, 0) + 1
+        return {
+            'requests': len(self.results),
+            'completed': len(ok),
+            'failed': len(self.results) - len(ok),
+            'duration': self.duration,
+            'request_throughput': len(ok) / duration,
+            'output_token_throughput': completion_tokens / duration,
+            'total_token_throughput': (prompt_tokens + completion_tokens) / duration,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency': _distribution([r.latency for r in ok]),
+            'ttft': _distribution([r.ttft for r in ok if r.ttft is not None]),
+            'tpot': _distribution([r.tpot for r in ok if r.tpot is not None]),
+            'errors': errors,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'target': self.target,
+            'config': asdict(self.config),
+            'summary': self.summary(),
+        }
+
+    def __str__(self) -> str:
+        s = self.summary()
+        lines = [
+            f"Target:            {self.target}",
+            f"Requests:          {s['completed']} completed, {s['failed']} failed in {s['duration']:.2f}s",
+            f"Throughput:        {s['request_throughput']:.2f} req/s, {s['output_token_throughput']:.1f} output tokens/s, "
+            f"{s['total_token_throughput']:.1f} total tokens/s",
+        ]
+        for name, label in (('latency', 'Latency'), ('ttft', 'TTFT'), ('tpot', 'Time per token')):
+            d = s[name]
+            if d['count']:
+                lines.append(f"{label + ':':<19}" + ', '.join(f"{key} {d[key] * 1000:.1f}ms"
+                                                              for key in ('mean', 'p50', 'p90', 'p99', 'max')))
+        for error, count in s['errors'].items():
+            lines.append(f"Error ({count}x):       {error}")
+        return '\n'.join(lines)
+
+def _distribution(values: List[float]) -> Dict[str, Optional[float]]:
+    summary = {'count': len(values), 'mean': sum(values) / len(values) if values else None}
+    for q in PERCENTILES:
+        summary[f'p{q * 100:g}'] = percentile(values, q) if values else None
+    summary['max'] = max(values) if values else None
+    return summary
+
+def make_prompt(index: int, n_tokens: int, rng: random.Random) -> str:
+    # the request index comes first, so prefix caching can't serve one request's prompt from another's
+    return ' '.join([f'{index}:'] + [rng.choice(PROMPT_WORDS) for _ in range(n_tokens - 1)])
+
+async def run_benchmark(client, config: BenchConfig, target: str = '') -> BenchReport:
+    """
+    Sends synthetic chat completions to an OpenAI-compatible endpoint and times them.
+    Args:
+        client (AsyncOpenAI): The client to send them with, e.g. RosieLLM.create_openai_client(async_client=True).
+        config (BenchConfig): What to send.
+        target (str, optional): A description of the endpoint, for the report.
+    Returns:
+        BenchReport: Every request's timings.
+    """
+    rng = random.Random(config.seed)
+    prompt_lengths = LengthDistribution.parse(config.prompt_tokens)
+    output_lengths = LengthDistribution.parse(config.output_tokens)
+    model = config.model
+    if model is None:
+        model = (await client.models.list()).data[0].id
+        logger.info(f"Benchmarking model {model}")
+
+    results: List[RequestResult] = []
+    slots = asyncio.Semaphore(config.concurrency)
+    bench_start = time.perf_counter()
+
+    async def send(index: int, prompt: str, prompt_tokens: int, max_tokens: int) -> None:
+        start = time.perf_counter()
+        result = RequestResult(start - bench_start, 0.0, prompt_tokens=prompt_tokens)
+        kwargs = dict(model=model, messages=[{'role': 'user', 'content': prompt}], max_tokens=max_tokens,
+                      temperature=0.0, stream=config.stream)
+        if config.ignore_eos:
+            kwargs['extra_body'] = {'ignore_eos': True}
+        try:
+            if config.stream:
+                kwargs['stream_options'] = {'include_usage': True}
+                tokens = 0
+                usage = None
+                async for chunk in await client.chat.completions.create(**kwargs):
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if any(choice.delta and choice.delta.content for choice in chunk.choices):
+                        if result.ttft is None:
+                            result.ttft = time.perf_counter() - start
+                        tokens += 1
+                result.completion_tokens = usage.completion_tokens if usage else tokens
+            else:
+                response = await client.chat.completions.create(**kwargs)
+                usage = response.usage
+                result.completion_tokens = usage.completion_tokens if usage else 0
+            if usage and usage.prompt_tokens:
+                result.prompt_tokens = usage.prompt_tokens
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            logger.debug(f"Request {index} failed: {result.error}")
+        finally:
+            result.end = time.perf_counter() - bench_start
+            results.append(result)
+            slots.release()
+
+    tasks = []
+    index = 0
+    while config.requests is None or index < config.requests:
+        if config.rate:
+            await asyncio.sleep(rng.expovariate(config.rate))
+        if config.duration is not None and time.perf_counter() - bench_start >= config.duration:
+            break
+        n_prompt = prompt_lengths.sample(rng)
+        prompt = make_prompt(index, n_prompt, rng)
+        max_tokens = output_lengths.sample(rng)
+        await slots.acquire()
+        tasks.append(asyncio.create_task(send(index, prompt, n_prompt, max_tokens)))
+        index += 1
+    await asyncio.gather(*tasks)
+    duration = time.perf_counter() - bench_start
+    results.sort(key=lambda r: r.start)
+    return BenchReport(config, target, duration, results)
@@ -0,0 +1,211 @@
+"""
+The `rosiellm` command line.
+
+Usage:
+    rosiellm serve --username your_username --port 8000
+    rosiellm bench --mock --concurrency 32 --json results.json
+"""
+import json
+import logging
+import argparse
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+def parse_options(options: List[str]) -> Dict[str, Any]:
+    """
+    Parses "key=value" job configuration options. Values are read as JSON where possible (numbers, null, true),
+    and as strings otherwise.
+    """
+    kwargs = {}
+    for option in options or []:
+        key, sep, value = option.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected key=value, got '{option}'.")
+        try:
+            kwargs[key] = json.loads(value)
+        except json.JSONDecodeError:
+            kwargs[key] = value
+    return kwargs
+
+def add_job_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--job-name', default='RosieLLM', help='The name of the job on Rosie.')
+    parser.add_argument('--username', help='Your Rosie username (prompted for if not set).')
+    parser.add_argument('--management-node', choices=['dh-mgmt1', 'dh-mgmt2', 'dh-mgmt3', 'dh-mgmt4'],
+                        help='The management node to connect through (default: the fastest).')
+    parser.add_argument('--model', help='The HuggingFace model to serve.')
+    parser.add_argument('--preset', choices=['throughput', 'low-latency', 'long-context'],
+                        help='Tune the vLLM server for a workload.')
+    parser.add_argument('--no-reattach', action='store_true', help='Always launch a new job.')
+    parser.add_argument('-o', '--option', action='append', metavar='KEY=VALUE',
+                        help='Any other job configuration option, e.g. -o gpus=4 -o hours=6. Can be repeated.')
+
+def job_kwargs(args: argparse.Namespace) -> Dict[str, Any]:
+    kwargs = parse_options(args.option)
+    if args.model:
+        kwargs['model'] = args.model
+    if args.preset:
+        kwargs['preset'] = args.preset
+    return dict(job_name=args.job_name,
+                rosie_username=args.username,
+                management_node=args.management_node,
+                reattach=not args.no_reattach,
+                log_level=args.log_level.upper(),
+                **kwargs)
+
+def serve(args: argparse.Namespace) -> int:
+    from rosiellm.RosieLLM import RosieLLM
+    from rosiellm.RosiePool import RosieLLMPool
+    from rosiellm.RosieGateway import Gateway
+
+    if args.replicas > 1:
+        backend = RosieLLMPool(replicas=args.replicas, **job_kwargs(args))
+        replicas = backend.replicas
+        if args.max_replicas:
+            backend.autoscale(min_replicas=args.replicas, max_replicas=args.max_replicas)
+    else:
+        backend = RosieLLM(use_as_openai_client=False, **job_kwargs(args))
+        replicas = [backend]
+    try:
+        for replica in replicas:
+            if not replica.wait_until_ready(on_event=lambda e: print(f"[{e.kind}] {e.message}")):
+                print(f"Job {replica.manager.job_id} failed to start, see {replica.manager.out_file}.")
+                return 1
+        gateway = Gateway(backend, host=args.host, port=args.port, max_concurrency=args.max_concurrency,
+                          max_queue=args.max_queue, api_key=args.api_key)
+        print(f"Serving {replicas[0].model} at http://{args.host}:{args.port}/v1 (Ctrl+C to stop)")
+        gateway.run()
+    finally:
+        if args.cancel_on_exit:
+            if isinstance(backend, RosieLLMPool):
+                backend.shutdown()
+            else:
+                backend.close()
+                backend.manager.cancel_vllm_server()
+            print("Cancelled the job.")
+        else:
+            for replica in replicas:
+                replica.close()
+            print("The job keeps running until its time limit; `rosiellm serve` with the same options reattaches to it.")
+    return 0
+
+def bench(args: argparse.Namespace) -> int:
+    import asyncio
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    from rosiellm.RosieBench import BenchConfig, run_benchmark
+    from rosiellm.RosieHTTP import DEFAULT_CONFIG, async_transport
+
+    try:
+        config = BenchConfig(concurrency=args.concurrency, rate=args.rate, requests=args.requests,
+                             duration=args.duration, prompt_tokens=args.prompt_tokens,
+                             output_tokens=args.output_tokens, stream=args.stream, ignore_eos=args.ignore_eos,
+                             model=args.model, seed=args.seed)
+    except ValueError as e:
+        print(e)
+        return 2
+    mock = llm = None
+    if args.mock:
+        from rosiellm.RosieMock import MockVLLMServer
+        mock = MockVLLMServer(ttft=args.mock_ttft, inter_token_latency=args.mock_itl,
+                              prefill_latency=args.mock_prefill).start()
+        base_url, target = f"{mock.url}/v1", f"mock server (ttft={args.mock_ttft}s, itl={args.mock_itl}s)"
+    elif args.base_url:
+        base_url, target = args.base_url, args.base_url
+    else:
+        from rosiellm.RosieLLM import RosieLLM
+        llm = RosieLLM(use_as_openai_client=False, **job_kwargs(args))
+        if not llm.wait_until_ready(on_event=lambda e: print(f"[{e.kind}] {e.message}")):
+            print(f"Job {llm.manager.job_id} failed to start, see {llm.manager.out_file}.")
+            llm.close()
+            return 1
+        config.model = config.model or llm.model
+        target = f"job {llm.manager.job_id} ({llm.model})"
+
+    async def run():
+        if llm is not None:
+            client = llm.create_openai_client(async_client=True)
+        else:
+            # the tuned connection limits, so the client doesn't cap concurrency at httpx's default pool size
+            http_client = DefaultAsyncHttpxClient(transport=async_transport(), timeout=DEFAULT_CONFIG.timeout)
+            client = AsyncOpenAI(base_url=base_url, api_key=args.api_key or 'None', http_client=http_client)
+        try:
+            return await run_benchmark(client, config, target)
+        finally:
+            await client.close()
+
+    try:
+        report = asyncio.run(run())
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if mock:
+            mock.stop()
+        if llm:
+            llm.close()
+    print(report)
+    if args.json:
+        data = json.dumps(report.to_dict(), indent=2)
+        if args.json == '-':
+            print(data)
+        else:
+            with open(args.json, 'w') as f:
+                f.write(data + '\n')
+    return 0 if report.summary()['completed'] else 1
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='rosiellm', description='Run language models on Rosie.')
+    parser.add_argument('--log-level', default='WARNING', help='Logging level (default: WARNING).')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='Serve a Rosie job as a local OpenAI-compatible endpoint.',
+                                       description='Launches (or reattaches to) a vLLM job on Rosie and serves it at '
+                                                   'http://HOST:PORT/v1, so any OpenAI client can share the job.')
+    add_job_arguments(serve_parser)
+    serve_parser.add_argument('--host', default='127.0.0.1', help='The address to listen on (default: 127.0.0.1).')
+    serve_parser.add_argument('--port', type=int, default=8000, help='The port to listen on (default: 8000).')
+    serve_parser.add_argument('--replicas', type=int, default=1, help='Jobs to run behind the gateway (default: 1).')
+    serve_parser.add_argument('--max-replicas', type=int,
+                              help='Autoscale between --replicas and this many jobs with the load.')
+    serve_parser.add_argument('--max-concurrency', type=int, default=256,
+                              help='Requests sent to Rosie at once, the rest are queued (default: 256).')
+    serve_parser.add_argument('--max-queue', type=int, default=1024,
+                              help='Requests allowed to wait before new ones are refused with a 503 (default: 1024).')
+    serve_parser.add_argument('--api-key', help='Require local clients to send this API key.')
+    serve_parser.add_argument('--cancel-on-exit', action='store_true', help='Cancel the job(s) when the gateway stops.')
+    serve_parser.set_defaults(func=serve)
+
+    bench_parser = commands.add_parser('bench', help='Load test an OpenAI-compatible endpoint.',
+                                       description='Sends synthetic chat completions to a Rosie job (launched or '
+                                                   'reattached with the job options), any OpenAI-compatible endpoint '
+                                                   '(--base-url, e.g. `rosiellm serve`) or a local mock server '
+                                                   '(--mock), and reports throughput and latency percentiles. '
+                                                   'Lengths are N, uniform:LOW:HIGH or normal:MEAN:STDDEV.')
+    add_job_arguments(bench_parser)
+    target = bench_parser.add_mutually_exclusive_group()
+    target.add_argument('--base-url', help='Benchmark this endpoint, e.g. http://127.0.0.1:8000/v1.')
+    target.add_argument('--mock', action='store_true', help='Benchmark a local mock server, measuring client overhead.')
+    bench_parser.add_argument('--api-key', help='The API key for --base-url.')
+    bench_parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at most (default: 8).')
+    bench_parser.add_argument('--rate', type=float,
+                              help='Requests per second, Poisson distributed (default: as fast as --concurrency allows).')
+    bench_parser.add_argument('--requests', type=int, help='Requests to send (default: 100 unless --duration is set).')
+    bench_parser.add_argument('--duration', type=float, help='Seconds to keep sending requests.')
+    bench_parser.add_argument('--prompt-tokens', default='128', help='Prompt length distribution (default: 128).')
+    bench_parser.add_argument('--output-tokens', default='128', help='Output length distribution (default: 128).')
+    bench_parser.add_argument('--stream', action=argparse.BooleanOptionalAction, default=True,
+                              help='Stream responses, needed for TTFT (default: on).')
+    bench_parser.add_argument('--ignore-eos', action=argparse.BooleanOptionalAction, default=True,
+                              help='Always generate the full output length (vLLM only, default: on).')
+    bench_parser.add_argument('--seed', type=int, default=0, help='Seed for lengths, prompts and arrivals (default: 0).')
+    bench_parser.add_argument('--json', metavar='PATH', help='Also write the report as JSON to PATH ("-" for stdout).')
+    bench_parser.add_argument('--mock-ttft', type=float, default=0.0, help='The mock server\'s time to first token.')
+    bench_parser.add_argument('--mock-itl', type=float, default=0.0, help='The mock server\'s seconds between tokens.')
+    bench_parser.add_argument('--mock-prefill', type=float, default=0.0,
+                              help='The mock server\'s extra seconds before the first token per prompt token.')
+    bench_parser.set_defaults(func=bench)
+    return parser
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+    return args.func(args)
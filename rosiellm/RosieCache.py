@@ -0,0 +1,452 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Union
+
+
+from rosiellm.RosieSession import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+# request arguments that change how a response is delivered, not what it contains
+TRANSPORT_KEYS = ('stream', 'stream_options', 'timeout', 'extra_headers', 'extra_query', 'extra_body', 'user')
+
+def cache_key(request: Dict[str, Any]) -> Optional[str]:
+    """
+    Builds a canonical hash of a chat completion request.
+    Only deterministic requests (temperature 0 or a fixed seed) are cacheable.
+    Args:
+        request (dict): The keyword arguments passed to chat.completions.create.
+    Returns:
+        str: The hex digest identifying the request, or None if the request isn't deterministic.
+    """
+    if request.get('temperature') != 0 and request.get('seed') is None:
+        return None
+    canonical = {k: v for k, v in request.items() if k not in TRANSPORT_KEYS and v is not None}
+    payload = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    A two-tier cache of chat completions: an in-memory LRU in front of an on-disk SQLite store.
+    The disk tier is bounded by total size (least recently used entries are evicted first)
+    and entries in both tiers expire after an optional TTL.
+    """
+    def __init__(self,
+                 path: str = None,
+                 max_memory_entries: int = 1024,
+                 max_disk_bytes: int = 256 * 1024 * 1024,
+                 ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+        Args:
+            path (str, optional): The SQLite file. Defaults to cache.sqlite in the RosieLLM state directory.
+                Pass ":memory:" to keep the disk tier in memory too.
+            max_memory_entries (int, optional): Entries kept in the in-memory LRU. Defaults to 1024.
+            max_disk_bytes (int, optional): Upper bound on the size of the stored responses. Defaults to 256 MiB.
+            ttl (float, optional): Seconds an entry stays valid. Defaults to None (never expires).
+        """
+        self.path = path or os.path.join(STATE_DIR, 'cache.sqlite')
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.evictions = 0
+
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+            # private, like the session registry; SQLite gives its -wal and -shm files the same mode
+            os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                    key TEXT PRIMARY KEY,
+                                    value TEXT NOT NULL,
+                                    size INTEGER NOT NULL,
+                                    created REAL NOT NULL,
+                                    accessed REAL NOT NULL)''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS responses_created ON responses (created)')
+        # the size of the stored responses, kept up to date on every write instead of summed over the table
+        self._disk_bytes = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Looks up a response.
+        Args:
+            key (str): The request key from cache_key().
+        Returns:
+            dict: The cached ChatCompletion as a dict, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return entry[0]
+
+            row = self._db.execute('SELECT value, created, size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    with self._db:
+                        self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    self._disk_bytes -= row[2]
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+            with self._db:
+                self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Stores a response in both tiers, evicting the least recently used disk entries if over budget.
+        Args:
+            key (str): The request key from cache_key().
+            value (dict): The ChatCompletion as a dict.
+        """
+        now = time.time()
+        payload = json.dumps(value, separators=(',', ':'))
+        with self._lock:
+            self._remember(key, value, now)
+            with self._db:
+                replaced = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+                self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                                 (key, payload, len(payload), now, now))
+                self._disk_bytes += len(payload) - (replaced[0] if replaced else 0)
+                self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            with self._db:
+                self._db.execute('DELETE FROM responses')
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the hit/miss counters and the current size of each tier.
+        """
+        with self._lock:
+            entries, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.hits - self.memory_hits,
+                'evictions': self.evictions,
+                'memory_entries': len(self._memory),
+                'disk_entries': entries,
+                'disk_bytes': size,
+            }
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key: str, value: Dict[str, Any], created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        if self.ttl is not None:
+            cutoff = time.time() - self.ttl
+            expired = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses WHERE created < ?', (cutoff,)).fetchone()[0]
+            if expired:
+                self.evictions += self._db.execute('DELETE FROM responses WHERE created < ?', (cutoff,)).rowcount
+                self._disk_bytes -= expired
+        while self._disk_bytes > self.max_disk_bytes:
+            row = self._db.execute('SELECT key, size FROM responses ORDER BY accessed LIMIT 1').fetchone()
+            if row is None:
+                self._disk_bytes = 0
+                break
+            self._db.execute('DELETE FROM responses WHERE key = ?', (row[0],))
+            self._memory.pop(row[0], None)
+            self._disk_bytes -= row[1]
+            self.evictions += 1
+
+class CachedOpenAI:
+    """
+    Wraps an OpenAI or AsyncOpenAI client so deterministic chat completions are served from a ResponseCache.
+    Everything other than chat.completions.create is passed straight through to the wrapped client.
+    Streaming requests work unchanged: misses are recorded as the stream is consumed, and hits are
+    replayed as a stream of chunks.
+    """
+    def __init__(self, client: Any, cache: ResponseCache):
+        self._client = client
+        self.cache = cache
+        from openai import AsyncOpenAI
+
+        self.is_async = getattr(client, 'is_async', None) or isinstance(client, AsyncOpenAI)
+        self.chat = _CachedChat(self)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+class _CachedChat:
+    def __init__(self, owner: CachedOpenAI):
+        self._owner = owner
+        self.completions = _CachedCompletions(owner)
+
+    def __getattr__(self, name):
+        return getattr(self._owner._client.chat, name)
+
+class _CachedCompletions:
+    def __init__(self, owner: CachedOpenAI):
+        self._owner = owner
+
+    def __getattr__(self, name):
+        return getattr(self._owner._client.chat.completions, name)
+
+    def create(self, **kwargs):
+        if self._owner.is_async:
+            return self._acreate(**kwargs)
+        from openai.types.chat import ChatCompletion
+
+        create = self._owner._client.chat.completions.create
+        cache = self._owner.cache
+        key = cache_key(kwargs)
+        if key is None:
+            return create(**kwargs)
+        cached = cache.get(key)
+        if cached is not None and _replayable(cached, kwargs):
+            return _Replay(cached, _include_usage(kwargs)) if kwargs.get('stream') else ChatCompletion.model_validate(cached)
+        response = create(**kwargs)
+        if kwargs.get('stream'):
+            return _RecordingStream(response, lambda completion: cache.put(key, completion))
+        cache.put(key, response.model_dump())
+        return response
+
+    async def _acreate(self, **kwargs):
+        from openai.types.chat import ChatCompletion
+
+        create = self._owner._client.chat.completions.create
+        cache = self._owner.cache
+        key = cache_key(kwargs)
+        if key is None:
+            return await create(**kwargs)
+        cached = cache.get(key)
+        if cached is not None and _replayable(cached, kwargs):
+            return _AsyncReplay(cached, _include_usage(kwargs)) if kwargs.get('stream') else ChatCompletion.model_validate(cached)
+        response = await create(**kwargs)
+        if kwargs.get('stream'):
+            return _RecordingAsyncStream(response, lambda completion: cache.put(key, completion))
+        cache.put(key, response.model_dump())
+        return response
+
+def _include_usage(request: Dict[str, Any]) -> bool:
+    return bool((request.get('stream_options') or {}).get('include_usage'))
+
+def _replayable(completion: Dict[str, Any], request: Dict[str, Any]) -> bool:
+    # a completion recorded from a stream without usage can't answer a stream that asks for it
+    return not (request.get('stream') and _include_usage(request) and completion.get('usage') is None)
+
+def replay_stream(completion: Dict[str, Any], include_usage: bool = False):
+    """
+    Replays a cached completion as streaming chunks: one chunk with each choice's message (content, refusal and
+    tool calls) and logprobs, then one with its finish reason. With include_usage (the request's
+    stream_options={'include_usage': True}), a last chunk without choices carries the usage, like a live stream.
+    """
+    from openai.types.chat import ChatCompletionChunk
+
+    base = {'id': completion['id'], 'object': 'chat.completion.chunk',
+            'created': completion['created'], 'model': completion['model']}
+    for choice in completion['choices']:
+        message = choice.get('message') or {}
+        delta = {'role': message.get('role', 'assistant'), 'content': message.get('content')}
+        if message.get('refusal') is not None:
+            delta['refusal'] = message['refusal']
+        if message.get('tool_calls'):
+            delta['tool_calls'] = [{'index': i, **call} for i, call in enumerate(message['tool_calls'])]
+        yield ChatCompletionChunk.model_validate({**base, 'choices': [
+            {'index': choice['index'], 'delta': delta, 'logprobs': choice.get('logprobs')}]})
+        yield ChatCompletionChunk.model_validate({**base, 'choices': [
+            {'index': choice['index'], 'delta': {}, 'finish_reason': choice.get('finish_reason')}]})
+    if include_usage:
+        yield ChatCompletionChunk.model_validate({**base, 'choices': [], 'usage': completion.get('usage')})
+
+def assemble_completion(chunks) -> Optional[Dict[str, Any]]:
+    """
+    Rebuilds a ChatCompletion dict from the chunks of a finished stream: content, refusal, tool calls and logprobs.
+    Returns None if the stream was incomplete or carried something that can't be reassembled (the deprecated
+    function_call), so it isn't cached in place of the full non-streamed response, which shares its cache key.
+    """
+    if not chunks:
+        return None
+    choices: Dict[int, Dict[str, Any]] = {}
+    usage = None
+    for chunk in chunks:
+        usage = chunk.usage.model_dump() if getattr(chunk, 'usage', None) else usage
+        for choice in chunk.choices:
+            entry = choices.setdefault(choice.index, {'index': choice.index, 'content': [], 'refusal': [], 'role': 'assistant',
+                                                      'tool_calls': {}, 'logprobs': None, 'finish_reason': None})
+            delta = choice.delta
+            if getattr(delta, 'function_call', None):
+                return None
+            if delta.role:
+                entry['role'] = delta.role
+            if delta.content:
+                entry['content'].append(delta.content)
+            if getattr(delta, 'refusal', None):
+                entry['refusal'].append(delta.refusal)
+            for call in getattr(delta, 'tool_calls', None) or []:
+                # the id, type and name come with a call's first delta, its arguments are spread over the rest
+                tool_call = entry['tool_calls'].setdefault(call.index, {'id': None, 'type': 'function',
+                                                                        'function': {'name': '', 'arguments': ''}})
+                tool_call['id'] = call.id or tool_call['id']
+                tool_call['type'] = call.type or tool_call['type']
+                if call.function:
+                    tool_call['function']['name'] += call.function.name or ''
+                    tool_call['function']['arguments'] += call.function.arguments or ''
+            if getattr(choice, 'logprobs', None):
+                logprobs = entry['logprobs'] = entry['logprobs'] or {'content': None, 'refusal': None}
+                for field, tokens in choice.logprobs.model_dump().items():
+                    if tokens is not None and field in logprobs:
+                        logprobs[field] = (logprobs[field] or []) + tokens
+            if choice.finish_reason:
+                entry['finish_reason'] = choice.finish_reason
+    if not choices or any(c['finish_reason'] is None for c in choices.values()):
+        return None
+
+    def message(c: Dict[str, Any]) -> Dict[str, Any]:
+        tool_calls = [c['tool_calls'][i] for i in sorted(c['tool_calls'])]
+        refusal = ''.join(c['refusal']) if c['refusal'] else None
+        # like a non-streamed response, a message that only calls tools (or refuses) has no content
+        content = ''.join(c['content']) if c['content'] or not (tool_calls or refusal) else None
+        message = {'role': c['role'], 'content': content}
+        if refusal is not None:
+            message['refusal'] = refusal
+        if tool_calls:
+            message['tool_calls'] = tool_calls
+        return message
+
+    first = chunks[0]
+    return {
+        'id': first.id,
+        'object': 'chat.completion',
+        'created': first.created,
+        'model': first.model,
+        'choices': [{'index': c['index'], 'finish_reason': c['finish_reason'], 'message': message(c),
+                     'logprobs': c['logprobs']}
+                    for c in sorted(choices.values(), key=lambda c: c['index'])],
+        'usage': usage,
+    }
+
+class _RecordingStream:
+    """
+    Passes a stream through unchanged while recording its chunks, storing the assembled completion once it finishes.
+    """
+    def __init__(self, stream, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        chunks = []
+        for chunk in self._stream:
+            chunks.append(chunk)
+            yield chunk
+        completion = assemble_completion(chunks)
+        if completion:
+            self._on_complete(completion)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._stream.close()
+
+class _RecordingAsyncStream:
+    def __init__(self, stream, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    async def __aiter__(self):
+        chunks = []
+        async for chunk in self._stream:
+            chunks.append(chunk)
+            yield chunk
+        completion = assemble_completion(chunks)
+        if completion:
+            self._on_complete(completion)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._stream.close()
+
+class _Replay:
+    """
+    A cache hit for a streaming request, usable like the Stream it replaces (iterated, or as a context manager).
+    """
+    def __init__(self, completion: Dict[str, Any], include_usage: bool = False):
+        self._completion = completion
+        self._include_usage = include_usage
+
+    def __iter__(self):
+        return replay_stream(self._completion, self._include_usage)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def close(self) -> None:
+        pass
+
+class _AsyncReplay:
+    def __init__(self, completion: Dict[str, Any], include_usage: bool = False):
+        self._completion = completion
+        self._include_usage = include_usage
+
+    async def __aiter__(self):
+        for chunk in replay_stream(self._completion, self._include_usage):
+            yield chunk
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def close(self) -> None:
+        pass
+
+def resolve_cache(cache: Union[bool, str, ResponseCache, None]) -> Optional[ResponseCache]:
+    """
+    Turns RosieLLM's cache argument into a ResponseCache: True for the default location,
+    a path for a specific SQLite file, or an existing ResponseCache.
+    """
+    if not cache:
+        return None
+    if isinstance(cache, ResponseCache):
+        return cache
+    return ResponseCache(cache if isinstance(cache, str) else None)
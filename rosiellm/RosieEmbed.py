@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import base64
+import random
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from rosiellm.RosieBatch import is_transient
+
+logger = logging.getLogger(__name__)
+
+# token counts are estimated client-side, without the model's tokenizer; English text averages about 4 characters a token
+CHARS_PER_TOKEN = 4
+# seconds between flushes of the vectors and the progress index to disk
+FLUSH_INTERVAL = 5.0
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("embed_corpus() needs numpy: pip install numpy (or the rosiellm[embeddings] extra)")
+    return numpy
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Splits a document into chunks of at most about max_tokens tokens, at whitespace where possible.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    while len(text) > max_chars:
+        cut = text.rfind(' ', max_chars // 2, max_chars)
+        cut = cut if cut > 0 else max_chars
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip()
+    chunks.append(text)
+    return chunks
+
+def read_documents(source: Union[str, os.PathLike, Iterable[str]], text_field: str = 'text') -> Iterator[str]:
+    """
+    Streams documents from a file or an iterable, without reading everything into memory.
+    Args:
+        source (str | PathLike | Iterable[str]): A .jsonl file (one JSON object per line, the text in `text_field`),
+            any other text file (one document per line), or an iterable of strings.
+        text_field (str): The field holding the text in .jsonl files.
+    Returns:
+        Iterator[str]: The documents, in order.
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        yield from source
+        return
+    jsonl = str(source).endswith(('.jsonl', '.ndjson'))
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            yield json.loads(line)[text_field] if jsonl else line
+
+def count_documents(source: Union[str, os.PathLike, Iterable[str]]) -> Optional[int]:
+    """
+    The number of documents in a source, or None for an iterable without a length.
+    Files are counted in one pass over their lines.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return sum(1 for _ in f)
+    return len(source) if hasattr(source, '__len__') else None
+
+@dataclass
+class EmbeddingRun:
+    """
+    The outcome of embed_corpus().
+    Attributes:
+        path (str): The .npy file of vectors, one row per document.
+        rows (int): Documents in the corpus.
+        dim (int): The embedding dimension.
+        embedded (int): Documents embedded by this run.
+        skipped (int): Documents already embedded by an earlier run, which weren't sent again.
+        failed (int): Documents that still failed after retrying. Running again with the same out_path retries them.
+    """
+    path: str
+    rows: int
+    dim: int
+    embedded: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+    @property
+    def vectors(self):
+        """
+        The vectors as a read-only numpy.memmap, paged in from disk as they are used.
+        """
+        return _numpy().load(self.path, mmap_mode='r')
+
+    @property
+    def progress_path(self) -> str:
+        return progress_path(self.path)
+
+def progress_path(path: str) -> str:
+    # one byte per document, 1 once its vector is written
+    return f"{path}.progress.npy"
+
+def _meta_path(path: str) -> str:
+    return f"{path}.meta.json"
+
+def open_output(path: str, rows: int, dim: int, model: str, resume: bool = True):
+    """
+    Opens (or preallocates) the vectors file and its progress index as memory-mapped arrays.
+    Raises:
+        ValueError: If resuming a file written for a different model or corpus size.
+    """
+    np = _numpy()
+    meta = {'model': model, 'rows': rows, 'dim': dim}
+    if resume and os.path.exists(path) and os.path.exists(progress_path(path)):
+        previous = {}
+        if os.path.exists(_meta_path(path)):
+            with open(_meta_path(path)) as f:
+                previous = json.load(f)
+        if any(previous.get(key) not in (None, value) for key, value in meta.items()):
+            raise ValueError(f"{path} was written for {previous}, not {meta}. Use another out_path or resume=False.")
+        vectors = np.lib.format.open_memmap(path, mode='r+')
+        done = np.lib.format.open_memmap(progress_path(path), mode='r+')
+        if vectors.shape != (rows, dim) or done.shape != (rows,):
+            raise ValueError(f"{path} holds {vectors.shape} vectors, expected ({rows}, {dim}).")
+        return vectors, done
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    vectors = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(rows, dim))
+    done = np.lib.format.open_memmap(progress_path(path), mode='w+', dtype=np.uint8, shape=(rows,))
+    with open(_meta_path(path), 'w') as f:
+        json.dump(meta, f)
+    return vectors, done
+
+def _decode(item) -> Any:
+    np = _numpy()
+    embedding = item.embedding
+    if isinstance(embedding, str):
+        return np.frombuffer(base64.b64decode(embedding), dtype='<f4')
+    return np.asarray(embedding, dtype=np.float32)
+
+async def run_embedding(client,
+                        model: str,
+                        documents: Iterable[str],
+                        out_path: str,
+                        rows: int,
+                        chunk_tokens: int = 512,
+                        batch_tokens: int = 16384,
+                        max_batch_size: int = 256,
+                        max_concurrency: int = 8,
+                        normalize: bool = True,
+                        resume: bool = True,
+                        max_retries: int = 3,
+                        truncate_tokens: int = None) -> AsyncIterator[EmbeddingRun]:
+    """
+    Embeds a corpus into a memory-mapped .npy file, one float32 row per document, yielding the run's counts after
+    every request and once more when the run is done (even if every document was already embedded). Documents longer than chunk_tokens are split into chunks whose vectors are averaged (weighted by
+    length). Chunks are grouped into requests of at most batch_tokens tokens and max_batch_size inputs, with up to
+    max_concurrency requests in flight. Vectors are received base64-encoded and written straight into the file;
+    a progress index next to it records which rows are done, so an interrupted run resumes where it stopped.
+    Args:
+        client (AsyncOpenAI): The client to send requests with.
+        model (str): The embedding model.
+        documents (Iterable[str]): The documents, streamed (see read_documents()).
+        out_path (str): The .npy file to write.
+        rows (int): The number of documents.
+        chunk_tokens (int): The longest input sent, keep it below the model's context length.
+        batch_tokens (int): Estimated tokens per request.
+        max_batch_size (int): Inputs per request.
+        max_concurrency (int): Requests in flight at once.
+        normalize (bool): Scale every vector to unit length, so dot products are cosine similarities.
+        resume (bool): Skip the documents an earlier run with the same out_path finished.
+        max_retries (int): How many times a request is retried after a 5xx or connection error.
+        truncate_tokens (int, optional): Ask vLLM to truncate inputs to this many tokens, in case an estimate is short.
+    Returns:
+        AsyncIterator[EmbeddingRun]: The counts so far, after each request. The last one is the final count.
+    """
+    np = _numpy()
+    documents = iter(documents)
+    extra_body = {'truncate_prompt_tokens': truncate_tokens} if truncate_tokens else None
+
+    # the first request finds the dimension, so the file can be allocated before anything else is sent
+    vectors = done = None
+    run = EmbeddingRun(out_path, rows, 0)
+    pending: Dict[int, List] = {} # row -> [vector sum, weight, chunks left] for documents split into chunks
+    batches: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency * 2)
+    progress: asyncio.Queue = asyncio.Queue()
+    last_flush = time.time()
+
+    async def embed(inputs: List[str]):
+        for attempt in range(1, max_retries + 2):
+            try:
+                response = await client.embeddings.create(model=model, input=inputs, encoding_format='base64',
+                                                          extra_body=extra_body)
+                return [_decode(item) for item in sorted(response.data, key=lambda item: item.index)]
+            except Exception as e:
+                if attempt > max_retries or not is_transient(e):
+                    raise
+                delay = min(30.0, 2 ** (attempt - 1))
+                logger.info(f"Embedding request failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def store(row: int, vector) -> None:
+        if normalize:
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+        vectors[row] = vector
+        done[row] = 1
+        run.embedded += 1
+
+    def write(batch: List[Tuple[int, int, int, str]], results) -> None:
+        for (row, n_chunks, weight, _), vector in zip(batch, results):
+            if n_chunks == 1:
+                store(row, vector)
+                continue
+            entry = pending.setdefault(row, [np.zeros_like(vector), 0, n_chunks])
+            entry[0] += vector * weight
+            entry[1] += weight
+            entry[2] -= 1
+            if entry[2] == 0:
+                del pending[row]
+                store(row, entry[0] / entry[1])
+
+    def fail(batch: List[Tuple[int, int, int, str]], error: Exception) -> None:
+        rows_failed = {row for row, *_ in batch}
+        for row in rows_failed:
+            pending.pop(row, None)
+        run.failed += len(rows_failed)
+        logger.error(f"Failed to embed {len(rows_failed)} documents (rows {min(rows_failed)}-{max(rows_failed)}): {error}")
+
+    def make_batches() -> Iterator[List[Tuple[int, int, int, str]]]:
+        # (row, chunks in the document, chunk length, text) grouped by the token budget
+        batch, tokens = [], 0
+        for row, text in enumerate(documents):
+            if row >= rows:
+                raise ValueError(f"The corpus has more than the expected {rows} documents.")
+            if done is not None and done[row]:
+                run.skipped += 1
+                continue
+            chunks = chunk_text(text, chunk_tokens)
+            for chunk in chunks:
+                size = estimate_tokens(chunk)
+                if batch and (tokens + size > batch_tokens or len(batch) >= max_batch_size):
+                    yield batch
+                    batch, tokens = [], 0
+                batch.append((row, len(chunks), size, chunk))
+                tokens += size
+        if batch:
+            yield batch
+
+    async def worker() -> None:
+        while True:
+            batch = await batches.get()
+            if batch is None:
+                return
+            try:
+                results = await embed([text for *_, text in batch])
+            except Exception as e:
+                fail(batch, e)
+            else:
+                write(batch, results)
+            await progress.put(True)
+
+    # allocate from the dimension of one probe, then stream the corpus through the workers
+    probe = await embed(['dimension probe'])
+    run.dim = len(probe[0])
+    vectors, done = open_output(out_path, rows, run.dim, model, resume)
+    workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+
+    async def produce() -> None:
+        try:
+            for batch in make_batches():
+                await batches.put(batch)
+        finally:
+            for _ in workers:
+                await batches.put(None)
+
+    def on_finished(future: asyncio.Future) -> None:
+        if not future.cancelled():
+            future.exception() # marks it retrieved, finished.result() below raises it
+        progress.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    finished = asyncio.gather(producer, *workers)
+    finished.add_done_callback(on_finished)
+    try:
+        while await progress.get() is not None:
+            if time.time() - last_flush > FLUSH_INTERVAL:
+                vectors.flush()
+                done.flush()
+                last_flush = time.time()
+            yield run
+        finished.result()
+    finally:
+        finished.cancel() # and with it the producer and the workers
+        vectors.flush()
+        done.flush()
+        if pending:
+            logger.warning(f"{len(pending)} documents were only partly embedded and will be redone on resume.")
+    if run.embedded + run.skipped + run.failed < rows:
+        logger.warning(f"The corpus had {run.embedded + run.skipped + run.failed} documents, fewer than the expected {rows}.")
+    yield run
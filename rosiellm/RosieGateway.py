@@ -0,0 +1,290 @@
+import json
+import time
+import asyncio
+import logging
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from rosiellm.RosieHTTP import openai_httpx, async_transport
+from rosiellm.RosieRouting import RoutedAsyncTransport
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# headers that only apply to one connection, never forwarded in either direction
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'te', 'trailer', 'upgrade',
+                      'host', 'content-length'}
+# set by the gateway for Rosie, whatever the local client sent
+AUTH_HEADERS = {'authorization', 'x-authorization', 'proxy-authorization'}
+MAX_HEADERS = 100
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Dict[str, str] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class Gateway:
+    """
+    A local OpenAI-compatible HTTP server in front of a RosieLLM (or RosieLLMPool), so many local processes,
+    in any language, can share one warm job through a single SSH session and password prompt.
+    Requests to /v1/* are forwarded to the job with the Rosie authentication headers added, and responses
+    (including token streams) are passed through as they arrive. At most `max_concurrency` requests are sent
+    to Rosie at once; the rest wait in a queue of up to `max_queue` requests, beyond which requests get a 503.
+    """
+    def __init__(self,
+                 backend,
+                 host: str = '127.0.0.1',
+                 port: int = 8000,
+                 max_concurrency: int = 256,
+                 max_queue: int = 1024,
+                 api_key: str = None):
+        """
+        Initialize the gateway (call serve() or run() to start it).
+        Args:
+            backend (RosieLLM | RosieLLMPool): The job(s) to forward requests to. A pool's replicas are picked by
+                fewest requests in flight, and gateway traffic counts towards its autoscaling.
+            host (str, optional): The address to listen on. Defaults to localhost only.
+            port (int, optional): The port to listen on, 0 for any free port. Defaults to 8000.
+            max_concurrency (int, optional): Requests in flight to Rosie at once. Defaults to 256.
+            max_queue (int, optional): Requests allowed to wait for a free slot. Defaults to 1024.
+            api_key (str, optional): If set, local clients must send it as "Authorization: Bearer <api_key>".
+        """
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.api_key = api_key
+        self.waiting = 0
+        self.in_flight = 0
+        self._server = None
+        self._semaphore = None
+        self._clients: Dict[int, 'httpx.AsyncClient'] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def run(self) -> None:
+        """
+        Serves until interrupted (Ctrl+C).
+        """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def start(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Gateway listening on {self.url}")
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    break
+                if not await self._handle_request(writer, *request):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except _HTTPError as e:
+            await self._send_error(writer, e, 'HTTP/1.0')
+        except Exception as e:
+            logger.error(f"Gateway connection failed: {e}")
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise _HTTPError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise _HTTPError(431, "Too many headers.")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('expect', '').lower() == '100-continue' and version == 'HTTP/1.1':
+            # the client holds the body back until told to send it
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            body = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        else:
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+        return method, target, version, headers, body
+
+    async def _handle_request(self, writer: asyncio.StreamWriter, method: str, target: str, version: str,
+                              headers: Dict[str, str], body: bytes) -> bool:
+        # returns whether the connection can take another request
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        try:
+            if target.split('?')[0] == '/health':
+                await self._send_json(writer, 200, self.status(), version)
+                return keep_alive
+            if not target.startswith('/v1/'):
+                raise _HTTPError(404, f"Not found: {target}. The gateway serves the OpenAI API under /v1/.")
+            if self.api_key and headers.get('authorization') != f'Bearer {self.api_key}':
+                raise _HTTPError(401, "Invalid API key for the RosieLLM gateway.")
+            if self.waiting >= self.max_queue:
+                raise _HTTPError(503, "The gateway's request queue is full.", {'Retry-After': '1'})
+            self.waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            try:
+                return await self._forward(writer, method, target, version, headers, body) and keep_alive
+            finally:
+                self.in_flight -= 1
+                self._semaphore.release()
+        except _HTTPError as e:
+            await self._send_error(writer, e, version)
+            return keep_alive
+
+    async def _forward(self, writer: asyncio.StreamWriter, method: str, target: str, version: str,
+                       headers: Dict[str, str], body: bytes) -> bool:
+        httpx = openai_httpx()
+        replica = await self._acquire()
+        start = time.perf_counter()
+        latency = None
+        try:
+            client = self._client(replica)
+            forwarded = {name: value for name, value in headers.items()
+                         if name not in HOP_BY_HOP_HEADERS and name not in AUTH_HEADERS and name != 'expect'}
+            # responses are relayed as raw bytes, so ask for them uncompressed rather than leave it to the client's
+            # (or httpx's default) Accept-Encoding
+            forwarded['accept-encoding'] = 'identity'
+            request = client.build_request(method, f"{replica.rosie_web_path}{target}", headers=forwarded, content=body)
+            try:
+                response = await client.send(request, stream=True)
+            except httpx.HTTPError as e:
+                raise _HTTPError(502, f"Failed to reach the server for job {replica.manager.job_id}: {e}")
+            latency = time.perf_counter() - start
+            try:
+                chunked = version == 'HTTP/1.1'
+                response_headers = [(name, value) for name, value in response.headers.items()
+                                    if name.lower() not in HOP_BY_HOP_HEADERS]
+                if chunked:
+                    response_headers.append(('Transfer-Encoding', 'chunked'))
+                self._write_head(writer, response.status_code, response_headers, version)
+                # raw bytes, passed through as they arrive so token streams aren't buffered
+                async for chunk in response.aiter_raw():
+                    writer.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n' if chunked else chunk)
+                    await writer.drain()
+                if chunked:
+                    writer.write(b'0\r\n\r\n')
+                    await writer.drain()
+                return chunked
+            except httpx.HTTPError as e:
+                # the status line is already sent, all that's left is to cut the response short
+                logger.warning(f"Response from job {replica.manager.job_id} was interrupted: {e}")
+                return False
+            finally:
+                await response.aclose()
+        finally:
+            self._release(replica, latency)
+
+    async def _acquire(self):
+        backend = self.backend
+        if hasattr(backend, 'replicas'):
+            try:
+                return await asyncio.to_thread(backend.acquire)
+            except ConnectionError as e:
+                raise _HTTPError(503, str(e), {'Retry-After': '5'})
+        if not backend.breaker.allow_request():
+            raise _HTTPError(503, f"Server for job {backend.manager.job_id} is failing health checks.", {'Retry-After': '5'})
+        if not backend.isRunning:
+            await asyncio.to_thread(backend.check_server_health)
+            if not backend.isRunning:
+                raise _HTTPError(503, "Server is not running. Server launch can be slow, try again in a moment.",
+                                 {'Retry-After': '5'})
+        return backend
+
+    def _release(self, replica, latency: Optional[float]) -> None:
+        if hasattr(self.backend, 'replicas'):
+            self.backend.release(replica, latency)
+
+    def _client(self, replica) -> 'httpx.AsyncClient':
+        # one client per job, sent through the job's router so it follows relaunches and rollovers
+        client = self._clients.get(id(replica))
+        if client is None:
+            transport = RoutedAsyncTransport(replica.router, async_transport(replica.http_config))
+            client = openai_httpx().AsyncClient(transport=transport, timeout=replica.http_config.timeout, headers={
+                'Authorization': f'Basic {replica.rosie_auth.get_rosie_auth()}',
+                'X-Authorization': f'Bearer {replica.manager.token}',
+            })
+            self._clients[id(replica)] = client
+        return client
+
+    def status(self) -> Dict:
+        """
+        The gateway's state, as served at /health.
+        """
+        replicas = self.backend.replicas if hasattr(self.backend, 'replicas') else [self.backend]
+        return {
+            'in_flight': self.in_flight,
+            'queued': self.waiting,
+            'jobs': [{'job_id': r.manager.job_id, 'running': r.isRunning, 'in_flight': r.in_flight} for r in replicas],
+        }
+
+    @staticmethod
+    def _write_head(writer: asyncio.StreamWriter, status: int, headers: List[Tuple[str, str]], version: str) -> None:
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ''
+        lines = [f'{"HTTP/1.1" if version == "HTTP/1.1" else "HTTP/1.0"} {status} {reason}']
+        lines += [f'{name}: {value}' for name, value in headers]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict, version: str,
+                         headers: Dict[str, str] = None) -> None:
+        data = json.dumps(payload).encode()
+        head = [('Content-Type', 'application/json'), ('Content-Length', str(len(data)))]
+        self._write_head(writer, status, head + list((headers or {}).items()), version)
+        writer.write(data)
+        await writer.drain()
+
+    async def _send_error(self, writer: asyncio.StreamWriter, error: _HTTPError, version: str) -> None:
+        # in the OpenAI API's error format, so clients report it properly
+        payload = {'error': {'message': str(error), 'type': 'rosiellm_gateway_error', 'code': error.status}}
+        await self._send_json(writer, error.status, payload, version, error.headers)
@@ -0,0 +1,159 @@
+import re
+import logging
+import importlib.util
+from functools import lru_cache
+from dataclasses import dataclass
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def openai_httpx():
+    """
+    The httpx package the installed openai is built on. openai 3 moved to httpx2, a renamed fork of httpx whose
+    clients only accept its own transports, requests and streams, so everything handed to an OpenAI client (and
+    everything sharing a transport with one) must be built from the same package.
+    Resolved (and imported) on first use, so importing rosiellm doesn't load the HTTP stack.
+    """
+    import importlib.metadata
+
+    try:
+        requirements = importlib.metadata.requires('openai') or []
+    except importlib.metadata.PackageNotFoundError:
+        requirements = []
+    if any(re.match(r'httpx2\b', requirement) for requirement in requirements):
+        import httpx2
+        return httpx2
+    import httpx
+    return httpx
+
+@dataclass(frozen=True)
+class HTTPConfig:
+    """
+    Connection settings for the traffic to vLLM servers, which all crosses the dh-ood reverse proxy over TLS.
+    Attributes:
+        max_connections (int): Connections open at once, across every RosieLLM sharing the transport.
+        max_keepalive_connections (int): Idle connections kept open for reuse, so requests skip the TLS handshake.
+        keepalive_expiry (float): Seconds an idle connection is kept open.
+        http2 (bool, optional): Negotiate HTTP/2 with the proxy, multiplexing requests over few connections.
+            None enables it if the `h2` package is installed (pip install rosiellm[http2]).
+        connect_timeout (float): Seconds to open a connection, including the TLS handshake.
+        read_timeout (float): Seconds to wait for the next bytes of a response. Streams only need a token
+            within this time, but a non-streaming generation must finish within it.
+        write_timeout (float): Seconds to send a request body.
+        pool_timeout (float): Seconds to wait for a free connection when max_connections are in use.
+    """
+    max_connections: int = 1000
+    max_keepalive_connections: int = 100
+    keepalive_expiry: float = 120.0
+    http2: Optional[bool] = None
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 60.0
+
+    @property
+    def limits(self) -> 'httpx.Limits':
+        return openai_httpx().Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections,
+                            keepalive_expiry=self.keepalive_expiry)
+
+    @property
+    def timeout(self) -> 'httpx.Timeout':
+        return openai_httpx().Timeout(connect=self.connect_timeout, read=self.read_timeout,
+                             write=self.write_timeout, pool=self.pool_timeout)
+
+    @property
+    def use_http2(self) -> bool:
+        if self.http2 is None:
+            return importlib.util.find_spec('h2') is not None
+        return self.http2
+
+DEFAULT_CONFIG = HTTPConfig()
+
+_transports: Dict[HTTPConfig, '_SharedTransport'] = {}
+_lock = Lock()
+
+def shared_transport(config: HTTPConfig = None) -> 'httpx.BaseTransport':
+    """
+    The process-wide transport for a config, created on first use.
+    Health checks, completions and batches of every RosieLLM with the same config share its connection pool,
+    so warm connections are reused instead of each client paying for its own TLS handshakes.
+    Closing a client built on it leaves the transport open.
+    Args:
+        config (HTTPConfig, optional): The connection settings. Defaults to DEFAULT_CONFIG.
+    Returns:
+        httpx.BaseTransport: The shared transport.
+    """
+    config = config or DEFAULT_CONFIG
+    with _lock:
+        transport = _transports.get(config)
+        if transport is None:
+            transport = _SharedTransport(openai_httpx().HTTPTransport(http2=config.use_http2, limits=config.limits))
+            _transports[config] = transport
+            logger.debug(f"Created shared HTTP transport (http2={config.use_http2}, limits={config.limits})")
+        return transport
+
+def async_transport(config: HTTPConfig = None) -> 'httpx.AsyncBaseTransport':
+    """
+    A new async transport with a config's settings.
+    Async connections belong to the event loop that opened them, so unlike shared_transport() these aren't shared;
+    create one per async client.
+    """
+    config = config or DEFAULT_CONFIG
+    return openai_httpx().AsyncHTTPTransport(http2=config.use_http2, limits=config.limits)
+
+def close_shared_transports() -> None:
+    """
+    Closes every shared transport's connections, e.g. before forking worker processes.
+    """
+    with _lock:
+        transports = list(_transports.values())
+        _transports.clear()
+    for transport in transports:
+        transport.transport.close()
+
+class Transport:
+    """
+    The interface of an httpx transport (httpx.BaseTransport), which httpx clients use by duck typing. Subclassing
+    this instead of httpx's class keeps httpx from being imported until a transport is actually created.
+    """
+    def handle_request(self, request: 'httpx.Request') -> 'httpx.Response':
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class AsyncTransport:
+    """
+    The async counterpart of Transport (httpx.AsyncBaseTransport).
+    """
+    async def handle_async_request(self, request: 'httpx.Request') -> 'httpx.Response':
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+class _SharedTransport(Transport):
+    # a transport whose connections outlive the clients using it
+    def __init__(self, transport: 'httpx.BaseTransport'):
+        self.transport = transport
+
+    def handle_request(self, request: 'httpx.Request') -> 'httpx.Response':
+        return self.transport.handle_request(request)
@@ -0,0 +1,225 @@
+import time
+import logging
+from threading import Thread, Lock, Event
+from typing import Callable
+
+from rosiellm.RosiePoller import JobEvent
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    Stops requests from being sent to a server that keeps failing.
+    The breaker opens after `failure_threshold` consecutive failures. While open, requests are refused
+    without contacting the server; after `reset_timeout` seconds one trial request is let through
+    (half-open), and its outcome closes or re-opens the breaker.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        """
+        Initialize the breaker (closed).
+        Args:
+            failure_threshold (int, optional): Consecutive failures that open the breaker. Defaults to 3.
+            reset_timeout (float, optional): Seconds the breaker stays open before a trial request. Defaults to 30.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return self.CLOSED
+            if time.time() - self.opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    def allow_request(self) -> bool:
+        return self.state != self.OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> bool:
+        """
+        Counts a failure.
+        Returns:
+            bool: True if this failure opened the breaker.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None:
+                # a failed trial request starts a new open period
+                self.opened_at = time.time()
+                return False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+                return True
+            return False
+
+    def trip(self) -> None:
+        """
+        Opens the breaker immediately, e.g. when the job is known to be gone.
+        """
+        with self._lock:
+            self.failures = max(self.failures, self.failure_threshold)
+            self.opened_at = time.time()
+
+class HealthMonitor:
+    """
+    Watches a RosieLLM's server in the background.
+    /health is polled over the RosieLLM's keep-alive session, often while something is wrong and less
+    and less often while the server stays healthy. Consecutive failures open the RosieLLM's circuit breaker,
+    and so does SLURM reporting that the job ended (e.g. it hit its time limit). With auto_relaunch,
+    a job that is gone, or that stays unhealthy for `relaunch_after` seconds, is resubmitted and the
+    RosieLLM's client is switched to the new job once it is up.
+    """
+    def __init__(self,
+                 rosie_llm,
+                 min_interval: float = 2.0,
+                 max_interval: float = 60.0,
+                 backoff: float = 1.5,
+                 auto_relaunch: bool = False,
+                 relaunch_after: float = 300.0,
+                 on_state_change: Callable[[str], None] = None):
+        """
+        Initialize the monitor (call start() to begin monitoring).
+        Args:
+            rosie_llm (RosieLLM): The RosieLLM to monitor.
+            min_interval (float, optional): Seconds between checks after a failure or state change. Defaults to 2.
+            max_interval (float, optional): Upper bound on the seconds between checks while healthy. Defaults to 60.
+            backoff (float, optional): Factor the interval grows by after each healthy check. Defaults to 1.5.
+            auto_relaunch (bool, optional): If True, resubmit the job when it is gone or stuck. Defaults to False.
+            relaunch_after (float, optional): Seconds a running job may stay unhealthy before it is replaced. Defaults to 300.
+            on_state_change (Callable[[str], None], optional): Called with "healthy", "unhealthy", "relaunching"
+                or "relaunched" when the server's state changes.
+        """
+        self.rosie_llm = rosie_llm
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.auto_relaunch = auto_relaunch
+        self.relaunch_after = relaunch_after
+        self.on_state_change = on_state_change
+        self.state = None
+        self.relaunches = 0
+        self._job_ended = False
+        self._seen_healthy = False
+        self._unhealthy_since = None
+        self._tracked_job = None
+        self._wake = Event()
+        self._stop = Event()
+        self._thread = None
+
+    def start(self) -> 'HealthMonitor':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self.track_job()
+            self._thread = Thread(target=self._run, name='RosieHealthMonitor', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def check_now(self) -> None:
+        """
+        Wakes the monitor up for an immediate check.
+        """
+        self._wake.set()
+
+    def _run(self) -> None:
+        interval = self.min_interval
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                interval = self._check(interval)
+            except Exception as e:
+                logger.warning(f"Health monitor check failed: {e}")
+                interval = self.max_interval
+
+    def _check(self, interval: float) -> float:
+        llm = self.rosie_llm
+        breaker = llm.breaker
+        if self._job_ended:
+            if not self.auto_relaunch:
+                return self.max_interval
+            self._relaunch("the job ended")
+            return self.min_interval
+
+        status = llm.probe_job()
+        if status == 200:
+            breaker.record_success()
+            llm.isRunning = True
+            llm.timer.mark('healthy')
+            self._seen_healthy = True
+            self._unhealthy_since = None
+            self._set_state('healthy')
+            return min(interval * self.backoff, self.max_interval)
+
+        if not self._seen_healthy:
+            # still launching, failures don't count until the server has been up once
+            return min(interval * self.backoff, self.max_interval / 4)
+        self._unhealthy_since = self._unhealthy_since or time.time()
+        if breaker.record_failure():
+            logger.error(f"Server for job {llm.manager.job_id} failed {breaker.failures} health checks in a row, "
+                         f"refusing requests until it recovers (status: {status}).")
+        if breaker.state != breaker.CLOSED:
+            llm.isRunning = False
+            self._set_state('unhealthy')
+            if self.auto_relaunch and time.time() - self._unhealthy_since >= self.relaunch_after:
+                self._relaunch(f"it was unhealthy for {time.time() - self._unhealthy_since:.0f}s")
+        return self.min_interval
+
+    def _relaunch(self, reason: str) -> None:
+        llm = self.rosie_llm
+        logger.warning(f"Relaunching job {llm.manager.job_id} because {reason}.")
+        self._set_state('relaunching')
+        llm.relaunch()
+        self.relaunches += 1
+        self._job_ended = False
+        self._seen_healthy = False
+        self._unhealthy_since = None
+        self.track_job()
+        self._set_state('relaunched')
+
+    def track_job(self) -> None:
+        """
+        Follows the RosieLLM's current job in SLURM, call after the RosieLLM switches to a different job.
+        """
+        manager = self.rosie_llm.manager
+        if manager.job_id and manager.job_id != self._tracked_job:
+            self._tracked_job = manager.job_id
+            manager.poller.track(manager.job_id, self._on_job_event)
+
+    def _on_job_event(self, event: JobEvent) -> None:
+        if self._stop.is_set() or not event.is_terminal or event.job_id != str(self.rosie_llm.manager.job_id):
+            return
+        logger.error(f"Job {event.job_id} ended ({event.state}), the server is gone.")
+        self.rosie_llm.breaker.trip()
+        self.rosie_llm.isRunning = False
+        self._job_ended = True
+        self._set_state('unhealthy')
+        self._wake.set()
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+        self.state = state
+        if self.on_state_change:
+            try:
+                self.on_state_change(state)
+            except Exception as e:
+                logger.warning(f"on_state_change raised an error: {e}")
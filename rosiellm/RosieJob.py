@@ -1,18 +1,32 @@
 from rosiellm.RosieSSH import RosieSSH
+from rosiellm.RosieSession import SessionRegistry, COMPATIBILITY_KEYS
+from rosiellm.RosiePoller import JobPoller, JobEvent
+from rosiellm.RosieLogs import StartupMonitor
+from rosiellm.RosieTiming import LaunchTimer
+from rosiellm.RosieStaging import MANIFEST_NAME, read_manifest, container_is_known_good, upload_staging_script, upload_script
+from rosiellm.RosieSizing import DEFAULT_GPUS, DEFAULT_UTILIZATION, partition_gpus, plan_job, profile_model
+from rosiellm.RosiePresets import PRESET_CONFIG, resolve_options
 import tempfile
 import time
 import os
 import textwrap
 import secrets
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
 
-from typing import Tuple
+from typing import Dict, List, Tuple, Optional, Union
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class JobManager:
-    def __init__(self, job_name='RosieLLM', rosie_ssh: RosieSSH = None, **kwargs):
+    def __init__(self,
+                 job_name='RosieLLM',
+                 rosie_ssh: RosieSSH = None,
+                 registry: SessionRegistry = None,
+                 timer: LaunchTimer = None,
+                 **kwargs):
         self.job_name = job_name.strip()
         if rosie_ssh:
             if not rosie_ssh.ssh_client:
@@ -22,26 +36,43 @@ class JobManager:
             self.rosie_ssh = RosieSSH()
             self.rosie_ssh.connect()
         self.user = self.rosie_ssh.ssh_username
+        self.timer = timer or self.rosie_ssh.timer
         self.token = secrets.token_urlsafe() #look into jwt(?)
         self.PORT = 1234 #TODO scan for open port
         self.node_url = None
+        self.job_id = None
+        self.staging = None
+        self.sizing = None
+        self.registry = registry or SessionRegistry()
+        self.poller = JobPoller.shared(self.rosie_ssh)
         self.BASE_URL = "/node/{node_url}.hpc.msoe.edu/{port}"
 
         self.config_dict = {
             'job_name': job_name,
             'partition': 'teaching',
             'nodes': 1,
-            'gpus': 2,
+            'gpus': 'auto', # fewest that fit the model, see size_job()
             'cpus_per_gpu': 2,
-            'out_file': f'/data/ai_club/RosieLLM/out/{self.user}_out.txt',
+            'out_file': f'/data/ai_club/RosieLLM/out/{self.user}_%x_out.txt', # one per job name, so replicas don't truncate each other's log
             'days': 0,
             'hours': 3,
             'minutes': 0,
             'container': "/data/ai_club/RosieLLM/RosieLLM.sif",
             'model': "NousResearch/Meta-Llama-3-8B-Instruct",
             'dtype': "half",
-            'max_model_len': "2048",
-            'download_dir': "/data/ai_club/RosieLLM/models", #TODO: Change to tmp dir
+            'max_model_len': 2048, # 'auto' for the model's maximum
+            'task': None, # 'embed' serves /v1/embeddings from an embedding model, None lets vLLM decide
+            'colocate': None, # other (small) models served from the same GPUs, each by its own server with a share of the memory
+            'lora_adapters': None, # {name: path} of LoRA adapters for the model, {} to only load them at runtime
+            'max_loras': None, # adapters batched together, None for vLLM's default (1)
+            'max_lora_rank': None, # the highest adapter rank, None for vLLM's default (16)
+            'gpu_memory_utilization': None, # None to match the model's size
+            'gpu_memory_gb': None, # None for the partition's GPUs
+            'preset': None, # 'throughput', 'low-latency' or 'long-context', see RosiePresets
+            'vllm_options': None, # VLLMOptions (or a dict of them), override the preset's
+            'revision': None,
+            'download_dir': "/data/ai_club/RosieLLM/models", # shared cache, weights are staged from here
+            'stage_dir': "/tmp/rosiellm/models", # node-local scratch, None loads from download_dir
             'host': "0.0.0.0",
             'port': str(self.PORT),
             'api_key': self.token,
@@ -58,6 +89,12 @@ class JobManager:
                     logger.info(f"Updated {key} from {previous} > {value}")
                 else:
                     logger.warning(f"Invalid argument (ignored): {'{'}{key}:{value}{'}'}")
+        for key, value in PRESET_CONFIG.get(self.config_dict['preset'], {}).items():
+            if key not in kwargs:
+                self.config_dict[key] = value
+        self.vllm_options = resolve_options(self.config_dict['preset'], self.config_dict['vllm_options'])
+        self.config_dict['colocate'] = self.parse_colocated(self.config_dict['model'], self.config_dict['colocate'])
+        self.config_dict['lora_adapters'] = self.parse_lora_adapters(self.config_dict['lora_adapters'])
     
     # def __del__(self):
         # self.rosie_ssh.execute_instance_command(f'scancel -n {self.job_name}')
@@ -68,26 +105,344 @@ class JobManager:
         Launches the initial job on Rosie.
         """
         try:
-            sbatch_script = self.create_llm_sbatch()
+            self._prepare()
+            self._submit()
+            self.node_url = self.get_node_url()
+            self.register_session()
+
+        except Exception as e:
+            #TODO: improve(?)
+            logger.error(f"An error occurred: {e}")
+
+    def launch_offline_batch(self, requests_path: str, results_path: str, max_pending: int = None) -> None:
+        """
+        Submits a job that runs vLLM's offline engine over a JSONL file of requests on Rosie, appending each result
+        to results_path as it finishes (see RosieOffline). Nothing goes through HTTP or the proxy, and the job ends,
+        freeing its GPUs, once the last request is done. The job isn't registered for reattaching.
+        Args:
+            requests_path (str): The remote JSONL file of requests, one chat.completions.create kwargs dict per line.
+            results_path (str): The remote JSONL file results are appended to. Requests it already has are skipped.
+            max_pending (int, optional): Requests handed to vLLM's scheduler ahead of time. Defaults to RosieOffline's.
+        Raises:
+            RuntimeError: If the job can't be submitted.
+        """
+        from rosiellm import RosieOffline
+
+        runner = {}
+        def upload_runner():
+            runner['path'] = upload_script(self.rosie_ssh, os.path.abspath(RosieOffline.__file__))
+        self._prepare(('runner_upload', upload_runner))
+        max_pending = max_pending or RosieOffline.DEFAULT_MAX_PENDING
+        self._submit(f"python {runner['path']} --input {requests_path} --output {results_path} "
+                     f"--max-pending {max_pending} {self.engine_args()}")
+
+    def _prepare(self, *steps) -> None:
+        # independent remote reads (model metadata, the staging manifest) and uploads, each over its own channel
+        steps = (('sizing', self._size_and_validate), ('staging_prepare', self.prepare_staging)) + steps
+        with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+            futures = [executor.submit(self._timed, phase, step) for phase, step in steps]
+        for future in futures:
+            future.result()
+
+    def _submit(self, command: str = None) -> None:
+        # renders the sbatch script around the command (the vLLM server by default), uploads it and submits it
+        with self.timer.phase('sbatch_render'):
+            sbatch_script = self.create_llm_sbatch(command)
             local_script_path, remote_script_path = self.create_temp_sbatch_script(sbatch_script)
 
-            logger.debug(f"Local SBATCH Script Path: {local_script_path}")
-            logger.debug(f"Remote SBATCH Script Path: {remote_script_path}")
+        logger.debug(f"Local SBATCH Script Path: {local_script_path}")
+        logger.debug(f"Remote SBATCH Script Path: {remote_script_path}")
 
-            # Copy the SBATCH script directly to the remote server
+        # Copy the SBATCH script directly to the remote server (sbatch reads it, it needn't be executable)
+        with self.timer.phase('sftp_upload'):
             self.rosie_ssh.copy_file_to_remote(local_script_path, remote_script_path)
             os.remove(local_script_path)
-            self.rosie_ssh.execute_command(f'chmod +x {remote_script_path}')
 
-            # Execute the sbatch command on the remote server
-            #this current implementation causes the server to not be able to be shut down later
-            self.rosie_ssh.execute_command(f'sbatch {remote_script_path}', streaming=True)
-            self.rosie_ssh.execute_command(f'rm {remote_script_path}')
-            self.node_url = self.get_node_url(self.job_name)
+        # Execute the sbatch command on the remote server
+        with self.timer.phase('sbatch_submit'):
+            sbatch = self.rosie_ssh.run_command(f'sbatch --parsable {remote_script_path}')
+        # slurm has its own copy of the script now, cleaning up doesn't hold up the launch
+        Thread(target=self.rosie_ssh.execute_command, args=(f'rm -f {remote_script_path}',), daemon=True).start()
+        self.job_id = self.parse_job_id(sbatch.stdout) if sbatch.ok else None
+        if not self.job_id:
+            raise RuntimeError(f"sbatch failed (exit status {sbatch.exit_status}): {sbatch.output.strip()}")
+        self.timer.mark('submitted')
+        print(f"Submitted batch job {self.job_id}")
+
+    def _timed(self, phase: str, step) -> None:
+        with self.timer.phase(phase):
+            step()
+
+    def _size_and_validate(self) -> None:
+        self.size_job()
+        self.vllm_options.validate(self.config_dict['max_model_len'])
 
+    def cancel_vllm_server(self) -> None:
+        """
+        Cancels the managed job on Rosie and removes it from the session registry.
+        """
+        if not self.job_id:
+            return
+        self.rosie_ssh.execute_instance_command(f'scancel {self.job_id}')
+        # the job ending is expected now, stop reporting on it
+        self.poller.untrack(self.job_id)
+        # after a rollover the registry entry already belongs to the replacement job
+        entry = self.registry.get(self.user, self.job_name)
+        if entry and str(entry.get('job_id')) == str(self.job_id):
+            self.registry.remove(self.user, self.job_name)
+        logger.info(f"Cancelled job {self.job_id}")
+
+    def size_job(self) -> None:
+        """
+        Resolves gpus="auto" (and max_model_len="auto") from the model's config.json and weight size: the fewest
+        GPUs (tensor parallel degree) that fit the weights and a KV cache for the requested context length,
+        and the GPU memory utilization to match. Explicitly set values are kept.
+        If the model's metadata can't be found, DEFAULT_GPUS are used.
+        Raises:
+            ValueError: If the model can't fit on one node's GPUs.
+        """
+        cfg = self.config_dict
+        auto_gpus = str(cfg['gpus']) == 'auto'
+        auto_len = str(cfg['max_model_len']) == 'auto'
+        if not (auto_gpus or auto_len):
+            return
+        try:
+            profiles = [profile_model(self.rosie_ssh, cfg['download_dir'], model, cfg['revision'] if model == cfg['model'] else None)
+                        for model in self.served_models]
         except Exception as e:
-            #TODO: improve(?)
-            logger.error(f"An error occurred: {e}")
+            logger.warning(f"Couldn't size the job for {cfg['model']} ({e}), using {DEFAULT_GPUS} GPUs.")
+            if auto_gpus:
+                cfg['gpus'] = DEFAULT_GPUS
+            if auto_len:
+                cfg['max_model_len'] = None
+            return
+        gpu_memory, gpus_per_node = partition_gpus(cfg['partition'], cfg['gpu_memory_gb'])
+        max_gpus = gpus_per_node if auto_gpus else int(cfg['gpus'])
+        # co-located models each get an equal share of every GPU
+        share = gpu_memory / len(profiles)
+        plans = [plan_job(profile, cfg['dtype'], None if auto_len else cfg['max_model_len'], share, max_gpus)
+                 for profile in profiles]
+        if len(plans) > 1:
+            # the servers share one context length, the shortest any of the models supports
+            max_model_len = min(plan.max_model_len for plan in plans)
+            plans = [plan_job(profile, cfg['dtype'], max_model_len, share, max_gpus) for profile in profiles]
+        self.sizing = plans[0]
+        cfg['max_model_len'] = self.sizing.max_model_len
+        if auto_gpus:
+            # and one tensor parallel degree, the largest any of them needs
+            cfg['gpus'] = max(plan.gpus for plan in plans)
+            cfg['gpu_memory_utilization'] = cfg['gpu_memory_utilization'] or max(plan.gpu_memory_utilization for plan in plans)
+        models = ', '.join(f"{profile.model} ({profile.params / 1e9:.1f}B parameters)" for profile in profiles)
+        logger.info(f"Sized the job for {models}: {self.sizing}")
+
+    @staticmethod
+    def parse_colocated(model: str, colocate: Union[str, List[str], None]) -> Optional[List[str]]:
+        """
+        Normalizes the colocate setting to a list of model names.
+        Raises:
+            ValueError: If a model is listed twice.
+        """
+        if not colocate:
+            return None
+        models = [colocate] if isinstance(colocate, str) else list(colocate)
+        if len(set(models + [model])) != len(models) + 1:
+            raise ValueError(f"Every co-located model must be different from the others and from {model}, got {models}.")
+        return models
+
+    @staticmethod
+    def parse_lora_adapters(adapters: Union[Dict[str, str], List[str], None]) -> Optional[Dict[str, str]]:
+        """
+        Normalizes the lora_adapters setting to {name: path}. Adapters given as a list of paths are named after
+        the last part of their path, e.g. "/data/me/adapters/math-v2" is served as the model "math-v2".
+        Raises:
+            ValueError: If a name or path can't be passed to vLLM's --lora-modules.
+        """
+        if adapters is None:
+            return None
+        if not isinstance(adapters, dict):
+            adapters = {os.path.basename(str(path).rstrip('/')): str(path) for path in adapters}
+        for name, path in adapters.items():
+            if not re.fullmatch(r'[\w.:/@+-]+', name) or not re.fullmatch(r'[\w.:/@+-]+', str(path)):
+                raise ValueError(f"Can't serve LoRA adapter {name}={path}: names and paths may only contain "
+                                 f"letters, digits and ._-:/@+")
+        return dict(adapters)
+
+    @property
+    def served_models(self) -> Dict[str, int]:
+        """
+        The port of the server for each model the job serves, the configured model's first. LoRA adapters are
+        served by the configured model's server.
+        """
+        models = [self.config_dict['model']] + (self.config_dict['colocate'] or [])
+        return {model: self.PORT + i for i, model in enumerate(models)}
+
+    @property
+    def manifest_path(self) -> str:
+        return f"{self.config_dict['download_dir']}/{MANIFEST_NAME}"
+
+    def prepare_staging(self) -> None:
+        """
+        Gets the job ready to stage the model's weights to node-local storage: uploads the staging script if
+        needed and checks the manifest for whether the container is already known to have vllm.
+        If anything fails, the job loads the model from the shared download_dir as before.
+        """
+        self.staging = None
+        if not self.config_dict.get('stage_dir'):
+            return
+        try:
+            manifest = read_manifest(self.rosie_ssh, self.manifest_path)
+            self.staging = {
+                'script': upload_staging_script(self.rosie_ssh),
+                'container_ok': container_is_known_good(self.rosie_ssh, manifest, self.config_dict['container']),
+            }
+        except Exception as e:
+            logger.warning(f"Weight staging disabled for this job: {e}")
+            return
+        model_key = f"{self.config_dict['model']}@{self.config_dict['revision'] or 'main'}"
+        if model_key in manifest['models']:
+            logger.info(f"{model_key} is already on shared storage")
+
+    @property
+    def out_file(self) -> str:
+        """
+        The path of the job's output file, with the SLURM filename patterns (%j, %u, %x) filled in.
+        """
+        path = self.config_dict['out_file']
+        if self.job_id:
+            path = path.replace('%j', str(self.job_id))
+        return path.replace('%u', self.user).replace('%x', self.config_dict['job_name'])
+
+    def startup_monitor(self) -> StartupMonitor:
+        """
+        Returns a StartupMonitor that follows the managed job's output file.
+        """
+        return StartupMonitor(self.rosie_ssh, self.out_file, self.job_id)
+
+    def reattach_vllm_server(self, timeout: Optional[float] = None) -> bool:
+        """
+        Reattaches to a job from the session registry instead of launching a new one.
+        The registered job is reused only if it was launched with the same configuration (see
+        SessionRegistry.is_compatible()), and squeue still reports it as pending or running.
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait for a pending job to get a node.
+                If it is still queued after that, the manager stays attached to it with node_url unset.
+                Defaults to None (wait as long as the job is queued).
+        Returns:
+            bool: True if the manager is now attached to the registered job, False otherwise.
+        """
+        entry = self.registry.get(self.user, self.job_name)
+        if not entry:
+            return False
+        if not self.registry.is_compatible(entry, self.config_dict):
+            logger.info(f"Registered job {entry.get('job_id')} was launched with a different configuration, not reattaching.")
+            return False
+
+        state = self.get_job_state(entry['job_id'])
+        if state not in ('PENDING', 'CONFIGURING', 'RUNNING'):
+            logger.info(f"Registered job {entry['job_id']} is no longer running ({state}), removing it from the registry.")
+            self.registry.remove(self.user, self.job_name)
+            return False
+
+        self.job_id = entry['job_id']
+        self.token = entry['token']
+        self.PORT = int(entry['port'])
+        self.config_dict['api_key'] = self.token
+        self.config_dict['port'] = str(self.PORT)
+        self.node_url = entry.get('node_url') if state == 'RUNNING' else None
+        if not self.node_url:
+            try:
+                self.node_url = self.get_node_url(timeout=timeout)
+            except TimeoutError:
+                print(f"Reattached to job {self.job_id}, which is still queued after {timeout:.0f}s")
+                return True
+        if self.node_url != entry.get('node_url'):
+            self.register_session()
+        print(f"Reattached to running job {self.job_id} on {self.node_url}")
+        return True
+
+    def register_session(self) -> None:
+        """
+        Records the current job in the session registry so later sessions can reattach to it.
+        """
+        if not self.job_id or not self.node_url:
+            return
+        try:
+            self.registry.save(
+                self.user, self.job_name,
+                job_id=self.job_id,
+                node_url=self.node_url,
+                port=self.PORT,
+                token=self.token,
+                **{k: self.config_dict[k] for k in COMPATIBILITY_KEYS}
+            )
+        except OSError as e:
+            logger.warning(f"Failed to record job {self.job_id} in the session registry: {e}")
+
+    def get_job_state(self, job_id: str) -> Optional[str]:
+        """
+        Looks up the SLURM state of a job.
+        Args:
+            job_id (str): The id of the job to check.
+        Returns:
+            str: The job state (e.g. "PENDING", "RUNNING"), or None if squeue no longer knows the job.
+        """
+        status = self.poller.query([job_id]).get(str(job_id))
+        return status.state if status else None
+
+    def get_time_left(self, job_id: str = None) -> Optional[float]:
+        """
+        Looks up how long a job can keep running before SLURM's time limit ends it.
+        Args:
+            job_id (str, optional): The id of the job to check. Defaults to the managed job.
+        Returns:
+            float: The seconds left, or None if the job isn't queued or has no time limit.
+        """
+        job_id = job_id or self.job_id
+        if not job_id:
+            return None
+        result = self.rosie_ssh.run_command(f'squeue -h -j {job_id} -o %L', timeout=20)
+        return self.parse_slurm_duration(result.stdout.strip()) if result.ok else None
+
+    @staticmethod
+    def parse_slurm_duration(duration: str) -> Optional[float]:
+        """
+        Converts a SLURM duration ("MM:SS", "HH:MM:SS" or "D-HH:MM:SS") to seconds.
+        Returns None for anything else, e.g. "UNLIMITED" or "INVALID".
+        """
+        match = re.fullmatch(r'(?:(\d+)-)?(?:(\d+):)?(\d+):(\d+)', duration.strip())
+        if not match:
+            return None
+        days, hours, minutes, seconds = (int(g or 0) for g in match.groups())
+        return float(((days * 24 + hours) * 60 + minutes) * 60 + seconds)
+
+    @staticmethod
+    def parse_job_id(sbatch_out: str) -> Optional[str]:
+        """
+        Extracts the job id from the output of `sbatch --parsable` ("<id>" or "<id>;<cluster>").
+        """
+        for line in reversed((sbatch_out or '').strip().split('\n')):
+            match = re.fullmatch(r'(\d+)(;\S+)?', line.strip())
+            if match:
+                return match.group(1)
+        return None
+
+    def log_job_event(self, event: JobEvent) -> None:
+        """
+        Logs a state transition of the managed job, and records the scheduling milestones in the launch timer.
+        """
+        if event.job_id == str(self.job_id):
+            if event.state != 'PENDING':
+                self.timer.mark('scheduled', event.timestamp)
+            if event.state == 'RUNNING':
+                self.timer.mark('running', event.timestamp)
+        if event.state == 'PENDING':
+            logger.info(f"Job {event.job_id} is pending ({event.reason or 'no reason given'})")
+        elif event.state == 'RUNNING':
+            logger.info(f"Job {event.job_id} is running on {event.node}")
+        elif event.is_terminal:
+            logger.error(f"Job {event.job_id} ended with state {event.state}" + (f" ({event.reason})" if event.reason else ""))
+        else:
+            logger.info(f"Job {event.job_id} changed state {event.previous_state} > {event.state}")
 
     def create_temp_sbatch_script(self, sbatch_script: str) -> Tuple[str, str]:
         try:
@@ -108,62 +463,146 @@ class JobManager:
             logger.error(f"Failed to create temporary SBATCH script: {e}")
             raise
 
-    def get_node_url(self, job_name, timeout: int = 20) -> str:
+    def get_node_url(self, job_id: str = None, timeout: Optional[float] = None) -> str:
         """
-        Retrieves the URL of the node where a specific job is running, polling until the job is running.
+        Retrieves the URL of the node where a specific job is running, waiting until the job is running.
         Args:
-            job_name (str): The name of the job to check.
-            timeout (int, optional): The maximum number of seconds to wait for the job to start. Defaults to 60.
+            job_id (str, optional): The id of the job to check. Defaults to the managed job.
+            timeout (float, optional): The maximum number of seconds to wait for the job to start.
+                Defaults to None (wait as long as the job is queued).
         Returns:
             str: The URL of the node where the job is running, in the form "dh-nodeX" or "dh-nodeXX", 
             where X is the node.
+        Raises:
+            RuntimeError: If the job ends before it starts running.
+            TimeoutError: If the job isn't running within the timeout.
         Credit to Jackson Rolando, Kevin Paganini, Jennifer Madigan, Nathan Cernik, Tyler Cernik.
         """
-        get_job_url_command = f'squeue -u {self.user} -n {job_name} -o "%N %T"'
-        node_url = None
-        squeue_out = None
-        
-        start = time.time()
-        while node_url is None and time.time() - start < timeout:
-            # self.rosie_ssh.wait_for_ready_channel(timeout=timeout)
-            squeue_out = self.rosie_ssh.execute_instance_command(get_job_url_command)
-            if squeue_out and 'dh' in squeue_out and 'RUNNING' in squeue_out:
-                current_jobs = squeue_out.strip().split('\n')[1:]
-                node_url = current_jobs[-1].split(' ')[0]
-            else:
-                time.sleep(0.5)
-        if node_url is None:
-            raise TimeoutError(f"Failed to find job URL for job {job_name} in {timeout} seconds.")
-
-        print(f"Job URL Found: {node_url}")
-        return node_url
-
-    def create_llm_sbatch(self) -> str:                
-        cfg = self.config_dict
-        time = f'{cfg["days"]}-{cfg["hours"]}:{cfg["minutes"]}:00'
+        job_id = job_id or self.job_id
+        self.poller.track(job_id, self.log_job_event)
+        event = self.poller.wait_for(job_id, ('RUNNING',), timeout=timeout)
+        if event.state != 'RUNNING' or not event.node:
+            raise RuntimeError(f"Job {job_id} ended with state {event.state} before it started running.")
 
-        # Constructing the command using an f-string with curly braces around parameters
-        vllm_command = (
-            f"python -m vllm.entrypoints.openai.api_server "
-            f"--model {cfg['model']} "
+        print(f"Job URL Found: {event.node}")
+        return event.node
+
+    def engine_args(self, model: str = None) -> str:
+        """
+        The vLLM engine arguments for the configured model, shared by the server and offline batch jobs.
+        Args:
+            model (str, optional): A co-located model to get the arguments for instead. It is loaded from
+                download_dir (not staged) at the latest revision, without LoRA.
+        """
+        cfg = self.config_dict
+        colocated = model is not None and model != cfg['model']
+        model = model or cfg['model']
+        staged = self.staging and not colocated
+        # with staging, $model_path is set by the staging step (the node-local copy of the weights)
+        model_arg = '"$model_path"' if staged else model
+        revision_arg = f"--revision {cfg['revision']} " if cfg['revision'] and not staged and not colocated else ""
+        task_arg = f"--task {cfg['task']} " if cfg['task'] else ""
+        max_model_len_arg = f"--max-model-len {cfg['max_model_len']} " if cfg['max_model_len'] not in (None, 'auto') else ""
+        utilization = cfg['gpu_memory_utilization']
+        if len(self.served_models) > 1:
+            # gpu_memory_utilization is the whole job's, split evenly between the servers sharing each GPU
+            utilization = round((utilization or DEFAULT_UTILIZATION) / len(self.served_models), 3)
+        utilization_arg = f"--gpu-memory-utilization {utilization} " if utilization else ""
+        lora_arg = ""
+        if cfg['lora_adapters'] is not None and not colocated:
+            lora_arg = ("--enable-lora "
+                        + (f"--max-loras {cfg['max_loras']} " if cfg['max_loras'] else "")
+                        + (f"--max-lora-rank {cfg['max_lora_rank']} " if cfg['max_lora_rank'] else ""))
+        options_arg = ''.join(f"{arg} " for arg in self.vllm_options.to_args())
+        return (
+            f"--model {model_arg} "
+            f"--served-model-name {model} "
+            f"{revision_arg}"
             f"--dtype {cfg['dtype']} "
             f"-tp {cfg['gpus']} "
-            # f"--max-model-len {cfg['max_model_len']} " #is this necessary?
+            f"{task_arg}"
+            f"{max_model_len_arg}"
+            f"{utilization_arg}"
+            f"{lora_arg}"
+            f"{options_arg}"
             f"--download-dir {cfg['download_dir']} "
+        )
+
+    def server_command(self, model: str = None) -> str:
+        """
+        The command that runs vLLM's OpenAI-compatible server for the configured model, or a co-located one.
+        """
+        cfg = self.config_dict
+        model = model or cfg['model']
+        primary = model == cfg['model']
+        port = cfg['port'] if primary else self.served_models[model]
+        root_path = cfg['vllm_base_url'] if primary else self.BASE_URL.format(node_url='$SLURMD_NODENAME', port=port)
+        lora_modules_arg = ""
+        if primary and cfg['lora_adapters']:
+            lora_modules_arg = "--lora-modules " + ''.join(f"{name}={path} " for name, path in cfg['lora_adapters'].items())
+        return (
+            f"python -m vllm.entrypoints.openai.api_server "
+            f"{self.engine_args(model)}"
+            f"{lora_modules_arg}"
             f"--host {cfg['host']} "
-            f"--port {cfg['port']} "
-            f"--root-path {cfg['vllm_base_url']} "
+            f"--port {port} "
+            f"--root-path {root_path} "
             f"--middleware {cfg['middleware']}"
-            # f"--enable-cors "
-            # f"--log-level INFO "
-            # f"--num-workers 4 "
-            # f"--max-batch-size 32 "
-            # f"--metrics-port 9090 "
         )
 
+    def create_llm_sbatch(self, command: str = None) -> str:
+        """
+        Renders the sbatch script that runs a command in the container, after the vllm check and weight staging.
+        Args:
+            command (str, optional): The command to run. Defaults to the vLLM OpenAI-compatible server.
+        """
+        cfg = self.config_dict
+        time = f'{cfg["days"]}-{cfg["hours"]}:{cfg["minutes"]}:00'
+
+        vllm_command = command
+        if not vllm_command:
+            servers = [self.server_command(model) for model in self.served_models]
+            # co-located servers run side by side, and the job ends as soon as any of them exits
+            vllm_command = servers[0] if len(servers) == 1 else ' &\n'.join(servers) + ' &\nwait -n'
+
         # Print the constructed command
         logger.debug(vllm_command)
 
+        if self.staging and self.staging['container_ok']:
+            # an earlier job already confirmed vllm is in this exact image, skip the slow import probe
+            install_check = ['echo "vllm already installed (container is known-good)."']
+        else:
+            install_check = [
+                'if python -s -c "import vllm" 2>/dev/null; then',
+                '    echo "vllm already installed."',
+            ] + ([
+                f'    python {self.staging["script"]} record-container --container {cfg["container"]} --manifest {self.manifest_path} || true',
+            ] if self.staging else []) + [
+                'elif ! python -c "import vllm" 2>/dev/null; then',
+                '    echo "vllm not found. Installing..."',
+                '    python -m pip install --user --upgrade pip vllm',
+                'else',
+                '    echo "vllm already installed."',
+                'fi &&',
+            ]
+        stage_step = []
+        if self.staging:
+            stage_args = (f"--model {cfg['model']} --download-dir {cfg['download_dir']} "
+                          f"--stage-dir {cfg['stage_dir']} --manifest {self.manifest_path}"
+                          + (f" --revision {cfg['revision']}" if cfg['revision'] else ""))
+            stage_step = [
+                '',
+                '# Copy the weights to node-local storage (vLLM loads them itself if this fails)',
+                f'model_path=$(python {self.staging["script"]} stage {stage_args}) || model_path={cfg["model"]}',
+                '',
+            ]
+        # keep the inserted lines at the template's indentation so dedent still applies
+        install_check = '\n            '.join(install_check)
+        stage_step = '\n            '.join(stage_step)
+        vllm_command = '\n            '.join(vllm_command.split('\n'))
+        # adapters can only be loaded and unloaded through the API with this set
+        lora_env = 'export VLLM_ALLOW_RUNTIME_LORA_UPDATING=True &&' if cfg['lora_adapters'] is not None else ''
+
         sbatch_script = textwrap.dedent(
 f'''            #!/bin/bash
             #SBATCH --job-name='{cfg['job_name']}'
@@ -176,15 +615,12 @@ f'''            #!/bin/bash
             
             container="{cfg['container']}"
             
+            echo "RosieLLM job ${{SLURM_JOB_ID}} starting on $(hostname)"
+
             singularity exec --nv -B /data:/data -B /data:/scratch/data ${{container}} bash -c '
             # Ensure Python dependencies are installed
-            if ! python -c "import vllm" 2>/dev/null; then
-                echo "vllm not found. Installing..."
-                python -m pip install --user --upgrade pip vllm
-            else
-                echo "vllm already installed."
-            fi &&
-            
+            {install_check}
+
             # Change directory to the project root
             echo "Changing directory to project root..."
             echo "Directory: $(pwd) -> $(cd /data/ai_club/RosieLLM && pwd)"
@@ -192,9 +628,10 @@ f'''            #!/bin/bash
             # Set environment variables
             export PYTHONPATH=/data/ai_club/RosieLLM:$PYTHONPATH &&
             export ROSIE_VLLM_API_KEY={self.token} &&
+            {lora_env}
             echo "Added API_KEY to environment variables and updated PYTHONPATH"
-            
-            # Run the vLLM server
+            {stage_step}
+            # Run vLLM
             {vllm_command}
             '
             '''
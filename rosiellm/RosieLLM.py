@@ -1,14 +1,56 @@
-from rosiellm.RosieSSH import RosieSSH
-from rosiellm.RosieJob import JobManager
-from openai import OpenAI, AsyncOpenAI
-from typing import Literal, Union
-import random
-import requests
+from rosiellm.RosieNodes import MANAGEMENT_NODES, rank_management_nodes, node_address
+from typing import TYPE_CHECKING, Literal, Union, Iterable, Iterator, AsyncIterator, Dict, Any, List, Callable, Optional
+import os
+import secrets
+import time
 import logging
+from threading import Thread, Event
+
+if TYPE_CHECKING:
+    # SSH, encryption, the HTTP stack and the OpenAI client are imported when a RosieLLM is created (and the
+    # features below when they are first used), not with the package
+    from openai import OpenAI, AsyncOpenAI
+    from rosiellm.RosieSSH import RosieSSH
+    from rosiellm.RosieJob import JobManager
+    from rosiellm.RosieEmbed import EmbeddingRun
+    from rosiellm.RosieBatch import BatchResult
+    from rosiellm.RosieCache import ResponseCache
+    from rosiellm.RosieLogs import StartupEvent
+    from rosiellm.RosieRouting import JobRoute
+    from rosiellm.RosieHTTP import HTTPConfig
 
-MANAGEMENT_NODES = ['dh-mgmt1', 'dh-mgmt2', 'dh-mgmt3', 'dh-mgmt4']
-logging.basicConfig(level=logging.WARN)
 logger = logging.getLogger(__name__)
+# the Open OnDemand proxy in front of the compute nodes
+ROSIE_WEB_URL = os.getenv('ROSIE_WEB_URL', 'https://dh-ood.hpc.msoe.edu')
+# startup events that mark a launch milestone (see RosieTiming.LAUNCH_MILESTONES)
+STARTUP_MILESTONES = {
+    'job_started': 'job_started',
+    'vllm_ready': 'container_ready',
+    'download': 'container_ready',
+    'staging': 'container_ready',
+    'loading_weights': 'container_ready',
+    'weights_loaded': 'weights_loaded',
+    'server_started': 'server_started',
+}
+# how long a blocking RosieLLM() waits for a reattached job that is still queued before waiting in the background
+REATTACH_QUEUE_TIMEOUT = 60.0
+
+def select_management_nodes(management_node: str = None) -> List[str]:
+    """
+    Returns the SSH addresses of the management nodes in the order they should be tried.
+    Args:
+        management_node (str, optional): One of MANAGEMENT_NODES to try first. If not provided (or invalid),
+            the nodes are ordered by measured latency, fastest first.
+    Returns:
+        List[str]: The addresses, e.g. ["dh-mgmt3.hpc.msoe.edu", "dh-mgmt1.hpc.msoe.edu", ...].
+    """
+    if management_node and management_node not in MANAGEMENT_NODES:
+        logger.warning(f"Invalid management node provided, choosing the fastest node.")
+        management_node = None
+    ranking = rank_management_nodes()
+    if management_node:
+        ranking = [management_node] + [n for n in ranking if n != management_node]
+    return [node_address(n) for n in ranking]
 
 class RosieLLM:
     def __init__(self,
@@ -22,6 +64,16 @@ class RosieLLM:
                                 ] = None,
                  use_as_openai_client: bool = True,
                  async_client: bool = False,
+                 reattach: bool = True,
+                 rosie_ssh: 'RosieSSH' = None,
+                 cache: Union[bool, str, 'ResponseCache'] = False,
+                 metrics_hook: Callable[[str, float], None] = None,
+                 metrics_export: Callable[[str, float, Dict[str, str]], None] = None,
+                 monitor_health: bool = True,
+                 auto_relaunch: bool = False,
+                 rollover_lead_time: float = None,
+                 http_config: 'HTTPConfig' = None,
+                 block: bool = True,
                  log_level: Union[int, str] = logging.WARN,
                  **kwargs
                  ) -> 'RosieLLM':
@@ -32,36 +84,339 @@ class RosieLLM:
             job_name (str): The name of the job to be created on Rosie.
             model (str): The model to be used for the LLM. Must be a valid HuggingFace model name.
             rosie_username (str): The username to be used for authentication with Rosie.
-            management_node (Literal: 'dh-mgmt[1,2,3,4]', optional): The management node to be used for the server. If not provided, a random node will be chosen.
+            management_node (Literal: 'dh-mgmt[1,2,3,4]', optional): The management node to be used for the server. If not provided, the fastest responding node will be chosen.
+                Either way, the other nodes are used as fallbacks if the connection fails.
             return_openai_client (bool): If True, the RosieLLM object can be used as if it were an OpenAI client.
             async_client (bool): If True, the OpenAI client will be asynchronous.
+            reattach (bool): If True, reuse a compatible job from a previous session (same job name, model,
+                dtype, tensor parallelism, task, co-located models and LoRA adapters) instead of launching a new one.
+            rosie_ssh (RosieSSH, optional): An existing SSH session to launch the job through, e.g. one shared
+                by several RosieLLMs. If provided, rosie_username and management_node are ignored.
+            cache (bool | str | ResponseCache): If set, deterministic chat completions (temperature 0 or a fixed seed)
+                are cached in memory and in SQLite. True uses ~/.rosiellm/cache.sqlite, a str sets the SQLite path.
+            metrics_hook (Callable[[str, float], None], optional): Called with (phase, seconds) as each phase of the
+                launch completes. The full breakdown is available from launch_report().
+            metrics_export (Callable[[str, float, Dict[str, str]], None], optional): Called with (metric, value, labels)
+                for each request latency and throughput observation, e.g. RosieMetrics.prometheus_exporter().
+                Percentile summaries are always available from metrics.summary().
+            monitor_health (bool): If True, a background thread keeps checking the server's health, so a job that
+                dies (e.g. at its time limit) stops receiving requests instead of failing them one by one.
+            auto_relaunch (bool): If True (and monitor_health is set), a job that ends or stays unhealthy is
+                resubmitted and the client switches over to the new job once it is up.
+            rollover_lead_time (float, optional): If set, a replacement job is launched this many seconds before the
+                job reaches its SLURM time limit, and requests move over to it once it is healthy (see rollover()).
+                Should be longer than a typical queue wait plus cold start, e.g. 900.
+            http_config (HTTPConfig, optional): Connection pool limits, keep-alive, HTTP/2 and timeouts for the traffic
+                to the server. RosieLLMs with the same config share one connection pool.
+            block (bool): If False, only the password prompt and SSH connection happen here; the job is reattached or
+                submitted, queued and started in a background thread (see launch_state, wait_until_ready() and,
+                from async code, create() and ready()). Even when blocking, a reattached job that is still queued after
+                REATTACH_QUEUE_TIMEOUT seconds is waited for in the background.
         """
+        from concurrent.futures import ThreadPoolExecutor
+        from rosiellm.RosieSSH import RosieSSH, SSHConnectionPool, env_defaults
+        from rosiellm.RosieJob import JobManager
+        from rosiellm.RosieCache import resolve_cache
+        from rosiellm.RosieTiming import LaunchTimer
+        from rosiellm.RosieHealth import CircuitBreaker
+        from rosiellm.RosieRouting import Router
+        from rosiellm.RosieHTTP import HTTPConfig, openai_httpx, shared_transport
+        from rosiellm.RosieMetrics import RequestMetrics
+
+        if not logging.getLogger().handlers:
+            # scripts and notebooks that haven't configured logging still see warnings and errors
+            logging.basicConfig(level=logging.WARN)
         logger.setLevel(log_level)
-        if not management_node or management_node not in MANAGEMENT_NODES:
-            # Choose a random management node
-            if management_node not in MANAGEMENT_NODES:
-                logger.warning(f"Invalid management node provided, choosing a random node.")
-            management_node = random.choice(MANAGEMENT_NODES)
-        self.rosie_ssh_address = f"{management_node}.hpc.msoe.edu"
-        # NOTE: RosieSSH assumes the address can be provided from .env which isn't compatible here
-        self.rosie_ssh = RosieSSH(rosie_username, self.rosie_ssh_address)
-        self.manager = JobManager(job_name, self.rosie_ssh, **kwargs)
+        self.timer = LaunchTimer(metrics_hook)
+        self.metrics = RequestMetrics(labels=self._metric_labels, export=metrics_export)
+        self.breaker = CircuitBreaker()
+        self.http_config = http_config or HTTPConfig()
+        # health checks share the completions' connection pool, so they don't pay for a new TLS handshake each time
+        self.session = openai_httpx().Client(transport=shared_transport(self.http_config), timeout=self.http_config.timeout)
+        if rosie_ssh:
+            self.rosie_ssh = rosie_ssh
+            self.rosie_ssh_address = rosie_ssh.ssh_host
+        else:
+            # rank the management nodes (a TCP probe each) while the password is typed and the key derived
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                ranking = executor.submit(select_management_nodes, management_node)
+                username = rosie_username or env_defaults()[0]
+                if username:
+                    SSHConnectionPool.get_auth(username, self.timer)
+                self.rosie_ssh_address, *fallback_addresses = ranking.result()
+            # NOTE: RosieSSH assumes the address can be provided from .env which isn't compatible here
+            self.rosie_ssh = RosieSSH(rosie_username, self.rosie_ssh_address, fallback_addresses, timer=self.timer)
+        self.manager = JobManager(job_name, self.rosie_ssh, timer=self.timer, **kwargs)
+        self._job_kwargs = kwargs
         self.user = self.manager.user
         self.rosie_auth = self.manager.rosie_ssh.rosie_auth
+        self.session.headers['Authorization'] = f'Basic {self.rosie_auth.get_rosie_auth()}'
         self.model = self.manager.config_dict['model']
+        self.isRunning = False
+        self.reattached = False
+        self.last_event: Optional[StartupEvent] = None
+        # switched to the job's node once it has one, clients created before then follow it there
+        self.rosie_web_path = self.get_web_path()
+        self.router = Router(self.job_route())
 
-        self.manager.launch_vllm_server()
+        self.async_client = async_client
+        self.cache = resolve_cache(cache)
+        self._http_client = self.create_openai_client(async_client)
+        self._batch_client = None # created on demand by abatch(), without the client's own retries
+        self._is_client = use_as_openai_client # Return only the client if requested
+        self.monitor = None
+        self._closed = Event()
+        self._launched = Event()
+        self._launch_error: Optional[Exception] = None
+        launch_args = (reattach, monitor_health, auto_relaunch, rollover_lead_time)
+        if block:
+            self._launch(*launch_args, queue_timeout=REATTACH_QUEUE_TIMEOUT)
+        else:
+            Thread(target=self._launch, args=launch_args, name='RosieLaunch', daemon=True).start()
 
-        vllm_route = self.manager.BASE_URL.format(node_url=self.manager.node_url, port=self.manager.PORT) #TODO use a getter
-        self.rosie_web_path = f"https://dh-ood.hpc.msoe.edu{vllm_route}"
-        self.isRunning = False
+    @classmethod
+    async def create(cls, *args, **kwargs) -> 'RosieLLM':
+        """
+        Creates a RosieLLM from async code without blocking the event loop. Takes the same arguments as RosieLLM().
+        The password prompt, key derivation and SSH connection run in a worker thread, and the method returns as soon
+        as they are done, while the job is submitted, queued and started in the background. Several models can be
+        launched at once with asyncio.gather(), e.g.
+            llms = await asyncio.gather(RosieLLM.create(model=a), RosieLLM.create(model=b))
+            await asyncio.gather(*(llm.ready() for llm in llms))
+        Returns:
+            RosieLLM: The client. Await ready() before sending requests, launch_state and last_event show the progress.
+        """
+        import asyncio
+
+        kwargs['block'] = False
+        return await asyncio.to_thread(cls, *args, **kwargs)
+
+    def _launch(self, reattach: bool, monitor_health: bool, auto_relaunch: bool, rollover_lead_time: Optional[float],
+                queue_timeout: Optional[float] = None) -> None:
+        from rosiellm.RosieHealth import HealthMonitor
+
+        launch_args = (reattach, monitor_health, auto_relaunch, rollover_lead_time)
+        try:
+            self.reattached = reattach and self.manager.reattach_vllm_server(timeout=queue_timeout)
+            if self.reattached and not self.manager.node_url:
+                # the reattached job is still queued: keep waiting for it in the background, as with block=False
+                print("Waiting for the job to leave the queue in the background, see launch_state and wait_until_ready().")
+                Thread(target=self._launch, args=launch_args, name='RosieLaunch', daemon=True).start()
+                return
+            if not self.reattached:
+                self.manager.launch_vllm_server()
+
+            if not self.manager.node_url:
+                logger.error("Server failed to launch.")
+            else:
+                self.rosie_web_path = self.get_web_path()
+                self.router.switch(self.job_route())
+                if self.reattached:
+                    self.check_server_health()
+                else:
+                    print("Job has been launched, waiting for server to start (this can take over a minute)...")
+                    logger.info("See your job progress here:")
+                    logger.info(f"{ROSIE_WEB_URL}/pun/sys/dashboard/files/fs/{self.manager.out_file}")
+
+            self.monitor = HealthMonitor(self, auto_relaunch=auto_relaunch).start() if monitor_health else None
+            if rollover_lead_time:
+                Thread(target=self._watch_walltime, args=(rollover_lead_time,), name='RosieRollover', daemon=True).start()
+        except Exception as e:
+            self._launch_error = e
+            logger.error(f"Failed to launch job {self.manager.job_name}: {e}")
+        self._launched.set()
+
+    @property
+    def launch_state(self) -> str:
+        """
+        Where the launch is: "submitting", "queued" (waiting for a node), "starting" (the server is loading, see
+        last_event), "ready" or "failed".
+        """
+        if self.isRunning:
+            return 'ready'
+        if self._launch_error or (self._launched.is_set() and not self.manager.node_url):
+            return 'failed'
+        if self.manager.node_url:
+            return 'starting'
+        return 'queued' if self.manager.job_id else 'submitting'
+
+    def _metric_labels(self) -> Dict[str, str]:
+        manager = self.manager
+        return {'job': str(manager.job_id), 'node': str(manager.node_url), 'model': manager.config_dict['model']}
+
+    def get_web_path(self, manager: 'JobManager' = None, port: int = None) -> str:
+        """
+        The URL of a job's server (by default the current one), through the Rosie web proxy.
+        Args:
+            manager (JobManager, optional): The job. Defaults to the current one.
+            port (int, optional): The port of a co-located model's server. Defaults to the configured model's.
+        """
+        manager = manager or self.manager
+        vllm_route = manager.BASE_URL.format(node_url=manager.node_url, port=port or manager.PORT)
+        return f"{ROSIE_WEB_URL}{vllm_route}"
+
+    def job_route(self, manager: 'JobManager' = None) -> 'JobRoute':
+        """
+        The route to a job's servers (by default the current job's), one per co-located model.
+        """
+        from rosiellm.RosieRouting import JobRoute
+
+        manager = manager or self.manager
+        model_paths = {model: self.get_web_path(manager, port) for model, port in manager.served_models.items()}
+        return JobRoute(self.get_web_path(manager), manager.token, model_paths)
+
+    def load_adapter(self, name: str, path: str) -> None:
+        """
+        Loads a LoRA adapter into the running server, after which requests can use it as their model. The job must
+        have been launched with lora_adapters set ({} for none at launch).
+        Args:
+            name (str): The model name requests use for the adapter.
+            path (str): The adapter's directory on Rosie (e.g. under /data) or its HuggingFace id.
+        Raises:
+            RuntimeError: If the server refuses to load it.
+        """
+        self._lora_request('load_lora_adapter', {'lora_name': name, 'lora_path': path})
+        logger.info(f"Loaded LoRA adapter {name} from {path}")
+
+    def unload_adapter(self, name: str) -> None:
+        """
+        Unloads a LoRA adapter from the running server, freeing its slot.
+        Raises:
+            RuntimeError: If the server refuses, e.g. because no adapter has that name.
+        """
+        self._lora_request('unload_lora_adapter', {'lora_name': name})
+        logger.info(f"Unloaded LoRA adapter {name}")
+
+    def _lora_request(self, endpoint: str, body: Dict[str, str]) -> None:
+        if self.manager.config_dict['lora_adapters'] is None:
+            raise RuntimeError(f"Job {self.manager.job_id} wasn't launched with LoRA enabled, set lora_adapters (e.g. to {{}}).")
+        response = self.session.post(f"{self.rosie_web_path}/v1/{endpoint}", json=body,
+                                     headers={'X-Authorization': f'Bearer {self.manager.token}'})
+        if response.status_code != 200:
+            raise RuntimeError(f"{endpoint} failed with status {response.status_code}: {response.text.strip()}")
+
+    @property
+    def in_flight(self) -> int:
+        """
+        The number of requests currently in flight to the job.
+        """
+        return self.router.current.in_flight
+
+    def close(self) -> None:
+        """
+        Stops the background health monitor and rollover. The job keeps running, use manager.cancel_vllm_server() to stop it.
+        """
+        self._closed.set()
+        if self.monitor:
+            self.monitor.stop()
+
+    def rollover(self, drain_timeout: float = 300.0, ready_timeout: float = None) -> None:
+        """
+        Replaces the job without interrupting requests (blue/green): launches a replacement job, waits until its
+        server is healthy, sends new requests to it, waits for the requests in flight on the old job to finish,
+        and then cancels the old job.
+        Args:
+            drain_timeout (float): Maximum seconds to wait for in-flight requests on the old job. The wait also
+                ends shortly before the old job's time limit.
+            ready_timeout (float, optional): Maximum seconds to wait for the replacement to become healthy.
+                Defaults to None (no limit).
+        Raises:
+            RuntimeError: If the replacement job fails to start. The old job keeps serving.
+        """
+        from rosiellm.RosieJob import JobManager
+        from rosiellm.RosieTiming import LaunchTimer
+
+        old_manager = self.manager
+        new_manager = JobManager(old_manager.job_name, self.rosie_ssh, registry=old_manager.registry,
+                                 timer=LaunchTimer(self.timer.metrics_hook), **self._job_kwargs)
+        logger.info(f"Launching a replacement for job {old_manager.job_id}")
+        new_manager.launch_vllm_server()
+        if not new_manager.node_url:
+            raise RuntimeError(f"Failed to launch a replacement for job {old_manager.job_id}.")
+        route = self.job_route(new_manager)
+
+        deadline = None if ready_timeout is None else time.time() + ready_timeout
+        while self.probe_job(route) != 200:
+            status = new_manager.poller.status(new_manager.job_id)
+            if status and status.is_terminal:
+                raise RuntimeError(f"Replacement job {new_manager.job_id} ended with state {status.state} before it was ready.")
+            if deadline is not None and time.time() > deadline:
+                new_manager.cancel_vllm_server()
+                raise TimeoutError(f"Replacement job {new_manager.job_id} wasn't ready within {ready_timeout}s.")
+            time.sleep(5)
+
+        self.manager = new_manager
+        self.rosie_web_path = route.web_path
+        old_route = self.router.switch(route)
+        self.isRunning = True
+        self.breaker.record_success()
+        if self.monitor:
+            self.monitor.track_job()
+        logger.warning(f"Requests now go to job {new_manager.job_id} on {new_manager.node_url}, draining job {old_manager.job_id}.")
+
+        # don't wait past the old job's time limit
+        left = old_manager.get_time_left()
+        if left is not None:
+            drain_timeout = min(drain_timeout, max(0.0, left - 10))
+        if not old_route.wait_idle(drain_timeout):
+            logger.warning(f"{old_route.in_flight} requests were still in flight on job {old_manager.job_id} after {drain_timeout}s.")
+        old_manager.cancel_vllm_server()
+
+    def _watch_walltime(self, lead_time: float) -> None:
+        # rolls the job over `lead_time` seconds before its time limit, checking squeue at most every 5 minutes
+        while not self._closed.is_set():
+            left = self.manager.get_time_left()
+            if left is None:
+                self._closed.wait(60)
+                continue
+            if left > lead_time:
+                self._closed.wait(min(left - lead_time, 300))
+                continue
+            try:
+                self.rollover()
+            except Exception as e:
+                logger.error(f"Rollover of job {self.manager.job_id} failed: {e}")
+                self._closed.wait(60)
 
+    def relaunch(self) -> None:
+        """
+        Replaces the job with a freshly submitted one and points the client at it.
+        Requests fail with ConnectionError until every server of the new job (one per co-located model) is up;
+        use wait_until_ready() to block until then.
+        """
+        self.isRunning = False
+        old_job_id = self.manager.job_id
+        status = self.manager.poller.status(old_job_id) if old_job_id else None
+        if old_job_id and not (status and status.is_terminal):
+            self.manager.cancel_vllm_server()
+        self.manager.token = secrets.token_urlsafe()
+        self.manager.config_dict['api_key'] = self.manager.token
+        self.manager.node_url = None
+        self.manager.launch_vllm_server()
         if not self.manager.node_url:
-            logger.error("Server failed to launch.")
-        else:
-            print("Job has been launched, waiting for server to start (this can take over a minute)...")
-            logger.info("See your job progress here:")
-            logger.info(f"https://dh-ood.hpc.msoe.edu/pun/sys/dashboard/files/fs//data/ai_club/RosieLLM/out/{self.user}_out.txt")
+            raise RuntimeError(f"Failed to relaunch job {old_job_id}.")
+        self.rosie_web_path = self.get_web_path()
+        self.router.switch(self.job_route())
+        self.breaker.record_success()
+        logger.warning(f"Replaced job {old_job_id} with job {self.manager.job_id} on {self.manager.node_url}.")
+
+    def create_openai_client(self, async_client: bool = False, max_retries: int = None) -> Union['OpenAI', 'AsyncOpenAI']:
+        """
+        Creates a new OpenAI client pointed at this job's vLLM server.
+        Requests go through the RosieLLM's router, so the client follows the job across relaunches and rollovers.
+        Args:
+            async_client (bool): If True, an AsyncOpenAI client is returned.
+            max_retries (int, optional): How many times the client retries a failed request. Defaults to the
+                openai package's default (2).
+        Returns:
+            OpenAI | AsyncOpenAI: The client, with the Rosie authentication headers set. Completions are timed into
+                this RosieLLM's metrics, and go through a CachedOpenAI if this RosieLLM has a response cache.
+        """
+        from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+        from rosiellm.RosieCache import CachedOpenAI
+        from rosiellm.RosieRouting import RoutedTransport, RoutedAsyncTransport
+        from rosiellm.RosieHTTP import shared_transport, async_transport
+        from rosiellm.RosieMetrics import MeteredOpenAI
 
         base_url = f"{self.rosie_web_path}/v1"
         default_headers = {
@@ -69,16 +424,243 @@ class RosieLLM:
             #NOTE: swap to FastAPI forwarder for AUTH at a later date
             'X-Authorization': f'Bearer {self.manager.token}'
         }
+        if async_client:
+            transport = RoutedAsyncTransport(self.router, async_transport(self.http_config))
+            http_client = DefaultAsyncHttpxClient(transport=transport, timeout=self.http_config.timeout)
+        else:
+            transport = RoutedTransport(self.router, shared_transport(self.http_config))
+            http_client = DefaultHttpxClient(transport=transport, timeout=self.http_config.timeout)
+        client_class = AsyncOpenAI if async_client else OpenAI
+        retries = {} if max_retries is None else {'max_retries': max_retries}
+        client = client_class(api_key="None", base_url=base_url, default_headers=default_headers,
+                              http_client=http_client, timeout=self.http_config.timeout, **retries)
+        # cache hits never reach the server, so they aren't timed
+        client = MeteredOpenAI(client, self.metrics)
+        return CachedOpenAI(client, self.cache) if self.cache else client
 
-        self._http_client = OpenAI(
-            api_key="None", base_url=base_url, default_headers=default_headers
-            ) if not async_client else AsyncOpenAI(
-            api_key="None", base_url=base_url, default_headers=default_headers
-            )
-        self._is_client = use_as_openai_client # Return only the client if requested
+    def batch(self,
+              requests: Iterable[Dict[str, Any]],
+              max_concurrency: int = 32,
+              ordered: bool = False,
+              max_retries: int = 3,
+              checkpoint: str = None) -> Iterator['BatchResult']:
+        """
+        Runs many chat completions concurrently, yielding each result as it finishes.
+        Args:
+            requests (Iterable[dict]): Keyword arguments for chat.completions.create, one dict per request.
+                "model" defaults to this job's model.
+            max_concurrency (int): The maximum number of requests in flight at once.
+            ordered (bool): If True, results are yielded in the order of requests instead of as they finish.
+            max_retries (int): How many times a request is retried after a 5xx or connection error.
+            checkpoint (str, optional): Path to a JSONL file that completed results are appended to.
+                Requests already in the file are not sent again; their saved results are yielded instead.
+        Returns:
+            Iterator[BatchResult]: The results. Requests that still fail after retrying have `error` set.
+        """
+        from rosiellm.RosieBatch import run_batch, iterate_in_thread
+
+        self.http_client # raises if the server isn't running yet
+        requests = self._with_default_model(requests)
+        # run_batch does the retrying, so the client doesn't retry each attempt again
+        return iterate_in_thread(lambda client: run_batch(client, requests, max_concurrency, ordered, max_retries, checkpoint),
+                                 lambda: self.create_openai_client(async_client=True, max_retries=0),
+                                 max_buffered=max_concurrency)
+
+    def abatch(self,
+               requests: Iterable[Dict[str, Any]],
+               max_concurrency: int = 32,
+               ordered: bool = False,
+               max_retries: int = 3,
+               checkpoint: str = None) -> AsyncIterator['BatchResult']:
+        """
+        The async counterpart of batch(), for use inside a running event loop. See batch() for the arguments.
+        """
+        from rosiellm.RosieBatch import run_batch
+
+        self.http_client # raises if the server isn't running yet
+        if self._batch_client is None:
+            self._batch_client = self.create_openai_client(async_client=True, max_retries=0)
+        return run_batch(self._batch_client, self._with_default_model(requests), max_concurrency, ordered, max_retries, checkpoint)
+
+    def embed_corpus(self,
+                     source: Union[str, Iterable[str]],
+                     out_path: str,
+                     num_documents: int = None,
+                     text_field: str = 'text',
+                     chunk_tokens: int = 512,
+                     batch_tokens: int = 16384,
+                     max_concurrency: int = 8,
+                     normalize: bool = True,
+                     resume: bool = True,
+                     max_retries: int = 3,
+                     on_progress: Callable[['EmbeddingRun'], None] = None) -> 'EmbeddingRun':
+        """
+        Embeds every document of a corpus into a memory-mapped .npy file (requires numpy), for a job launched with
+        task='embed'. Row i of the file is document i's vector. Documents are streamed, so the corpus never has to
+        fit in memory, and a progress index next to the file lets an interrupted run pick up where it stopped.
+        Args:
+            source (str | Iterable[str]): A .jsonl file (the text in `text_field`), a text file with one document
+                per line, or an iterable of strings.
+            out_path (str): The .npy file to write.
+            num_documents (int, optional): The number of documents, needed for iterables without a length.
+            text_field (str): The field holding the text in .jsonl files.
+            chunk_tokens (int): Longer documents are split into chunks of about this many tokens and their vectors averaged.
+            batch_tokens (int): About how many tokens each request carries.
+            max_concurrency (int): The maximum number of requests in flight at once.
+            normalize (bool): Scale the vectors to unit length.
+            resume (bool): Skip the documents an earlier run with the same out_path finished.
+            max_retries (int): How many times a request is retried after a 5xx or connection error.
+            on_progress (Callable[[EmbeddingRun], None], optional): Called with the counts so far after each request.
+        Returns:
+            EmbeddingRun: The file, its shape and how many documents were embedded, skipped or failed.
+        """
+        from rosiellm.RosieBatch import iterate_in_thread
+        from rosiellm.RosieEmbed import run_embedding, read_documents, count_documents
+
+        self.http_client # raises if the server isn't running yet
+        rows = num_documents if num_documents is not None else count_documents(source)
+        if rows is None:
+            raise ValueError("The number of documents is unknown, pass num_documents for an iterable without a length.")
+        if rows == 0:
+            raise ValueError(f"{source} has no documents to embed.")
+        documents = read_documents(source, text_field)
+        # let vLLM truncate the odd input the 4-characters-a-token estimate undercounts, instead of rejecting it
+        max_model_len = self.manager.config_dict.get('max_model_len')
+        truncate_tokens = max_model_len if isinstance(max_model_len, int) else None
+        for run in iterate_in_thread(lambda client: run_embedding(client, self.model, documents, out_path, rows,
+                                                                  chunk_tokens, batch_tokens,
+                                                                  max_concurrency=max_concurrency, normalize=normalize,
+                                                                  resume=resume, max_retries=max_retries,
+                                                                  truncate_tokens=truncate_tokens),
+                                     lambda: self.create_openai_client(async_client=True, max_retries=0),
+                                     max_buffered=max_concurrency):
+            if on_progress:
+                on_progress(run)
+        logger.info(f"Embedded {run.embedded} documents into {out_path} ({run.skipped} already done, {run.failed} failed)")
+        return run
+
+    def _with_default_model(self, requests: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for request in requests:
+            yield request if 'model' in request else {'model': self.model, **request}
+
+    def startup_events(self, poll_interval: float = 1.0, timeout: Optional[float] = None) -> Iterator['StartupEvent']:
+        """
+        Follows the job's output file and yields its startup milestones (package install, weight download and
+        loading, CUDA graph capture, server start) as they happen. Only new bytes are read on each poll.
+        Ends after the "server_started" event of every server (one per co-located model) or an "error" event, or
+        a "job_ended" event if the job stops first.
+        Args:
+            poll_interval (float): Seconds between reads of the output file.
+            timeout (float, optional): Maximum seconds to follow the file. Defaults to None (no limit).
+        Returns:
+            Iterator[StartupEvent]: The events, in the order they were logged.
+        """
+        from rosiellm.RosieLogs import StartupEvent
+
+        monitor = self.manager.startup_monitor()
+        deadline = None if timeout is None else time.time() + timeout
+        # co-located servers share the output file, each logs its own start
+        servers_left = len(self.manager.served_models)
+        try:
+            while deadline is None or time.time() < deadline:
+                for event in monitor.poll():
+                    self.last_event = event
+                    if event.kind in STARTUP_MILESTONES:
+                        self.timer.mark(STARTUP_MILESTONES[event.kind], event.timestamp)
+                    yield event
+                    servers_left -= event.kind == 'server_started'
+                    if event.kind == 'error' or servers_left == 0:
+                        return
+                status = self.manager.poller.status(self.manager.job_id) if self.manager.job_id else None
+                if status and status.is_terminal:
+                    yield StartupEvent('job_ended', f"Job {status.job_id} ended with state {status.state}", time.time())
+                    return
+                time.sleep(poll_interval)
+        finally:
+            monitor.close()
+
+    def wait_until_ready(self,
+                         on_event: Callable[['StartupEvent'], None] = None,
+                         timeout: Optional[float] = None,
+                         poll_interval: float = 1.0) -> bool:
+        """
+        Blocks until the server is up, following the job's startup progress instead of polling /health blindly.
+        /health is only checked once the log shows the server has started.
+        Args:
+            on_event (Callable[[StartupEvent], None], optional): Called with each startup event. Defaults to logging it.
+            timeout (float, optional): Maximum seconds to wait. Defaults to None (no limit).
+            poll_interval (float): Seconds between reads of the output file and between health checks.
+        Returns:
+            bool: True if the server is running.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        # a launch in the background (block=False) has to get the job a node first
+        if not self._launched.wait(timeout) or not self.manager.node_url:
+            return False
+        self.check_server_health()
+        if self.isRunning:
+            return True
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.time())
+        started = False
+        for event in self.startup_events(poll_interval, timeout):
+            (on_event or self._log_startup_event)(event)
+            started = event.kind == 'server_started'
+        # the proxy can take a moment to route to a freshly started server
+        deadline = deadline if deadline is not None else time.time() + 30
+        while started and not self.isRunning and time.time() < deadline:
+            time.sleep(poll_interval)
+            self.check_server_health()
+        return self.isRunning
+
+    async def ready(self,
+                    on_event: Callable[['StartupEvent'], None] = None,
+                    timeout: Optional[float] = None,
+                    poll_interval: float = 1.0) -> 'RosieLLM':
+        """
+        Waits for the server like wait_until_ready(), in a worker thread so the event loop keeps running.
+        Args:
+            on_event (Callable[[StartupEvent], None], optional): Called (from the worker thread) with each startup event.
+            timeout (float, optional): Maximum seconds to wait. Defaults to None (no limit).
+            poll_interval (float): Seconds between reads of the output file and between health checks.
+        Returns:
+            RosieLLM: This client, ready for requests.
+        Raises:
+            RuntimeError: If the job failed to launch or start.
+            TimeoutError: If the server isn't ready within the timeout.
+        """
+        import asyncio
+
+        start = time.time()
+        if await asyncio.to_thread(self.wait_until_ready, on_event, timeout, poll_interval):
+            return self
+        if self.launch_state == 'failed':
+            reason = f": {self._launch_error}" if self._launch_error else ", see the errors logged above"
+            raise RuntimeError(f"Job {self.manager.job_id or self.manager.job_name} failed to launch{reason}.")
+        if self.last_event and self.last_event.kind in ('error', 'job_ended'):
+            raise RuntimeError(f"Job {self.manager.job_id} failed to start: {self.last_event.message}. "
+                               f"See {self.manager.out_file}.")
+        raise TimeoutError(f"Job {self.manager.job_id} wasn't ready after {time.time() - start:.0f}s "
+                           f"(launch state: {self.launch_state}).")
+
+    @staticmethod
+    def _log_startup_event(event: 'StartupEvent') -> None:
+        progress = f" ({event.progress:.0%})" if event.progress is not None else ""
+        level = logging.ERROR if event.kind in ('error', 'job_ended') else logging.INFO
+        logger.log(level, f"[{event.kind}]{progress} {event.message}")
+
+    def launch_report(self) -> Dict[str, Any]:
+        """
+        Returns how long each phase of this RosieLLM's launch took (see LaunchTimer.report()).
+        Remote phases are filled in as startup_events()/wait_until_ready() observe them.
+        """
+        return self.timer.report()
 
     @property
     def http_client(self):
+        if not self.breaker.allow_request():
+            raise ConnectionError(f"Server for job {self.manager.job_id} is failing health checks, not sending requests to it."
+                                  + (" A replacement job is being launched." if self.monitor and self.monitor.auto_relaunch else ""))
         self.check_server_health()
         if self.isRunning:
             return self._http_client
@@ -91,23 +673,66 @@ class RosieLLM:
         self._http_client = value
         self.isRunning = False
 
+    def probe_health(self, timeout: float = 10.0, web_path: str = None) -> Optional[int]:
+        """
+        Requests /health once over the shared connection pool.
+        Args:
+            timeout (float): Seconds to wait for the response.
+            web_path (str, optional): The server to check. Defaults to the current job's.
+        Returns:
+            int: The status code, or None if the server couldn't be reached.
+        """
+        from rosiellm.RosieHTTP import openai_httpx
+
+        try:
+            start = time.perf_counter()
+            status = self.session.get(f"{web_path or self.rosie_web_path}/health", timeout=timeout).status_code
+            if web_path is None:
+                self.metrics.observe('proxy_rtt', time.perf_counter() - start)
+            return status
+        except openai_httpx().HTTPError as e:
+            logger.debug(f"Health check failed: {e}")
+            return None
+
+    def probe_job(self, route: 'JobRoute' = None, timeout: float = 10.0) -> Optional[int]:
+        """
+        Requests /health from every server of a job, one per co-located model.
+        Args:
+            route (JobRoute, optional): The job's route. Defaults to the current job's.
+            timeout (float): Seconds to wait for each response.
+        Returns:
+            int: 200 if every server is healthy, otherwise the first other status code, or None if a server
+                couldn't be reached.
+        """
+        route = route or self.router.current
+        # the current job's first server is probed as web_path=None, which records the proxy round trip
+        web_paths = [None if route is self.router.current else route.web_path, *route.model_paths.values()]
+        for web_path in web_paths:
+            status = self.probe_health(timeout, web_path)
+            if status != 200:
+                return status
+        return 200
+
     def check_server_health(self):
+        from rosiellm.RosieHTTP import openai_httpx
+
         if not self.isRunning:
             try:
                 logger.info("Checking server health...")
-                r = requests.get(f"{self.rosie_web_path}/health",
-                                 headers={'Authorization': f'Basic {self.rosie_auth.get_rosie_auth()}'}
-                )
-                self.isRunning = r.status_code == 200
-                logger.info(f"Health check status: {r.status_code}: {requests.status_codes._codes[r.status_code][0]}")
+                status = self.probe_job()
+                self.isRunning = status == 200
+                if self.isRunning:
+                    self.breaker.record_success()
+                    self.timer.mark('healthy')
+                if status is None:
+                    logger.info("Health check failed, Server not running.")
+                    return
+                logger.info(f"Health check status: {status}: {openai_httpx().codes.get_reason_phrase(status)}")
                 if self.isRunning:
                     logger.info("Server is running.")
                 else:
                     # if server can be reached but /health doesn't return 200, it's likely there is an Auth issue
                     logger.error("Server cannot be accessed.")
-            except requests.exceptions.RequestException as e:
-                self.isRunning = False
-                logger.info(f"Health check failed, Server not running: {e}")
             except Exception as e:
                 self.isRunning = False
                 logger.critical(f"Unexpected error during health check: {e}")
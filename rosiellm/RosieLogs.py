@@ -0,0 +1,175 @@
+import re
+import time
+import errno
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# written by the sbatch script before anything else, so lines from an earlier job in the same file are skipped
+START_MARKER = 'RosieLLM job {job_id} starting'
+
+@dataclass
+class StartupEvent:
+    """
+    A milestone in a job's startup, parsed from its output file.
+    Attributes:
+        kind (str): One of "job_started", "pip_install", "vllm_ready", "download", "staging", "loading_weights",
+            "weights_loaded", "cuda_graph_capture", "cuda_graph_done", "server_started", "error" or "job_ended".
+        message (str): The log line (or description) the event was parsed from.
+        timestamp (float): When the client observed the event (time.time()).
+        progress (float): Completion between 0 and 1 for progress events (downloads, staging, shard loading), otherwise None.
+    """
+    kind: str
+    message: str
+    timestamp: float
+    progress: Optional[float] = None
+
+# (kind, pattern) pairs tried in order; a "progress" group is a percentage
+STARTUP_PATTERNS = [
+    ('pip_install', re.compile(r'vllm not found\. Installing|^(Collecting|Installing collected packages|Successfully installed) ')),
+    ('vllm_ready', re.compile(r'vllm already installed')),
+    ('staging', re.compile(r'Staging model weights:\s+(?P<progress>\d+)%')),
+    ('loading_weights', re.compile(r'Loading safetensors checkpoint shards:\s+(?P<progress>\d+)% Completed')),
+    ('download', re.compile(r'^(?P<file>\S+\.(safetensors|bin|pt|json|model)):\s+(?P<progress>\d+)%\|')),
+    ('weights_loaded', re.compile(r'Loading model weights took|Model loading took')),
+    ('cuda_graph_done', re.compile(r'Graph capturing finished')),
+    ('cuda_graph_capture', re.compile(r'Capturing (cudagraphs|the model for CUDA graphs)')),
+    ('server_started', re.compile(r'Uvicorn running on|Application startup complete')),
+    ('error', re.compile(r'Traceback \(most recent call last\)|CUDA out of memory|OutOfMemoryError|^(\S+Error|Error): ')),
+]
+
+def parse_startup_line(line: str, timestamp: float = None) -> Optional[StartupEvent]:
+    """
+    Parses a line of a job's output into a StartupEvent.
+    Args:
+        line (str): The log line.
+        timestamp (float, optional): When the line was read. Defaults to now.
+    Returns:
+        StartupEvent: The event, or None if the line isn't a known milestone.
+    """
+    for kind, pattern in STARTUP_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            progress = match.groupdict().get('progress')
+            return StartupEvent(kind, line.strip(), timestamp or time.time(),
+                                int(progress) / 100 if progress is not None else None)
+    return None
+
+class LogTailer:
+    """
+    Follows a remote file over SFTP, reading only the bytes appended since the last poll.
+    """
+    def __init__(self, rosie_ssh, path: str):
+        """
+        Initialize the tailer.
+        Args:
+            rosie_ssh (RosieSSH): A connected RosieSSH.
+            path (str): The remote file to follow.
+        """
+        self.rosie_ssh = rosie_ssh
+        self.path = path
+        self.offset = 0
+        self._partial = b''
+        self._sftp = None
+
+    def read_lines(self) -> List[str]:
+        """
+        Reads the complete lines written since the last call. Carriage returns (e.g. from progress bars)
+        also end a line. If the file shrank (a new job truncated it), it is read again from the start.
+        Returns:
+            List[str]: The new lines, without line endings.
+        """
+        import paramiko
+
+        try:
+            data = self._read_new()
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            if isinstance(e, OSError) and e.errno == errno.ENOENT:
+                return []
+            # the connection may have dropped or failed over; retry once on a fresh SFTP session
+            self.close()
+            try:
+                data = self._read_new()
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    return []
+                raise
+        if not data:
+            return []
+        *lines, self._partial = re.split(rb'\r\n|\r|\n', self._partial + data)
+        return [line.decode(errors='ignore') for line in lines if line.strip()]
+
+    def close(self) -> None:
+        if self._sftp:
+            self._sftp.close()
+            self._sftp = None
+
+    def _read_new(self) -> bytes:
+        if self._sftp is None:
+            self._sftp = self.rosie_ssh.open_sftp()
+        size = self._sftp.stat(self.path).st_size
+        if size < self.offset:
+            self.offset = 0
+            self._partial = b''
+        if size == self.offset:
+            return b''
+        with self._sftp.open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+        return data
+
+class StartupMonitor:
+    """
+    Turns a job's output file into a stream of StartupEvents.
+    Lines written before the job's start marker (i.e. by an earlier job using the same file) are ignored.
+    """
+    def __init__(self, rosie_ssh, path: str, job_id: str = None):
+        """
+        Initialize the monitor.
+        Args:
+            rosie_ssh (RosieSSH): A connected RosieSSH.
+            path (str): The job's output file.
+            job_id (str, optional): The job id. If not provided, every line of the file is parsed.
+        """
+        self.tailer = LogTailer(rosie_ssh, path)
+        self.marker = START_MARKER.format(job_id=job_id) if job_id else None
+        self.started = job_id is None
+        self.events: List[StartupEvent] = []
+
+    @property
+    def phase(self) -> Optional[str]:
+        """
+        The kind of the latest event, or None if the job hasn't logged anything yet.
+        """
+        return self.events[-1].kind if self.events else None
+
+    def poll(self) -> List[StartupEvent]:
+        """
+        Reads new output and returns the events it contains.
+        Progress events are only reported when the percentage changes.
+        """
+        now = time.time()
+        events = []
+        for line in self.tailer.read_lines():
+            if not self.started:
+                if self.marker in line:
+                    self.started = True
+                    event = StartupEvent('job_started', line.strip(), now)
+                    events.append(event)
+                    self.events.append(event)
+                continue
+            event = parse_startup_line(line, now)
+            if event is None:
+                continue
+            last = self.events[-1] if self.events else None
+            if event.progress is not None and last and last.kind == event.kind and last.progress == event.progress:
+                continue
+            events.append(event)
+            self.events.append(event)
+        return events
+
+    def close(self) -> None:
+        self.tailer.close()
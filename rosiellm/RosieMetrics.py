@@ -0,0 +1,343 @@
+import time
+import bisect
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# bucket upper bounds, each sqrt(2) times the previous: 1ms to ~25min for latencies, 1 to ~46k for rates
+LATENCY_BUCKETS = [0.001 * 2 ** (i / 2) for i in range(41)]
+RATE_BUCKETS = [2 ** (i / 2) for i in range(32)]
+# what each request-level metric measures, in seconds unless noted
+METRICS = {
+    'time_to_headers': "Until the response headers of a streamed request: queueing, connecting and the dh-ood proxy.",
+    'ttft': "Time to the first token of a streamed request.",
+    'inter_token_latency': "Between consecutive tokens of a streamed request.",
+    'e2e_latency': "From sending a request to its last token.",
+    'tokens_per_second': "Completion tokens per second of a request, end to end.",
+    'decode_tokens_per_second': "Completion tokens per second after the first token, for streamed requests.",
+    'proxy_rtt': "Round trip of a /health check through the proxy, with no model work.",
+}
+RATE_METRICS = ('tokens_per_second', 'decode_tokens_per_second')
+
+ExportHook = Callable[[str, float, Dict[str, str]], None]
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    The exact q-quantile (0 to 1) of a list of samples, interpolating linearly between the closest two.
+    Returns NaN for an empty list.
+    """
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    k = (len(values) - 1) * q
+    lower, upper = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+class Histogram:
+    """
+    A fixed-bucket histogram with percentile estimates, cheap enough to update on every token.
+    """
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = buckets or LATENCY_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1) # the last bucket holds everything above the largest bound
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Estimates a percentile (q between 0 and 1) by interpolating within its bucket.
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for i, count in enumerate(self.counts):
+                if count and seen + count >= rank:
+                    lower = self.buckets[i - 1] if i > 0 else self.min
+                    upper = self.buckets[i] if i < len(self.buckets) else self.max
+                    lower, upper = max(lower, self.min), min(upper, self.max)
+                    return lower + (upper - lower) * (rank - seen) / count
+                seen += count
+            return self.max
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+class RequestMetrics:
+    """
+    Latency and throughput of the requests sent to one job, collected by MeteredOpenAI (see METRICS).
+    Each observation can also be passed to an export hook, e.g. prometheus_exporter() or opentelemetry_exporter().
+    """
+    def __init__(self, labels: Callable[[], Dict[str, str]] = None, export: ExportHook = None):
+        """
+        Initialize empty metrics.
+        Args:
+            labels (Callable[[], Dict[str, str]], optional): Returns the labels exported with each observation,
+                e.g. the job id and node, which can change over a RosieLLM's life.
+            export (Callable[[str, float, Dict[str, str]], None], optional): Called with (metric, value, labels)
+                for every observation.
+        """
+        self.labels = labels or (lambda: {})
+        self.export = export
+        self.histograms = {name: Histogram(RATE_BUCKETS if name in RATE_METRICS else LATENCY_BUCKETS) for name in METRICS}
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = Lock()
+
+    def observe(self, name: str, value: float) -> None:
+        self.histograms[name].observe(value)
+        if self.export:
+            try:
+                self.export(name, value, self.labels())
+            except Exception as e:
+                logger.warning(f"Metrics export hook failed: {e}")
+
+    def record_request(self, start: float, end: float, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                       first_token: float = None) -> None:
+        """
+        Records a finished request. Timestamps are time.perf_counter() values.
+        """
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+        self.observe('e2e_latency', end - start)
+        if completion_tokens:
+            self.observe('tokens_per_second', completion_tokens / max(end - start, 1e-6))
+            if first_token is not None and completion_tokens > 1 and end > first_token:
+                self.observe('decode_tokens_per_second', (completion_tokens - 1) / (end - first_token))
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Percentile summaries of every metric that has observations, plus request and token counts.
+        """
+        summary = {name: h.summary() for name, h in self.histograms.items() if h.count}
+        summary.update(requests=self.requests, errors=self.errors,
+                       prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens)
+        return summary
+
+class MeteredOpenAI:
+    """
+    Wraps an OpenAI or AsyncOpenAI client so chat and text completions (streaming or not) are timed into a
+    RequestMetrics. Streams are passed through unchanged; everything else goes straight to the wrapped client.
+    """
+    def __init__(self, client: Any, metrics: RequestMetrics):
+        from openai import AsyncOpenAI
+
+        self._client = client
+        self.metrics = metrics
+        self.is_async = isinstance(client, AsyncOpenAI)
+        self.chat = _MeteredNamespace(client.chat, completions=_MeteredCompletions(lambda: client.chat.completions, self))
+        self.completions = _MeteredCompletions(lambda: client.completions, self)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+class _MeteredNamespace:
+    def __init__(self, target, **overrides):
+        self._target = target
+        self.__dict__.update(overrides)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+class _MeteredCompletions:
+    def __init__(self, resource: Callable[[], Any], owner: MeteredOpenAI):
+        self._resource = resource
+        self._owner = owner
+
+    def __getattr__(self, name):
+        return getattr(self._resource(), name)
+
+    def create(self, **kwargs):
+        if self._owner.is_async:
+            return self._acreate(**kwargs)
+        metrics = self._owner.metrics
+        start = time.perf_counter()
+        try:
+            response = self._resource().create(**kwargs)
+        except Exception:
+            metrics.record_error()
+            raise
+        if kwargs.get('stream'):
+            metrics.observe('time_to_headers', time.perf_counter() - start)
+            return _MeteredStream(response, _StreamTimer(metrics, start))
+        _record_response(metrics, start, response)
+        return response
+
+    async def _acreate(self, **kwargs):
+        metrics = self._owner.metrics
+        start = time.perf_counter()
+        try:
+            response = await self._resource().create(**kwargs)
+        except Exception:
+            metrics.record_error()
+            raise
+        if kwargs.get('stream'):
+            metrics.observe('time_to_headers', time.perf_counter() - start)
+            return _MeteredAsyncStream(response, _StreamTimer(metrics, start))
+        _record_response(metrics, start, response)
+        return response
+
+def _record_response(metrics: RequestMetrics, start: float, response) -> None:
+    usage = getattr(response, 'usage', None)
+    metrics.record_request(start, time.perf_counter(),
+                           getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None))
+
+class _StreamTimer:
+    # follows one stream's chunks; without usage in the stream, each chunk with text counts as one token
+    def __init__(self, metrics: RequestMetrics, start: float):
+        self.metrics = metrics
+        self.start = start
+        self.first_token = None
+        self.last_token = None
+        self.tokens = 0
+        self.usage = None
+        self.done = False
+
+    def on_chunk(self, chunk) -> None:
+        if getattr(chunk, 'usage', None):
+            self.usage = chunk.usage
+        if not any(_chunk_text(choice) for choice in getattr(chunk, 'choices', None) or []):
+            return
+        now = time.perf_counter()
+        if self.first_token is None:
+            self.first_token = now
+            self.metrics.observe('ttft', now - self.start)
+        else:
+            self.metrics.observe('inter_token_latency', now - self.last_token)
+        self.last_token = now
+        self.tokens += 1
+
+    def finish(self) -> None:
+        if self.done:
+            return
+        self.done = True
+        completion_tokens = getattr(self.usage, 'completion_tokens', None) or self.tokens
+        self.metrics.record_request(self.start, time.perf_counter(), getattr(self.usage, 'prompt_tokens', None),
+                                    completion_tokens, self.first_token)
+
+def _chunk_text(choice) -> Optional[str]:
+    delta = getattr(choice, 'delta', None)
+    return getattr(delta, 'content', None) if delta is not None else getattr(choice, 'text', None)
+
+class _MeteredStream:
+    def __init__(self, stream, timer: _StreamTimer):
+        self._stream = stream
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                self._timer.on_chunk(chunk)
+                yield chunk
+        finally:
+            self._timer.finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._stream.close()
+        self._timer.finish()
+
+class _MeteredAsyncStream:
+    def __init__(self, stream, timer: _StreamTimer):
+        self._stream = stream
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                self._timer.on_chunk(chunk)
+                yield chunk
+        finally:
+            self._timer.finish()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self) -> None:
+        await self._stream.close()
+        self._timer.finish()
+
+def prometheus_exporter(prefix: str = 'rosiellm', registry=None) -> ExportHook:
+    """
+    An export hook that feeds Prometheus histograms (requires prometheus_client), e.g.
+    RosieLLM(metrics_export=prometheus_exporter()) and prometheus_client.start_http_server(9100).
+    """
+    try:
+        from prometheus_client import Histogram as PrometheusHistogram, REGISTRY
+    except ImportError:
+        raise ImportError("prometheus_exporter() needs prometheus_client: pip install prometheus-client")
+    histograms = {}
+    lock = Lock()
+
+    def export(name: str, value: float, labels: Dict[str, str]) -> None:
+        with lock:
+            if name not in histograms:
+                buckets = RATE_BUCKETS if name in RATE_METRICS else LATENCY_BUCKETS
+                histograms[name] = PrometheusHistogram(f"{prefix}_{name}", METRICS[name], sorted(labels),
+                                                       buckets=buckets, registry=registry or REGISTRY)
+        histograms[name].labels(**labels).observe(value)
+    return export
+
+def opentelemetry_exporter(meter=None) -> ExportHook:
+    """
+    An export hook that records to OpenTelemetry histograms (requires opentelemetry-api),
+    using the global meter provider unless a meter is given.
+    """
+    try:
+        from opentelemetry import metrics as otel_metrics
+    except ImportError:
+        raise ImportError("opentelemetry_exporter() needs opentelemetry: pip install opentelemetry-api opentelemetry-sdk")
+    meter = meter or otel_metrics.get_meter('rosiellm')
+    histograms = {}
+    lock = Lock()
+
+    def export(name: str, value: float, labels: Dict[str, str]) -> None:
+        with lock:
+            if name not in histograms:
+                unit = 'tokens/s' if name in RATE_METRICS else 's'
+                histograms[name] = meter.create_histogram(f"rosiellm.{name}", unit=unit, description=METRICS[name])
+        histograms[name].record(value, attributes=labels)
+    return export
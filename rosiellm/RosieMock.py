@@ -0,0 +1,706 @@
+import os
+import re
+import json
+import base64
+import struct
+import time
+import shlex
+import hashlib
+import socket
+import tempfile
+import threading
+import traceback
+import logging
+from types import SimpleNamespace
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import paramiko
+
+from rosiellm import RosieOffline
+
+logger = logging.getLogger(__name__)
+
+class MockVLLMServer:
+    """
+    A local stand-in for a vLLM OpenAI-compatible server, with configurable synthetic delays.
+    Every path ending in /health, /v1/models, /v1/chat/completions, /v1/embeddings or the LoRA adapter endpoints is
+    served, so it works behind any route prefix (e.g. the /node/<node>/<port> route RosieLLM builds). Requests are
+    counted per prefix in `routes`, which shows which of a job's co-located servers they were sent to.
+    """
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 model: str = 'mock-model',
+                 ttft: float = 0.0,
+                 inter_token_latency: float = 0.0,
+                 prefill_latency: float = 0.0,
+                 max_tokens: int = 16,
+                 embedding_dim: int = 32,
+                 healthy: bool = True):
+        """
+        Initialize the server (call start() to begin serving).
+        Args:
+            host (str, optional): The address to bind. Defaults to 127.0.0.1.
+            port (int, optional): The port to bind. Defaults to 0 (any free port).
+            model (str, optional): The model name reported in responses. Defaults to "mock-model".
+            ttft (float, optional): Seconds before the first token of each completion. Defaults to 0.
+            inter_token_latency (float, optional): Seconds between tokens. Defaults to 0.
+            prefill_latency (float, optional): Extra seconds before the first token per prompt token (word). Defaults to 0.
+            max_tokens (int, optional): Tokens generated when a request doesn't set max_tokens. Defaults to 16.
+            embedding_dim (int, optional): The length of the (deterministic, text-derived) embeddings. Defaults to 32.
+            healthy (bool, optional): Whether /health answers 200 (otherwise 503). Defaults to True.
+        """
+        self.host = host
+        self.port = port
+        self.model = model
+        self.ttft = ttft
+        self.inter_token_latency = inter_token_latency
+        self.prefill_latency = prefill_latency
+        self.max_tokens = max_tokens
+        self.embedding_dim = embedding_dim
+        self.healthy = healthy
+        self.requests_served = 0
+        self.requests_rejected = 0 # completions and embeddings answered 503 while unhealthy
+        self.routes = Counter()
+        self.last_headers: Dict[str, str] = {} # of the last POST, lowercased
+        self.lora_adapters: Dict[str, str] = {}
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> 'MockVLLMServer':
+        self._server = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='MockVLLMServer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def embed_text(self, text: str) -> List[float]:
+        """
+        The vector the server returns for a text: unit length, derived from a hash of the text.
+        """
+        digest = hashlib.sha256(text.encode()).digest()
+        vector = [digest[i % len(digest)] / 255.0 - 0.5 + i * 1e-3 for i in range(self.embedding_dim)]
+        norm = sum(v * v for v in vector) ** 0.5
+        return [v / norm for v in vector]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def _make_handler(mock: MockVLLMServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # headers and body are separate writes; with Nagle's algorithm each response would wait on a delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path.endswith('/health'):
+                self._send_json(200 if mock.healthy else 503, {})
+            elif path.endswith('/v1/models'):
+                models = [mock.model] + list(mock.lora_adapters)
+                self._send_json(200, {'object': 'list', 'data': [{'id': model, 'object': 'model', 'created': 0, 'owned_by': 'mock'}
+                                                                 for model in models]})
+            else:
+                self._send_json(404, {'error': {'message': f'Not found: {path}'}})
+
+        def do_POST(self):
+            path = self.path.split('?')[0]
+            mock.last_headers = {name.lower(): value for name, value in self.headers.items()}
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if path.endswith(('/v1/load_lora_adapter', '/v1/unload_lora_adapter')):
+                self._update_adapters(path, body)
+                return
+            if not path.endswith(('/v1/chat/completions', '/v1/embeddings')):
+                self._send_json(404, {'error': {'message': f'Not found: {path}'}})
+                return
+            if not mock.healthy:
+                mock.requests_rejected += 1
+                self._send_json(503, {'error': {'message': 'Server is not ready'}})
+                return
+            mock.requests_served += 1
+            mock.routes[path[:path.rfind('/v1/')]] += 1
+            if path.endswith('/v1/embeddings'):
+                self._embed(body)
+                return
+            n_tokens = int(body.get('max_tokens') or body.get('max_completion_tokens') or mock.max_tokens)
+            prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+            if body.get('stream'):
+                self._stream(body, n_tokens, prompt_tokens)
+            else:
+                time.sleep(mock.ttft + mock.prefill_latency * prompt_tokens + mock.inter_token_latency * max(0, n_tokens - 1))
+                self._send_json(200, {
+                    'id': f'chatcmpl-mock-{mock.requests_served}', 'object': 'chat.completion', 'created': int(time.time()),
+                    'model': body.get('model', mock.model),
+                    'choices': [{'index': 0, 'finish_reason': 'length',
+                                 'message': {'role': 'assistant', 'content': ' '.join(['token'] * n_tokens)}}],
+                    'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': n_tokens, 'total_tokens': prompt_tokens + n_tokens},
+                })
+
+        def _update_adapters(self, path, body):
+            # like vLLM, which answers 400 for a name already loaded and 404 for one that isn't
+            name = body.get('lora_name')
+            if path.endswith('/v1/load_lora_adapter'):
+                if name in mock.lora_adapters:
+                    self._send_json(400, {'error': {'message': f'The lora adapter {name} has already been loaded.'}})
+                    return
+                mock.lora_adapters[name] = body.get('lora_path')
+                self._send_json(200, {})
+            elif mock.lora_adapters.pop(name, None) is None:
+                self._send_json(404, {'error': {'message': f"The lora adapter '{name}' cannot be found."}})
+            else:
+                self._send_json(200, {})
+
+        def _embed(self, body):
+            inputs = body.get('input', [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            prompt_tokens = sum(len(text.split()) for text in inputs)
+            time.sleep(mock.ttft + mock.prefill_latency * prompt_tokens)
+            data = []
+            for i, text in enumerate(inputs):
+                # the same text always gets the same vector, so results can be checked against embed_text()
+                vector = mock.embed_text(text)
+                if body.get('encoding_format') == 'base64':
+                    vector = base64.b64encode(struct.pack(f'<{len(vector)}f', *vector)).decode()
+                data.append({'object': 'embedding', 'index': i, 'embedding': vector})
+            self._send_json(200, {'object': 'list', 'model': body.get('model', mock.model), 'data': data,
+                                  'usage': {'prompt_tokens': prompt_tokens, 'total_tokens': prompt_tokens}})
+
+        def _stream(self, body, n_tokens, prompt_tokens):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            base = {'id': f'chatcmpl-mock-{mock.requests_served}', 'object': 'chat.completion.chunk',
+                    'created': int(time.time()), 'model': body.get('model', mock.model)}
+            time.sleep(mock.ttft + mock.prefill_latency * prompt_tokens)
+            for i in range(n_tokens):
+                if i:
+                    time.sleep(mock.inter_token_latency)
+                delta = {'content': 'token' if i == 0 else ' token'}
+                if i == 0:
+                    delta['role'] = 'assistant'
+                self._send_event({**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+            final = {**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'length'}]}
+            if (body.get('stream_options') or {}).get('include_usage'):
+                final['usage'] = {'prompt_tokens': prompt_tokens, 'completion_tokens': n_tokens, 'total_tokens': prompt_tokens + n_tokens}
+            self._send_event(final)
+            self._send_chunk(b'data: [DONE]\n\n')
+            self._send_chunk(b'')
+
+        def _send_event(self, payload):
+            self._send_chunk(f'data: {json.dumps(payload)}\n\n'.encode())
+
+        def _send_chunk(self, data: bytes):
+            self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+            self.wfile.flush()
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+# the SamplingParams arguments MockOfflineEngine accepts, others fail like they would in vLLM
+MOCK_SAMPLING_PARAMS = ('n', 'temperature', 'top_p', 'top_k', 'min_p', 'stop', 'seed', 'presence_penalty',
+                        'frequency_penalty', 'repetition_penalty', 'max_tokens', 'ignore_eos')
+
+class MockOfflineEngine:
+    """
+    A stand-in for RosieOffline.VLLMEngine: each step finishes up to batch_size queued requests with the same
+    synthetic output as MockVLLMServer ("token token ...", max_tokens long).
+    """
+    def __init__(self,
+                 model: str = 'mock-model',
+                 max_tokens: int = 16,
+                 step_latency: float = 0.0,
+                 batch_size: int = 64,
+                 cancelled: threading.Event = None):
+        """
+        Initialize the engine.
+        Args:
+            model (str, optional): The model name reported in responses. Defaults to "mock-model".
+            max_tokens (int, optional): Tokens generated when a request doesn't set max_tokens. Defaults to 16.
+            step_latency (float, optional): Seconds each step takes. Defaults to 0.
+            batch_size (int, optional): The most requests finished per step. Defaults to 64.
+            cancelled (threading.Event, optional): Once set, step() raises, as if the job was killed.
+        """
+        self.model = model
+        self.max_tokens = max_tokens
+        self.step_latency = step_latency
+        self.batch_size = batch_size
+        self.cancelled = cancelled or threading.Event()
+        self.queue: List[SimpleNamespace] = []
+
+    def add(self, request_id: str, request: Dict) -> None:
+        chat, prompt = RosieOffline.request_prompt(request)
+        kwargs = RosieOffline.sampling_kwargs(request)
+        unknown = [key for key in kwargs if key not in MOCK_SAMPLING_PARAMS]
+        if unknown:
+            raise TypeError(f"SamplingParams got unexpected keyword arguments: {', '.join(unknown)}")
+        n_prompt = sum(len(str(m.get('content', '')).split()) for m in prompt) if chat else len(prompt.split())
+        n_tokens = int(kwargs.get('max_tokens') or self.max_tokens)
+        outputs = [SimpleNamespace(index=i, text=' '.join(['token'] * n_tokens), token_ids=[0] * n_tokens,
+                                   finish_reason='length') for i in range(int(kwargs.get('n') or 1))]
+        self.queue.append(SimpleNamespace(request_id=request_id, finished=True, prompt_token_ids=[0] * n_prompt,
+                                          outputs=outputs))
+
+    def step(self) -> List[SimpleNamespace]:
+        if self.cancelled.wait(self.step_latency):
+            raise RuntimeError("The job was cancelled.")
+        finished, self.queue = self.queue[:self.batch_size], self.queue[self.batch_size:]
+        return finished
+
+class _FakeJob:
+    def __init__(self, job_id: int, name: str, out_file: str, user: str):
+        self.job_id = job_id
+        self.name = name
+        self.out_file = out_file
+        self.user = user
+        self.state = 'PENDING'
+        self.reason = 'Priority'
+        self.node = ''
+        self.submitted = time.time()
+        self.started = None
+        self.time_limit = None
+        self.offline = None # the --input, --output and --max-pending of an offline batch job
+        self.ports = ['1234'] # one vLLM server per co-located model
+        self.cancelled = threading.Event()
+
+# metadata of RosieLLM's default model, so launches against the fake cluster can be sized without the HuggingFace Hub
+DEFAULT_MODEL = 'NousResearch/Meta-Llama-3-8B-Instruct'
+DEFAULT_MODEL_CONFIG = {
+    'architectures': ['LlamaForCausalLM'], 'hidden_size': 4096, 'intermediate_size': 14336,
+    'num_hidden_layers': 32, 'num_attention_heads': 32, 'num_key_value_heads': 8, 'vocab_size': 128256,
+    'max_position_embeddings': 8192, 'tie_word_embeddings': False, 'torch_dtype': 'bfloat16',
+}
+DEFAULT_MODEL_INDEX = {'metadata': {'total_size': 16060522496}, 'weight_map': {}}
+
+class FakeRosieCluster:
+    """
+    A local stand-in for Rosie: an SSH/SFTP server that emulates the SLURM commands RosieLLM runs
+    (sbatch, squeue, sacct, scancel) and plays back a vLLM startup log for each submitted job
+    (offline batch jobs run their requests through a MockOfflineEngine instead).
+    Remote paths are mapped into a local root directory. Once a job's log reports the server started,
+    the attached MockVLLMServer turns healthy.
+    """
+    def __init__(self,
+                 username: str = 'rosie',
+                 password: str = 'password',
+                 root: str = None,
+                 vllm: MockVLLMServer = None,
+                 queue_delay: float = 0.5,
+                 container_delay: float = 0.2,
+                 model_load_delay: float = 0.5,
+                 cuda_graph_delay: float = 0.2,
+                 server_start_delay: float = 0.1,
+                 offline_step_latency: float = 0.01,
+                 time_limit: float = None):
+        """
+        Initialize the cluster (call start() to begin serving).
+        Args:
+            username (str, optional): The accepted SSH username. Defaults to "rosie".
+            password (str, optional): The accepted SSH password. Defaults to "password".
+            root (str, optional): Local directory remote paths are mapped into. Defaults to a new temporary directory.
+            vllm (MockVLLMServer, optional): The server that comes up when a job finishes starting. Defaults to a new one.
+            queue_delay (float, optional): Seconds a job stays PENDING. Defaults to 0.5.
+            container_delay (float, optional): Seconds from job start until vllm is available in the container.
+            model_load_delay (float, optional): Seconds spent loading weights.
+            cuda_graph_delay (float, optional): Seconds spent capturing CUDA graphs.
+            server_start_delay (float, optional): Seconds from graph capture until Uvicorn is serving.
+            offline_step_latency (float, optional): Seconds per engine step of offline batch jobs, which run
+                RosieOffline with a MockOfflineEngine on the mapped files.
+            time_limit (float, optional): Seconds a job may run before it ends with TIMEOUT. Defaults to the script's --time.
+        """
+        self.username = username
+        self.password = password
+        self.root = root or tempfile.mkdtemp(prefix='fake-rosie-')
+        self.vllm = vllm or MockVLLMServer(healthy=False)
+        self.delays = {'queue': queue_delay, 'container': container_delay, 'model_load': model_load_delay,
+                       'cuda_graph': cuda_graph_delay, 'server_start': server_start_delay}
+        self.offline_step_latency = offline_step_latency
+        self.time_limit = time_limit
+        self.jobs: Dict[int, _FakeJob] = {}
+        self.commands: List[str] = []
+        self.port = None
+        self._next_job_id = 1000
+        self._lock = threading.Lock()
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._sock = None
+        self.add_model(DEFAULT_MODEL, DEFAULT_MODEL_CONFIG, DEFAULT_MODEL_INDEX)
+
+    @property
+    def address(self) -> str:
+        """
+        The "host:port" address to pass to RosieSSH.
+        """
+        return f"127.0.0.1:{self.port}"
+
+    def local_path(self, remote_path: str) -> str:
+        return os.path.join(self.root, remote_path.lstrip('/'))
+
+    def add_model(self, model: str, config: Dict, index: Dict = None,
+                  download_dir: str = '/data/ai_club/RosieLLM/models', revision: str = 'main') -> None:
+        """
+        Puts a model's config.json (and weight index) in the fake HuggingFace cache, as a download would.
+        """
+        repo = self.local_path(f"{download_dir}/models--{model.replace('/', '--')}")
+        commit = hashlib.sha1(f"{model}@{revision}".encode()).hexdigest()
+        os.makedirs(os.path.join(repo, 'refs'), exist_ok=True)
+        os.makedirs(os.path.join(repo, 'snapshots', commit), exist_ok=True)
+        with open(os.path.join(repo, 'refs', revision), 'w') as f:
+            f.write(commit)
+        for name, content in (('config.json', config), ('model.safetensors.index.json', index)):
+            if content is not None:
+                with open(os.path.join(repo, 'snapshots', commit, name), 'w') as f:
+                    json.dump(content, f)
+
+    def start(self) -> 'FakeRosieCluster':
+        if not self.vllm._server:
+            self.vllm.start()
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept, name='FakeRosieCluster', daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        for job in self.jobs.values():
+            job.cancelled.set()
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+        self.vllm.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _accept(self) -> None:
+        while self._sock:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self._host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, _make_sftp_interface(self))
+            try:
+                transport.start_server(server=_FakeSSHServer(self))
+            except (paramiko.SSHException, EOFError):
+                # e.g. a latency probe that only read the banner
+                continue
+
+    def run(self, command: str):
+        """
+        Emulates a remote command.
+        Returns:
+            Tuple[str, str, int]: stdout, stderr and exit status.
+        """
+        self.commands.append(command)
+        try:
+            argv = shlex.split(command)
+        except ValueError as e:
+            return '', f'{e}\n', 2
+        if not argv:
+            return '', '', 0
+        handler = getattr(self, f'_cmd_{argv[0]}', None)
+        if handler is None:
+            return '', f'bash: {argv[0]}: command not found\n', 127
+        return handler(argv[1:])
+
+    def _cmd_chmod(self, args):
+        return '', '', 0
+
+    def _cmd_rm(self, args):
+        for path in (a for a in args if not a.startswith('-')):
+            try:
+                os.remove(self.local_path(path))
+            except OSError:
+                pass
+        return '', '', 0
+
+    def _cmd_mkdir(self, args):
+        for path in (a for a in args if not a.startswith('-')):
+            os.makedirs(self.local_path(path), exist_ok=True)
+        return '', '', 0
+
+    def _cmd_sbatch(self, args):
+        script_path = [a for a in args if not a.startswith('-')][-1]
+        try:
+            with open(self.local_path(script_path), 'r') as f:
+                script = f.read()
+        except OSError as e:
+            return '', f'sbatch: error: Unable to open file {script_path}: {e}\n', 1
+        name = re.search(r"#SBATCH --job-name='?([^'\n]+)'?", script)
+        out_file = re.search(r'#SBATCH --output=(\S+)', script)
+        time_limit = re.search(r'#SBATCH --time=(\d+)-(\d+):(\d+):(\d+)', script)
+        with self._lock:
+            job_id = self._next_job_id
+            self._next_job_id += 1
+            job_name = name.group(1) if name else 'sbatch'
+            out_path = (out_file.group(1).replace('%j', str(job_id)).replace('%u', self.username).replace('%x', job_name)
+                        if out_file else f'/slurm-{job_id}.out')
+            job = self.jobs[job_id] = _FakeJob(job_id, job_name, out_path, self.username)
+            offline = re.search(r'RosieOffline-\w+\.py --input (\S+) --output (\S+) --max-pending (\d+)', script)
+            if offline:
+                job.offline = (offline.group(1), offline.group(2), int(offline.group(3)))
+            job.ports = re.findall(r'--port (\d+)', script) or job.ports
+            lora_modules = re.search(r'--lora-modules ((?:\S+=\S+ )+)', script)
+            if lora_modules:
+                self.vllm.lora_adapters.update(module.split('=', 1) for module in lora_modules.group(1).split())
+            if self.time_limit is not None:
+                job.time_limit = self.time_limit
+            elif time_limit:
+                days, hours, minutes, seconds = (int(g) for g in time_limit.groups())
+                job.time_limit = ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+        threading.Thread(target=self._play_job, args=(job,), daemon=True).start()
+        if '--parsable' in args:
+            return f'{job_id}\n', '', 0
+        return f'Submitted batch job {job_id}\n', '', 0
+
+    def _cmd_scancel(self, args):
+        for job_id in args:
+            job = self.jobs.get(int(job_id)) if job_id.isdigit() else None
+            if job and job.state in ('PENDING', 'RUNNING'):
+                job.state = 'CANCELLED'
+                job.cancelled.set()
+        return '', '', 0
+
+    def _cmd_squeue(self, args):
+        opts = self._parse_opts(args)
+        fmt = opts.get('-o', '%i %T %N')
+        jobs = self._select_jobs(opts)
+        rows = [self._format(job, fmt) for job in jobs if job.state in ('PENDING', 'RUNNING')]
+        if '-h' not in args:
+            rows.insert(0, fmt)
+        return ''.join(row + '\n' for row in rows), '', 0
+
+    def _cmd_sacct(self, args):
+        opts = self._parse_opts(args)
+        fields = opts.get('-o', 'JobID,State,NodeList,Reason').split(',')
+        values = {'JobID': 'job_id', 'State': 'state', 'NodeList': 'node', 'Reason': 'reason', 'JobName': 'name'}
+        rows = ['|'.join(str(getattr(job, values.get(f, 'name'), '')) for f in fields) for job in self._select_jobs(opts)]
+        return ''.join(row + '\n' for row in rows), '', 0
+
+    @staticmethod
+    def _parse_opts(args) -> Dict[str, str]:
+        opts = {}
+        for i, arg in enumerate(args):
+            if arg.startswith('-') and i + 1 < len(args) and not args[i + 1].startswith('-'):
+                opts[arg] = args[i + 1]
+        return opts
+
+    def _select_jobs(self, opts) -> List[_FakeJob]:
+        jobs = list(self.jobs.values())
+        if '-j' in opts:
+            ids = {int(j) for j in opts['-j'].split(',') if j.isdigit()}
+            jobs = [job for job in jobs if job.job_id in ids]
+        if '-n' in opts:
+            jobs = [job for job in jobs if job.name == opts['-n']]
+        return jobs
+
+    @staticmethod
+    def _format(job: _FakeJob, fmt: str) -> str:
+        time_left = 'INVALID'
+        if job.time_limit is not None:
+            left = int(max(0, job.time_limit - (time.time() - job.started if job.started else 0)))
+            time_left = f"{left // 3600}:{left // 60 % 60:02d}:{left % 60:02d}"
+        fields = {'i': job.job_id, 'T': job.state, 'N': job.node, 'r': job.reason or 'None',
+                  'j': job.name, 'u': job.user, 'L': time_left}
+        return re.sub(r'%(\w)', lambda m: str(fields.get(m.group(1), '')), fmt)
+
+    def _play_job(self, job: _FakeJob) -> None:
+        """
+        Moves a job from PENDING to RUNNING and writes a vLLM startup log, then marks the mock server healthy.
+        """
+        if job.offline:
+            self._play_offline_job(job)
+            return
+        steps = [
+            ('queue', None),
+            (None, f'RosieLLM job {job.job_id} starting on dh-node1'),
+            ('container', 'vllm already installed.'),
+            (None, 'Staging model weights: 100% (4/4 files)'),
+            ('model_load', 'Loading safetensors checkpoint shards: 100% Completed | 4/4'),
+            (None, 'INFO 00-00 00:00:00 model_runner.py:1 Loading model weights took 14.9596 GB'),
+            (None, 'INFO 00-00 00:00:00 model_runner.py:1 Capturing cudagraphs for decoding.'),
+            ('cuda_graph', 'INFO 00-00 00:00:00 model_runner.py:1 Graph capturing finished in 1 secs.'),
+        ] + [('server_start', f'INFO:     Uvicorn running on http://0.0.0.0:{port} (Press CTRL+C to quit)') for port in job.ports]
+        out_path = self.local_path(job.out_file)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        for delay, line in steps:
+            if delay and job.cancelled.wait(self.delays[delay]):
+                return
+            if delay == 'queue':
+                job.state, job.reason, job.node = 'RUNNING', None, 'dh-node1'
+                job.started = time.time()
+                if job.time_limit is not None:
+                    threading.Thread(target=self._enforce_time_limit, args=(job,), daemon=True).start()
+                # like SLURM, the output file is truncated when the job starts
+                open(out_path, 'w').close()
+            if line:
+                with open(out_path, 'a') as f:
+                    f.write(line + '\n')
+        self.vllm.healthy = True
+
+    def _play_offline_job(self, job: _FakeJob) -> None:
+        """
+        Runs an offline batch job's requests through RosieOffline with a MockOfflineEngine, then ends it COMPLETED
+        (or FAILED, with the traceback in its output file).
+        """
+        if job.cancelled.wait(self.delays['queue']):
+            return
+        job.state, job.reason, job.node = 'RUNNING', None, 'dh-node1'
+        job.started = time.time()
+        if job.time_limit is not None:
+            threading.Thread(target=self._enforce_time_limit, args=(job,), daemon=True).start()
+        out_path = self.local_path(job.out_file)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, 'w') as f:
+            f.write(f'RosieLLM job {job.job_id} starting on dh-node1\nvllm already installed.\n')
+        if job.cancelled.wait(self.delays['container'] + self.delays['model_load']):
+            return
+        input_path, output_path, max_pending = job.offline
+        engine = MockOfflineEngine(model=self.vllm.model, max_tokens=self.vllm.max_tokens,
+                                   step_latency=self.offline_step_latency, cancelled=job.cancelled)
+        try:
+            RosieOffline.run(engine, self.local_path(input_path), self.local_path(output_path), max_pending)
+        except Exception:
+            with open(out_path, 'a') as f:
+                f.write(traceback.format_exc())
+            if job.state == 'RUNNING':
+                job.state = 'FAILED'
+            return
+        job.state = 'COMPLETED'
+        job.cancelled.set()
+
+    @staticmethod
+    def _enforce_time_limit(job: _FakeJob) -> None:
+        if not job.cancelled.wait(job.time_limit):
+            job.state = 'TIMEOUT'
+            job.cancelled.set()
+
+class _FakeSSHServer(paramiko.ServerInterface):
+    def __init__(self, cluster: FakeRosieCluster):
+        self.cluster = cluster
+
+    def check_auth_password(self, username, password):
+        if username == self.cluster.username and password == self.cluster.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        def run():
+            stdout, stderr, status = self.cluster.run(command.decode(errors='ignore'))
+            # the exec request is acknowledged after this method returns; closing the channel
+            # before that makes the client's exec_command fail
+            time.sleep(0.005)
+            try:
+                if stdout:
+                    channel.sendall(stdout.encode())
+                if stderr:
+                    channel.sendall_stderr(stderr.encode())
+                channel.send_exit_status(status)
+                channel.shutdown_write()
+            finally:
+                channel.close()
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+def _make_sftp_interface(cluster: FakeRosieCluster):
+    class FakeSFTPInterface(paramiko.SFTPServerInterface):
+        def _local(self, path):
+            return cluster.local_path(self.canonicalize(path))
+
+        def stat(self, path):
+            try:
+                return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+
+        lstat = stat
+
+        def open(self, path, flags, attr):
+            local = self._local(path)
+            writing = flags & (os.O_WRONLY | os.O_RDWR)
+            try:
+                if writing:
+                    os.makedirs(os.path.dirname(local), exist_ok=True)
+                    f = open(local, 'ab' if flags & os.O_APPEND else 'wb')
+                else:
+                    f = open(local, 'rb')
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+            handle = paramiko.SFTPHandle(flags)
+            handle.filename = local
+            if writing:
+                handle.writefile = f
+            else:
+                handle.readfile = f
+            return handle
+
+        def remove(self, path):
+            try:
+                os.remove(self._local(path))
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+            return paramiko.SFTP_OK
+
+        def mkdir(self, path, attr):
+            try:
+                os.makedirs(self._local(path), exist_ok=True)
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+            return paramiko.SFTP_OK
+
+        def rename(self, oldpath, newpath):
+            try:
+                os.replace(self._local(oldpath), self._local(newpath))
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+            return paramiko.SFTP_OK
+
+        posix_rename = rename
+
+        def list_folder(self, path):
+            local = self._local(path)
+            try:
+                return [paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(local, name)), name)
+                        for name in os.listdir(local)]
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+
+    return FakeSFTPInterface
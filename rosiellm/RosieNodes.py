@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import socket
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from rosiellm.RosieSession import STATE_DIR
+
+MANAGEMENT_NODES = ['dh-mgmt1', 'dh-mgmt2', 'dh-mgmt3', 'dh-mgmt4']
+DOMAIN = 'hpc.msoe.edu'
+RANKING_TTL = 300
+
+logger = logging.getLogger(__name__)
+
+_ranking_cache = {'ranked_at': 0.0, 'nodes': []}
+
+def node_address(node: str) -> str:
+    return node if '.' in node else f"{node}.{DOMAIN}"
+
+def probe_node(node: str, port: int = 22, timeout: float = 2.0) -> Optional[float]:
+    """
+    Measures how quickly a management node answers: TCP connect plus the time to receive its SSH banner.
+    Args:
+        node (str): The node name (e.g. "dh-mgmt1") or address.
+        port (int, optional): The SSH port. Defaults to 22.
+        timeout (float, optional): Seconds to wait for the connection and the banner. Defaults to 2.
+    Returns:
+        float: The latency in seconds, or None if the node didn't answer within the timeout.
+    """
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((node_address(node), port), timeout=timeout) as sock:
+            sock.settimeout(max(0.01, timeout - (time.perf_counter() - start)))
+            banner = sock.recv(256)
+    except OSError as e:
+        logger.debug(f"Probe of {node} failed: {e}")
+        return None
+    if not banner.startswith(b'SSH-'):
+        logger.debug(f"Probe of {node} got an unexpected banner: {banner[:40]!r}")
+        return None
+    return time.perf_counter() - start
+
+def rank_management_nodes(nodes: List[str] = None, timeout: float = 2.0, ttl: float = RANKING_TTL, refresh: bool = False) -> List[str]:
+    """
+    Ranks the management nodes from fastest to slowest by probing them all in parallel.
+    The ranking is cached in memory and in the RosieLLM state directory for `ttl` seconds.
+    Args:
+        nodes (List[str], optional): The nodes to rank. Defaults to MANAGEMENT_NODES.
+        timeout (float, optional): Probe timeout per node, in seconds. Defaults to 2.
+        ttl (float, optional): Seconds a ranking is reused for. Defaults to 300.
+        refresh (bool, optional): If True, ignore any cached ranking. Defaults to False.
+    Returns:
+        List[str]: The node names, fastest first. Nodes that didn't answer come last, in random order.
+    """
+    nodes = list(nodes or MANAGEMENT_NODES)
+    cache_path = os.path.join(STATE_DIR, 'nodes.json')
+    if not refresh:
+        cached = _ranking_cache
+        if time.time() - cached['ranked_at'] >= ttl:
+            try:
+                with open(cache_path, 'r') as f:
+                    cached = json.load(f)
+            except (OSError, ValueError):
+                pass
+        if time.time() - cached.get('ranked_at', 0) < ttl and sorted(cached.get('nodes', [])) == sorted(nodes):
+            return list(cached['nodes'])
+
+    with ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+        latencies = dict(zip(nodes, executor.map(lambda n: probe_node(n, timeout=timeout), nodes)))
+    answered = sorted((n for n in nodes if latencies[n] is not None), key=latencies.get)
+    silent = [n for n in nodes if latencies[n] is None]
+    random.shuffle(silent)
+    ranking = answered + silent
+    logger.info("Management node latency: " + ", ".join(
+        f"{n}={latencies[n] * 1000:.0f}ms" if latencies[n] is not None else f"{n}=unreachable" for n in nodes))
+
+    # only cache rankings that measured something, so a dropped VPN isn't remembered
+    if answered:
+        _ranking_cache.update(ranked_at=time.time(), nodes=ranking)
+        try:
+            os.makedirs(STATE_DIR, mode=0o700, exist_ok=True)
+            with open(os.open(cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                json.dump(_ranking_cache, f)
+        except OSError as e:
+            logger.debug(f"Failed to save the node ranking: {e}")
+    return ranking
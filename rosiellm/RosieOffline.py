@@ -0,0 +1,456 @@
+# Offline batch jobs: vLLM's offline engine run over a file of requests, without the HTTP server.
+# This file runs in two places: RosieLLM imports it to submit a batch and stream its results back, and the sbatch
+# script runs it inside the container (`python RosieOffline.py --input ... --output ... <engine args>`), so it only
+# uses the standard library at import time.
+import os
+import sys
+import json
+import time
+import argparse
+import secrets
+import logging
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+if TYPE_CHECKING:
+    from rosiellm.RosieBatch import BatchResult
+    from rosiellm.RosieSSH import RosieSSH
+
+logger = logging.getLogger(__name__)
+
+BATCH_DIR = '/data/ai_club/RosieLLM/batches'
+# requests handed to the engine ahead of time, enough for the scheduler to keep full batches as others finish
+DEFAULT_MAX_PENDING = 1024
+# seconds between fsyncs of the results file, so the client (reading over SFTP on another node) sees new results
+SYNC_INTERVAL = 2.0
+LOG_INTERVAL = 30.0
+# chat.completions.create arguments that map onto vLLM SamplingParams under the same name
+SAMPLING_KEYS = ('n', 'temperature', 'top_p', 'stop', 'seed', 'presence_penalty', 'frequency_penalty')
+# arguments that don't affect generation
+IGNORED_KEYS = ('model', 'messages', 'prompt', 'stream', 'stream_options', 'user', 'extra_body', 'max_tokens',
+                'max_completion_tokens', 'logprobs', 'top_logprobs')
+# arguments that are rejected when set, as offline results don't include them
+UNSUPPORTED_KEYS = ('logprobs', 'top_logprobs')
+
+def request_prompt(request: Dict[str, Any]) -> Tuple[bool, Any]:
+    """
+    The prompt of a request.
+    Returns:
+        Tuple[bool, Any]: (True, messages) for a chat request, (False, prompt) for a text completion.
+    Raises:
+        ValueError: If the request has neither "messages" nor a single "prompt" string.
+    """
+    if 'messages' in request:
+        return True, request['messages']
+    if isinstance(request.get('prompt'), str):
+        return False, request['prompt']
+    raise ValueError("A request needs \"messages\" (chat) or a single \"prompt\" string (text completion).")
+
+def sampling_kwargs(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Translates the arguments of a chat.completions.create (or completions.create) call into vLLM SamplingParams
+    arguments. "extra_body" is passed through as is, like the server does with vLLM's own sampling options
+    (e.g. top_k, min_p, ignore_eos). Unknown arguments are passed on too, so vLLM rejects them instead of
+    silently generating something else.
+    Raises:
+        ValueError: If the request asks for logprobs, which offline results don't include.
+    """
+    requested = [key for key in UNSUPPORTED_KEYS if request.get(key)]
+    if requested:
+        raise ValueError(f"Offline batches don't return {' or '.join(requested)}, use batch() with a server instead.")
+    kwargs = {key: request[key] for key in SAMPLING_KEYS if request.get(key) is not None}
+    max_tokens = request.get('max_completion_tokens') or request.get('max_tokens')
+    if max_tokens is not None:
+        kwargs['max_tokens'] = max_tokens
+    kwargs.update({key: value for key, value in request.items() if key not in SAMPLING_KEYS + IGNORED_KEYS})
+    kwargs.update(request.get('extra_body') or {})
+    return kwargs
+
+def make_response(index: int, model: str, chat: bool, output, created: int) -> Dict[str, Any]:
+    """
+    Formats a finished vLLM RequestOutput as the server would, so it loads as a ChatCompletion (or Completion).
+    """
+    prompt_tokens = len(output.prompt_token_ids or [])
+    completion_tokens = sum(len(choice.token_ids) for choice in output.outputs)
+    choices = []
+    for choice in output.outputs:
+        # vLLM reports aborted requests without a reason the OpenAI types accept
+        finish_reason = choice.finish_reason if choice.finish_reason in ('stop', 'length') else 'stop'
+        if chat:
+            choices.append({'index': choice.index, 'message': {'role': 'assistant', 'content': choice.text},
+                            'finish_reason': finish_reason, 'logprobs': None})
+        else:
+            choices.append({'index': choice.index, 'text': choice.text, 'finish_reason': finish_reason, 'logprobs': None})
+    return {
+        'id': f"{'chatcmpl' if chat else 'cmpl'}-offline-{index}",
+        'object': 'chat.completion' if chat else 'text_completion',
+        'created': created,
+        'model': model,
+        'choices': choices,
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+def read_results(path: str) -> Tuple[Set[int], bool]:
+    """
+    Reads which requests a results file already answered.
+    Returns:
+        Tuple[Set[int], bool]: The indexes with a response, and whether the file ends mid-line (an interrupted write).
+    """
+    done = set()
+    line = b'\n'
+    if not os.path.exists(path):
+        return done, False
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and 'response' in entry:
+                done.add(int(entry['index']))
+    return done, not line.endswith(b'\n')
+
+# --- everything below (up to OfflineBatch) runs inside the job ---
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+class VLLMEngine:
+    """
+    vLLM's offline engine, fed one request at a time so each result can be written as soon as it finishes.
+    """
+    def __init__(self, engine_argv: List[str]):
+        """
+        Initialize the engine.
+        Args:
+            engine_argv (List[str]): vLLM engine arguments, as for the server. Server-only arguments are ignored.
+        """
+        from vllm import LLMEngine, SamplingParams
+        from vllm.engine.arg_utils import EngineArgs
+        try:
+            from vllm.utils import FlexibleArgumentParser as ArgumentParser
+        except ImportError:
+            ArgumentParser = argparse.ArgumentParser
+
+        parser = EngineArgs.add_cli_args(ArgumentParser())
+        args, ignored = parser.parse_known_args(engine_argv)
+        if ignored:
+            _log(f"Ignoring arguments the offline engine doesn't take: {' '.join(ignored)}")
+        engine_args = EngineArgs.from_cli_args(args)
+        self.engine = LLMEngine.from_engine_args(engine_args)
+        self.tokenizer = self.engine.get_tokenizer()
+        self.max_model_len = self.engine.model_config.max_model_len
+        name = engine_args.served_model_name or engine_args.model
+        self.model = name[0] if isinstance(name, (list, tuple)) else name
+        self.sampling_params = SamplingParams
+
+    def add(self, request_id: str, request: Dict[str, Any]) -> None:
+        """
+        Queues a request.
+        Raises:
+            ValueError, TypeError: If the request is malformed or has invalid sampling arguments.
+        """
+        chat, prompt = request_prompt(request)
+        if chat:
+            # tokenized here, so the chat template's BOS isn't doubled by the engine's tokenizer
+            token_ids = self.tokenizer.apply_chat_template(prompt, tokenize=True, add_generation_prompt=True)
+            prompt = {'prompt_token_ids': token_ids}
+        kwargs = sampling_kwargs(request)
+        if kwargs.get('max_tokens') is None:
+            # like the server, generate up to the context length
+            n_prompt = len(token_ids) if chat else len(self.tokenizer.encode(prompt))
+            kwargs['max_tokens'] = self.max_model_len - n_prompt
+        self.engine.add_request(request_id, prompt, self.sampling_params(**kwargs))
+
+    def step(self) -> List[Any]:
+        """
+        Runs one scheduler step.
+        Returns:
+            List[RequestOutput]: The requests that finished.
+        """
+        return [output for output in self.engine.step() if output.finished]
+
+def run(engine, input_path: str, output_path: str, max_pending: int = DEFAULT_MAX_PENDING) -> Tuple[int, int]:
+    """
+    Runs every request of a JSONL file through the engine, appending {"index", "response"} (or {"index", "error"})
+    lines to the results file as requests finish. Requests the results file already has are skipped, so a requeued
+    or resubmitted job picks up where the last one stopped.
+    Args:
+        engine (VLLMEngine): The engine (anything with model, add() and step()).
+        input_path (str): The requests, one JSON object per line. Blank lines don't count.
+        output_path (str): The results file.
+        max_pending (int): The most requests in the engine at once.
+    Returns:
+        Tuple[int, int]: How many requests completed and failed.
+    """
+    done, partial_line = read_results(output_path)
+    created = int(time.time())
+    completed = failed = 0
+    in_flight: Dict[str, bool] = {} # request id -> whether it is a chat request
+    last_sync = last_log = time.time()
+    _log(f"Offline batch starting, {len(done)} requests already done")
+    with open(input_path, 'r', encoding='utf-8') as requests, open(output_path, 'a', encoding='utf-8') as out:
+        if partial_line:
+            out.write('\n')
+        pending = enumerate(line for line in requests if line.strip())
+        exhausted = False
+        while True:
+            # keep the scheduler supplied, so batches stay full while the longest requests finish
+            while not exhausted and len(in_flight) < max_pending:
+                index, line = next(pending, (None, None))
+                if index is None:
+                    exhausted = True
+                elif index not in done:
+                    try:
+                        request = json.loads(line)
+                        engine.add(str(index), request)
+                        in_flight[str(index)] = 'messages' in request
+                    except Exception as e:
+                        out.write(json.dumps({'index': index, 'error': f"{type(e).__name__}: {e}"}) + '\n')
+                        failed += 1
+            if not in_flight:
+                break
+            for output in engine.step():
+                chat = in_flight.pop(output.request_id)
+                response = make_response(int(output.request_id), engine.model, chat, output, created)
+                out.write(json.dumps({'index': int(output.request_id), 'response': response}) + '\n')
+                completed += 1
+            now = time.time()
+            if now - last_sync > SYNC_INTERVAL:
+                out.flush()
+                os.fsync(out.fileno())
+                last_sync = now
+            if now - last_log > LOG_INTERVAL:
+                _log(f"Offline batch: {completed} completed, {failed} failed, {len(in_flight)} in progress")
+                last_log = now
+    _log(f"Offline batch finished: {completed} completed, {failed} failed, {len(done)} done by an earlier job")
+    return completed, failed
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Run a JSONL file of requests through vLLM\'s offline engine. '
+                                                 'Any other arguments are vLLM engine arguments.')
+    parser.add_argument('--input', required=True, help='The requests, one JSON object per line.')
+    parser.add_argument('--output', required=True, help='The JSONL file results are appended to.')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING)
+    args, engine_argv = parser.parse_known_args(argv)
+    run(VLLMEngine(engine_argv), args.input, args.output, args.max_pending)
+    return 0
+
+# --- client side ---
+
+class OfflineBatch:
+    """
+    A batch of chat (or text) completions run by vLLM's offline engine in a SLURM job of its own, instead of
+    request by request through a server and the proxy. The requests are uploaded to /data, the job appends results
+    next to them as they finish, and results() streams them back. The job ends, freeing its GPUs, when the batch is done.
+    """
+    def __init__(self,
+                 requests: Union[str, os.PathLike, Iterable[Dict[str, Any]]],
+                 job_name: str = 'RosieLLM-batch',
+                 rosie_username: str = None,
+                 management_node: str = None,
+                 rosie_ssh: 'RosieSSH' = None,
+                 remote_dir: str = None,
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 **kwargs):
+        """
+        Uploads the requests and submits the job.
+        Args:
+            requests (str | PathLike | Iterable[dict]): A local JSONL file, or an iterable of dicts, of
+                chat.completions.create keyword arguments ("messages", "max_tokens", "temperature", ...), or
+                completions.create ones with a "prompt". vLLM sampling options (top_k, ignore_eos, ...) go in
+                "extra_body". "model" is ignored, the job serves one model.
+            job_name (str): The name of the job on Rosie.
+            rosie_username (str, optional): The username to authenticate with. Prompted for if not set.
+            management_node (str, optional): The management node to connect through. Defaults to the fastest.
+            rosie_ssh (RosieSSH, optional): An existing SSH session to use instead.
+            remote_dir (str, optional): Where the batch's files go on Rosie. Defaults to a new directory
+                under BATCH_DIR/<username>.
+            max_pending (int): Requests handed to vLLM's scheduler ahead of time.
+            **kwargs: Job configuration, as for RosieLLM (model, gpus, dtype, max_model_len, hours, ...).
+        Raises:
+            RuntimeError: If the job can't be submitted.
+        """
+        from rosiellm.RosieSSH import RosieSSH
+        from rosiellm.RosieJob import JobManager
+        from rosiellm.RosieLogs import LogTailer
+        from rosiellm.RosieLLM import select_management_nodes
+
+        if rosie_ssh is None:
+            address, *fallback_addresses = select_management_nodes(management_node)
+            rosie_ssh = RosieSSH(rosie_username, address, fallback_addresses)
+        rosie_ssh.connect()
+        self.remote_dir = remote_dir or (f"{BATCH_DIR}/{rosie_ssh.ssh_username}/"
+                                         f"{job_name}-{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(2)}")
+        self.requests_path = f"{self.remote_dir}/requests.jsonl"
+        self.results_path = f"{self.remote_dir}/results.jsonl"
+        self.manager = JobManager(job_name, rosie_ssh, **kwargs)
+        if 'out_file' not in kwargs:
+            # the log goes with the batch, rather than into the output file a server job of the same user may be using
+            self.manager.config_dict['out_file'] = f"{self.remote_dir}/job-%j.txt"
+        self.model = self.manager.config_dict['model']
+        self.max_pending = max_pending
+        with self.manager.timer.phase('requests_upload'):
+            self.total = upload_requests(rosie_ssh, requests, self.requests_path)
+        logger.info(f"Uploaded {self.total} requests to {self.requests_path}")
+        self._tailer = LogTailer(rosie_ssh, self.results_path)
+        self._seen: Set[int] = set()
+        self.submit()
+
+    @property
+    def job_id(self) -> Optional[str]:
+        return self.manager.job_id
+
+    @property
+    def state(self) -> Optional[str]:
+        """
+        The job's SLURM state, e.g. "PENDING", "RUNNING" or "COMPLETED".
+        """
+        event = self.manager.poller.status(self.job_id)
+        return event.state if event else None
+
+    @property
+    def ended(self) -> bool:
+        """
+        Whether the job has finished, failed or been cancelled.
+        """
+        event = self.manager.poller.status(self.job_id)
+        return event is not None and event.is_terminal
+
+    @property
+    def completed(self) -> int:
+        """
+        How many results have been read so far.
+        """
+        return len(self._seen)
+
+    def submit(self) -> None:
+        """
+        Submits a job for the batch. After a job ended early (e.g. at its time limit), this submits another one,
+        which skips the requests that already have results; results() then continues with it.
+        """
+        self.manager.launch_offline_batch(self.requests_path, self.results_path, self.max_pending)
+        self.manager.poller.track(self.job_id, self._log_job_event)
+
+    def _log_job_event(self, event) -> None:
+        if event.state == 'COMPLETED':
+            logger.info(f"Job {event.job_id} completed")
+        else:
+            self.manager.log_job_event(event)
+
+    def results(self, poll_interval: float = 1.0, timeout: Optional[float] = None) -> Iterator['BatchResult']:
+        """
+        Streams the results back as the job writes them, in the order they finish.
+        Args:
+            poll_interval (float): Seconds between reads of the results file.
+            timeout (float, optional): The most seconds to wait. Defaults to None (as long as the job runs).
+        Returns:
+            Iterator[BatchResult]: One result per request. Requests vLLM rejected have `error` set.
+        Raises:
+            RuntimeError: If the job ends before every request has a result; submit() runs the rest.
+            TimeoutError: If the timeout passes first.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            # checked first, so everything written before the job ended is read below
+            ended = self.ended
+            for line in self._tailer.read_lines():
+                result = self._parse(line)
+                if result is not None and result.index not in self._seen:
+                    self._seen.add(result.index)
+                    yield result
+            if len(self._seen) >= self.total:
+                return
+            if ended:
+                raise RuntimeError(f"Job {self.job_id} ended ({self.state}) with {len(self._seen)} of {self.total} results, "
+                                   f"see {self.manager.out_file}. submit() runs the rest.")
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"{len(self._seen)} of {self.total} results after {timeout} seconds.")
+            time.sleep(poll_interval)
+
+    def __iter__(self) -> Iterator['BatchResult']:
+        return self.results()
+
+    def _parse(self, line: str) -> Optional['BatchResult']:
+        from openai.types import Completion
+        from openai.types.chat import ChatCompletion
+        from rosiellm.RosieBatch import BatchResult
+
+        try:
+            entry = json.loads(line)
+            index = int(entry['index'])
+            if 'error' in entry:
+                return BatchResult(index, error=RuntimeError(entry['error']), attempts=1)
+            response = entry['response']
+            model = ChatCompletion if response.get('object') == 'chat.completion' else Completion
+            return BatchResult(index, response=model.model_validate(response), attempts=1)
+        except (ValueError, KeyError, TypeError) as e:
+            # e.g. a line cut short when a job was killed mid-write
+            logger.warning(f"Skipping unreadable result: {e}")
+            return None
+
+    def download(self, local_path: str) -> None:
+        """
+        Copies the results file from Rosie. Its lines are {"index", "response"} or {"index", "error"}, so the results
+        of chat requests can also serve as a batch() checkpoint.
+        """
+        sftp = self.manager.rosie_ssh.open_sftp()
+        try:
+            sftp.get(self.results_path, local_path)
+        finally:
+            sftp.close()
+
+    def cancel(self) -> None:
+        """
+        Cancels the job. The results written so far stay on Rosie, and submit() runs the rest.
+        """
+        # still tracked, so results() sees the job end
+        self.manager.rosie_ssh.execute_instance_command(f'scancel {self.job_id}')
+        logger.info(f"Cancelled job {self.job_id}")
+
+def upload_requests(rosie_ssh, requests: Union[str, os.PathLike, Iterable[Dict[str, Any]]], remote_path: str,
+                    chunk_size: int = 1000) -> int:
+    """
+    Streams requests to a JSONL file on Rosie over SFTP, one per line.
+    Args:
+        rosie_ssh (RosieSSH): A connected RosieSSH.
+        requests (str | PathLike | Iterable[dict]): A local JSONL file, or the requests.
+        remote_path (str): The file to write. It only appears once it is complete.
+        chunk_size (int): Requests per write.
+    Returns:
+        int: The number of requests.
+    """
+    def read_lines() -> Iterator[str]:
+        with open(requests, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+
+    if isinstance(requests, (str, os.PathLike)):
+        lines = read_lines()
+    else:
+        lines = (json.dumps(request) for request in requests)
+    rosie_ssh.run_command(f'mkdir -p {os.path.dirname(remote_path)}')
+    partial = f"{remote_path}.part"
+    count = 0
+    sftp = rosie_ssh.open_sftp()
+    try:
+        with sftp.open(partial, 'wb') as f:
+            # writes don't wait for the server to acknowledge the previous one
+            f.set_pipelined(True)
+            chunk = []
+            for line in lines:
+                chunk.append(line)
+                count += 1
+                if len(chunk) >= chunk_size:
+                    f.write(('\n'.join(chunk) + '\n').encode())
+                    chunk = []
+            if chunk:
+                f.write(('\n'.join(chunk) + '\n').encode())
+        sftp.posix_rename(partial, remote_path)
+    finally:
+        sftp.close()
+    return count
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import time
+import logging
+from dataclasses import dataclass
+from threading import Thread, Lock, Condition, Event
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ('PENDING', 'CONFIGURING', 'RUNNING', 'COMPLETING', 'SUSPENDED', 'REQUEUED', 'RESIZING')
+TERMINAL_STATES = ('COMPLETED', 'FAILED', 'TIMEOUT', 'CANCELLED', 'NODE_FAIL', 'PREEMPTED',
+                   'OUT_OF_MEMORY', 'BOOT_FAIL', 'DEADLINE', 'REVOKED')
+
+@dataclass
+class JobEvent:
+    """
+    A SLURM state transition for a tracked job.
+    """
+    job_id: str
+    state: str
+    previous_state: Optional[str] = None
+    node: Optional[str] = None
+    reason: Optional[str] = None
+    timestamp: float = 0.0
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+class JobPoller:
+    """
+    Tracks the state of many SLURM jobs with a single background poller.
+    Every poll queries all tracked jobs in one squeue call (falling back to sacct for jobs
+    that have left the queue), backing off while nothing changes and speeding back up
+    as soon as a job changes state or a new job is tracked.
+    """
+    _shared: Dict[str, 'JobPoller'] = {}
+    _shared_lock = Lock()
+
+    def __init__(self, rosie_ssh, min_interval: float = 0.5, max_interval: float = 10.0, backoff: float = 1.5,
+                 command_timeout: float = 30.0):
+        """
+        Initialize the poller.
+        Args:
+            rosie_ssh (RosieSSH): A connected RosieSSH used to run squeue/sacct.
+            min_interval (float, optional): Seconds between polls right after a change. Defaults to 0.5.
+            max_interval (float, optional): Upper bound on the seconds between polls. Defaults to 10.
+            backoff (float, optional): Factor the interval grows by after each poll without changes. Defaults to 1.5.
+            command_timeout (float, optional): Seconds squeue/sacct may go without answering before the poll is
+                given up (and retried after the backoff), so a hung slurmctld can't stall the poller. Defaults to 30.
+        """
+        self.rosie_ssh = rosie_ssh
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.command_timeout = command_timeout
+
+        self._jobs: Dict[str, Optional[JobEvent]] = {}
+        self._listeners: Dict[Optional[str], List[Callable[[JobEvent], None]]] = {}
+        self._lock = Lock()
+        self._changed = Condition(self._lock)
+        self._wake = Event()
+        self._stop = Event()
+        self._thread = None
+
+    @classmethod
+    def shared(cls, rosie_ssh) -> 'JobPoller':
+        """
+        Returns the process-wide poller for a Rosie user, creating it if needed.
+        If the poller's SSH session has been closed, it is rebound to the given one.
+        """
+        with cls._shared_lock:
+            poller = cls._shared.get(rosie_ssh.ssh_username)
+            if poller is None:
+                poller = cls._shared[rosie_ssh.ssh_username] = cls(rosie_ssh)
+            elif not poller.rosie_ssh.instance_client:
+                poller.rosie_ssh = rosie_ssh
+            return poller
+
+    def track(self, job_id: str, callback: Callable[[JobEvent], None] = None) -> None:
+        """
+        Starts tracking a job.
+        Args:
+            job_id (str): The SLURM job id.
+            callback (Callable[[JobEvent], None], optional): Called with every state transition of this job.
+        """
+        job_id = str(job_id)
+        with self._lock:
+            self._jobs.setdefault(job_id, None)
+            listeners = self._listeners.setdefault(job_id, [])
+            if callback and callback not in listeners:
+                listeners.append(callback)
+        self._ensure_running()
+        self._wake.set()
+
+    def untrack(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(str(job_id), None)
+            self._listeners.pop(str(job_id), None)
+
+    def add_listener(self, callback: Callable[[JobEvent], None]) -> None:
+        """
+        Registers a callback for the state transitions of every tracked job.
+        """
+        with self._lock:
+            self._listeners.setdefault(None, []).append(callback)
+
+    def status(self, job_id: str) -> Optional[JobEvent]:
+        """
+        Returns the latest known state of a tracked job, or None if it hasn't been seen yet.
+        """
+        with self._lock:
+            return self._jobs.get(str(job_id))
+
+    def wait_for(self, job_id: str, states: Iterable[str] = ('RUNNING',), timeout: Optional[float] = None) -> JobEvent:
+        """
+        Blocks until a job reaches one of the given states, or a terminal state.
+        Args:
+            job_id (str): The SLURM job id. It is tracked if it isn't already.
+            states (Iterable[str], optional): The states to wait for. Defaults to ('RUNNING',).
+            timeout (float, optional): Maximum seconds to wait. Defaults to None (wait indefinitely).
+        Returns:
+            JobEvent: The event that ended the wait.
+        Raises:
+            TimeoutError: If the job doesn't reach the states within the timeout.
+        """
+        job_id = str(job_id)
+        states = tuple(states)
+        self.track(job_id)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._changed:
+            while True:
+                event = self._jobs.get(job_id)
+                if event and (event.state in states or event.is_terminal):
+                    return event
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"Job {job_id} did not reach {'/'.join(states)} in {timeout} seconds.")
+                self._changed.wait(remaining)
+
+    def query(self, job_ids: Iterable[str]) -> Dict[str, JobEvent]:
+        """
+        Queries the current state of several jobs in one squeue call, using sacct for jobs no longer queued.
+        Args:
+            job_ids (Iterable[str]): The SLURM job ids to query.
+        Returns:
+            dict: The state of every job SLURM knows about, keyed by job id.
+        Raises:
+            TimeoutError: If squeue or sacct doesn't answer within command_timeout.
+        """
+        job_ids = [str(j) for j in job_ids]
+        if not job_ids:
+            return {}
+        now = time.time()
+        statuses = {}
+        squeue_out = self.rosie_ssh.run_command(
+            f'squeue -h -j {",".join(job_ids)} -o "%i|%T|%N|%r"', timeout=self.command_timeout).output
+        for job_id, state, node, reason in self._parse(squeue_out):
+            statuses[job_id] = JobEvent(job_id, state, node=node, reason=reason, timestamp=now)
+
+        missing = [j for j in job_ids if j not in statuses]
+        if missing:
+            sacct_out = self.rosie_ssh.run_command(
+                f'sacct -n -P -X -j {",".join(missing)} -o JobID,State,NodeList,Reason', timeout=self.command_timeout).output
+            for job_id, state, node, reason in self._parse(sacct_out):
+                # sacct reports e.g. "CANCELLED by 1234"
+                statuses[job_id] = JobEvent(job_id, state.split(' ')[0], node=node, reason=reason, timestamp=now)
+        return {j: s for j, s in statuses.items() if j in job_ids}
+
+    def poll_once(self) -> bool:
+        """
+        Polls every tracked job once and dispatches events for any that changed state.
+        Returns:
+            bool: True if any job changed state.
+        """
+        with self._lock:
+            # finished jobs keep their last event for status()/wait_for() but are no longer queried
+            job_ids = [j for j, e in self._jobs.items() if not (e and e.is_terminal)]
+        if not job_ids:
+            return False
+
+        statuses = self.query(job_ids)
+        events = []
+        with self._changed:
+            for job_id, status in statuses.items():
+                if job_id not in self._jobs:
+                    continue
+                previous = self._jobs[job_id]
+                if previous and (previous.state, previous.node, previous.reason) == (status.state, status.node, status.reason):
+                    continue
+                status.previous_state = previous.state if previous else None
+                self._jobs[job_id] = status
+                events.append(status)
+            self._changed.notify_all()
+
+        for event in events:
+            self._dispatch(event)
+        return bool(events)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = Thread(target=self._run, name='RosieJobPoller', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        interval = self.min_interval
+        while not self._stop.is_set():
+            if self._wake.is_set():
+                self._wake.clear()
+                interval = self.min_interval
+            try:
+                changed = self.poll_once()
+            except Exception as e:
+                # a timed out or failed query counts as a poll without changes, so the retries back off
+                logger.warning(f"Job status poll failed: {e}")
+                changed = False
+            interval = self.min_interval if changed else min(interval * self.backoff, self.max_interval)
+            self._wake.wait(interval)
+
+    def _dispatch(self, event: JobEvent) -> None:
+        with self._lock:
+            listeners = self._listeners.get(event.job_id, []) + self._listeners.get(None, [])
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.warning(f"Job event listener raised an error: {e}")
+
+    @staticmethod
+    def _parse(output: str):
+        for line in (output or '').strip().split('\n'):
+            parts = [p.strip() for p in line.split('|')]
+            if len(parts) == 4 and parts[0].isdigit():
+                node = parts[2] if parts[2] and parts[2] not in ('(null)', 'None assigned') else None
+                reason = parts[3] if parts[3] and parts[3] != 'None' else None
+                yield parts[0], parts[1], node, reason
@@ -0,0 +1,442 @@
+from rosiellm.RosieLLM import RosieLLM, select_management_nodes
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from threading import Lock, Thread
+from typing import Literal, Union, List, Tuple, Optional, Dict
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RosieLLMPool:
+    """
+    A pool of RosieLLM replicas, each a separate vLLM job on Rosie, behind a single OpenAI-compatible client.
+    Every request is routed to the running replica with the fewest requests in flight. Replicas that
+    are still loading or stop responding are skipped until a health check shows they are back.
+    """
+    def __init__(self,
+                 replicas: int = 2,
+                 job_name: str = 'RosieLLM',
+                 rosie_username: str = None,
+                 management_node: Literal[
+                                    'dh-mgmt1',
+                                    'dh-mgmt2',
+                                    'dh-mgmt3',
+                                    'dh-mgmt4'
+                                ] = None,
+                 async_client: bool = False,
+                 reattach: bool = True,
+                 health_check_interval: float = 10.0,
+                 log_level: Union[int, str] = logging.WARN,
+                 **kwargs
+                 ) -> 'RosieLLMPool':
+        """
+        Initialize a RosieLLMPool, launching (or reattaching to) one job per replica in parallel.
+
+        Args:
+            replicas (int): The number of vLLM jobs to run.
+            job_name (str): The base job name. Replica i runs as "{job_name}-{i}".
+            rosie_username (str): The username to be used for authentication with Rosie.
+            management_node (Literal: 'dh-mgmt[1,2,3,4]', optional): The management node used to launch the jobs.
+            async_client (bool): If True, requests return awaitables, as with an AsyncOpenAI client.
+            reattach (bool): If True, replicas reuse compatible jobs from a previous session.
+            health_check_interval (float): Minimum seconds between health checks of a replica that isn't running.
+            **kwargs: Job configuration shared by every replica (see RosieLLM).
+        """
+        if replicas < 1:
+            raise ValueError("A RosieLLMPool needs at least one replica.")
+        logger.setLevel(log_level)
+        self.async_client = async_client
+        self.health_check_interval = health_check_interval
+
+        from rosiellm.RosieSSH import RosieSSH
+
+        address, *fallback_addresses = select_management_nodes(management_node)
+        self.rosie_ssh = RosieSSH(rosie_username, address, fallback_addresses)
+        self.rosie_ssh.connect()
+
+        self.job_name = job_name
+        self._replica_kwargs = dict(rosie_ssh=self.rosie_ssh,
+                                    use_as_openai_client=False,
+                                    async_client=async_client,
+                                    reattach=reattach,
+                                    log_level=log_level,
+                                    **kwargs)
+        self._lock = Lock()
+        self._in_flight = {}
+        self._last_checked = {}
+        self._last_used = {}
+        self._launching = set() # job names of replicas being launched
+        # (finish time, seconds) of recent requests, time to first chunk for streams
+        self._latencies = deque(maxlen=4096)
+        self.autoscaler = None
+
+        self.replicas: List[RosieLLM] = []
+        with ThreadPoolExecutor(max_workers=replicas) as executor:
+            for replica in executor.map(self._launch, [f"{job_name}-{i}" for i in range(replicas)]):
+                self._register(replica)
+        self.model = self.replicas[0].model
+
+    def __getattr__(self, name):
+        # route OpenAI resources (chat, completions, embeddings, ...) through the load balancer
+        if name.startswith('_'):
+            raise AttributeError(f"'RosieLLMPool' object has no attribute '{name}'")
+        return _RoutedResource(self, (name,))
+
+    @property
+    def in_flight(self) -> List[int]:
+        """
+        The number of requests currently in flight on each replica.
+        """
+        with self._lock:
+            return [self._in_flight[id(r)] for r in self.replicas]
+
+    def metrics_summary(self) -> Dict[str, Dict]:
+        """
+        Each replica's request metrics (see RequestMetrics.summary()), by job name. A replica that is much slower
+        than the others at the same load has likely landed on a degraded node.
+        """
+        return {r.manager.job_name: r.metrics.summary() for r in self.replicas}
+
+    @property
+    def launching(self) -> int:
+        """
+        The number of replicas being launched by add_replica().
+        """
+        with self._lock:
+            return len(self._launching)
+
+    def running_replicas(self) -> List[RosieLLM]:
+        return [r for r in list(self.replicas) if r.isRunning]
+
+    def idle_seconds(self, replica: RosieLLM) -> float:
+        """
+        Seconds since the replica last finished a request (or was added), 0 while it has requests in flight.
+        """
+        with self._lock:
+            if self._in_flight.get(id(replica)):
+                return 0.0
+            return time.time() - self._last_used.get(id(replica), time.time())
+
+    def recent_latencies(self, window: float = 60.0) -> List[float]:
+        """
+        Latencies (seconds) of the requests finished in the last `window` seconds.
+        For streaming requests this is the time to the first chunk.
+        """
+        cutoff = time.time() - window
+        with self._lock:
+            return [seconds for finished, seconds in self._latencies if finished >= cutoff]
+
+    def add_replica(self) -> RosieLLM:
+        """
+        Launches one more replica and adds it to the pool once its job is running. Blocks until then.
+        """
+        with self._lock:
+            names = {r.manager.job_name for r in self.replicas} | self._launching
+            i = next(i for i in range(len(names) + 1) if f"{self.job_name}-{i}" not in names)
+            name = f"{self.job_name}-{i}"
+            self._launching.add(name)
+        try:
+            replica = self._launch(name)
+        finally:
+            with self._lock:
+                self._launching.discard(name)
+        self._register(replica)
+        logger.info(f"Added replica {name} (job {replica.manager.job_id})")
+        return replica
+
+    def remove_replica(self, replica: RosieLLM, drain_timeout: float = 60.0) -> None:
+        """
+        Stops routing requests to a replica, waits for its in-flight requests to finish and cancels its job.
+        Args:
+            replica (RosieLLM): The replica to remove.
+            drain_timeout (float): Maximum seconds to wait for in-flight requests.
+        """
+        with self._lock:
+            if replica not in self.replicas:
+                return
+            self.replicas = [r for r in self.replicas if r is not replica]
+        deadline = time.time() + drain_timeout
+        while time.time() < deadline:
+            with self._lock:
+                if not self._in_flight.get(id(replica)):
+                    break
+            time.sleep(0.1)
+        replica.close()
+        try:
+            replica.manager.cancel_vllm_server()
+        except Exception as e:
+            logger.warning(f"Failed to cancel job {replica.manager.job_id}: {e}")
+        replica.isRunning = False
+        with self._lock:
+            for stats in (self._in_flight, self._last_checked, self._last_used):
+                stats.pop(id(replica), None)
+        logger.info(f"Removed replica {replica.manager.job_name} (job {replica.manager.job_id})")
+
+    def autoscale(self, **kwargs) -> 'Autoscaler':
+        """
+        Starts scaling the number of replicas with the load. See Autoscaler for the arguments.
+        """
+        from rosiellm.RosieAutoscale import Autoscaler
+        self.autoscaler = Autoscaler(self, **kwargs).start()
+        return self.autoscaler
+
+    def shutdown(self) -> None:
+        """
+        Cancels every replica's job on Rosie.
+        """
+        if self.autoscaler:
+            self.autoscaler.stop()
+        for replica in list(self.replicas):
+            replica.close()
+            try:
+                replica.manager.cancel_vllm_server()
+            except Exception as e:
+                logger.warning(f"Failed to cancel job {replica.manager.job_id}: {e}")
+            replica.isRunning = False
+
+    def acquire(self, exclude: List[RosieLLM] = None) -> RosieLLM:
+        """
+        Picks the running replica with the fewest requests in flight and counts a new request against it,
+        for callers that send requests to replicas themselves (e.g. the Gateway). Every acquire() must be
+        followed by a release() once the request is done.
+        Replicas that aren't known to be running are health checked (at most once per health_check_interval):
+        in the background while another replica can take the request, before giving up when none can.
+        Args:
+            exclude (List[RosieLLM], optional): Replicas not to pick, e.g. ones that already failed this request.
+        Returns:
+            RosieLLM: The replica to send the request to.
+        Raises:
+            ConnectionError: If no replica is running.
+        """
+        exclude = exclude or []
+        for attempt in range(2):
+            replica = None
+            with self._lock:
+                now = time.time()
+                stale = [r for r in self.replicas if not r.isRunning and r not in exclude
+                         and now - self._last_checked[id(r)] >= self.health_check_interval]
+                for r in stale:
+                    self._last_checked[id(r)] = now
+                candidates = [r for r in self.replicas if r.isRunning and r not in exclude]
+                if candidates:
+                    replica = min(candidates, key=lambda r: self._in_flight[id(r)])
+                    self._in_flight[id(replica)] += 1
+            if replica:
+                if stale:
+                    # replicas that are still loading join as soon as they pass a check, without holding up this request
+                    Thread(target=self._check_health, args=(stale,), name='RosiePoolHealth', daemon=True).start()
+                return replica
+            if attempt or not stale:
+                break
+            self._check_health(stale)
+        raise ConnectionError("No replica is running. Server launch can be slow, try again in a moment.")
+
+    def release(self, replica: RosieLLM, latency: Optional[float] = None) -> None:
+        """
+        Ends a request counted by acquire().
+        Args:
+            replica (RosieLLM): The replica acquire() returned.
+            latency (float, optional): The request's latency in seconds (time to first chunk for streams), counted
+                towards autoscaling. None to leave it out, e.g. for a failed request.
+        """
+        now = time.time()
+        with self._lock:
+            if id(replica) in self._in_flight:
+                self._in_flight[id(replica)] -= 1
+                self._last_used[id(replica)] = now
+            if latency is not None:
+                self._latencies.append((now, latency))
+
+    @staticmethod
+    def _check_health(replicas: List[RosieLLM]) -> None:
+        with ThreadPoolExecutor(max_workers=len(replicas)) as executor:
+            list(executor.map(lambda r: r.check_server_health(), replicas))
+
+    def _launch(self, name: str) -> RosieLLM:
+        return RosieLLM(job_name=name, **self._replica_kwargs)
+
+    def _register(self, replica: RosieLLM) -> None:
+        with self._lock:
+            self._in_flight[id(replica)] = 0
+            self._last_checked[id(replica)] = 0.0
+            self._last_used[id(replica)] = time.time()
+            self.replicas = self.replicas + [replica]
+
+    def _record_latency(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append((time.time(), latency))
+
+    def _mark_down(self, replica: RosieLLM, error: Exception) -> None:
+        logger.warning(f"Replica {replica.manager.job_name} on {replica.manager.node_url} is unreachable, routing around it: {error}")
+        replica.isRunning = False
+        with self._lock:
+            self._last_checked[id(replica)] = time.time()
+
+    @staticmethod
+    def _resolve(replica: RosieLLM, path: Tuple[str, ...]):
+        target = replica._http_client
+        for name in path:
+            target = getattr(target, name)
+        return target
+
+    def _call(self, path: Tuple[str, ...], args, kwargs):
+        if self.async_client:
+            return self._acall(path, args, kwargs)
+        import openai
+
+        tried = []
+        while True:
+            replica = self.acquire(tried)
+            start = time.perf_counter()
+            try:
+                result = self._resolve(replica, path)(*args, **kwargs)
+            except openai.APITimeoutError:
+                self.release(replica)
+                raise
+            except openai.APIConnectionError as e:
+                self.release(replica)
+                self._mark_down(replica, e)
+                tried.append(replica)
+                if len(tried) == len(self.replicas):
+                    raise
+                continue
+            except Exception:
+                self.release(replica)
+                raise
+            if kwargs.get('stream'):
+                return _TrackedStream(result, lambda: self.release(replica),
+                                      lambda: self._record_latency(time.perf_counter() - start))
+            self.release(replica, time.perf_counter() - start)
+            return result
+
+    async def _acall(self, path: Tuple[str, ...], args, kwargs):
+        import openai
+
+        tried = []
+        while True:
+            replica = self.acquire(tried)
+            start = time.perf_counter()
+            try:
+                result = await self._resolve(replica, path)(*args, **kwargs)
+            except openai.APITimeoutError:
+                self.release(replica)
+                raise
+            except openai.APIConnectionError as e:
+                self.release(replica)
+                self._mark_down(replica, e)
+                tried.append(replica)
+                if len(tried) == len(self.replicas):
+                    raise
+                continue
+            except BaseException:
+                self.release(replica)
+                raise
+            if kwargs.get('stream'):
+                return _TrackedAsyncStream(result, lambda: self.release(replica),
+                                          lambda: self._record_latency(time.perf_counter() - start))
+            self.release(replica, time.perf_counter() - start)
+            return result
+
+class _RoutedResource:
+    """
+    A path of attributes on an OpenAI client (e.g. chat.completions.create), resolved against a replica at call time.
+    """
+    def __init__(self, pool: RosieLLMPool, path: Tuple[str, ...]):
+        self._pool = pool
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _RoutedResource(self._pool, self._path + (name,))
+
+    def __call__(self, *args, **kwargs):
+        return self._pool._call(self._path, args, kwargs)
+
+class _TrackedStream:
+    """
+    Wraps a streaming response so its replica's in-flight count is released once the stream ends or is closed,
+    and the time to its first chunk is recorded.
+    """
+    def __init__(self, stream, on_close, on_first_chunk=None):
+        self._stream = stream
+        self._on_close = on_close
+        self._on_first_chunk = on_first_chunk
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                self._first_chunk()
+                yield chunk
+        finally:
+            self._finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._finish()
+
+    def _first_chunk(self) -> None:
+        if self._on_first_chunk:
+            self._on_first_chunk()
+            self._on_first_chunk = None
+
+    def _finish(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._on_close()
+
+class _TrackedAsyncStream:
+    """
+    The async counterpart of _TrackedStream.
+    """
+    def __init__(self, stream, on_close, on_first_chunk=None):
+        self._stream = stream
+        self._on_close = on_close
+        self._on_first_chunk = on_first_chunk
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                self._first_chunk()
+                yield chunk
+        finally:
+            self._finish()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self) -> None:
+        try:
+            await self._stream.close()
+        finally:
+            self._finish()
+
+    def _first_chunk(self) -> None:
+        if self._on_first_chunk:
+            self._on_first_chunk()
+            self._on_first_chunk = None
+
+    def _finish(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._on_close()
@@ -0,0 +1,144 @@
+import re
+import json
+import logging
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+KV_CACHE_DTYPES = ('auto', 'fp8', 'fp8_e5m2', 'fp8_e4m3')
+QUANTIZATION_METHODS = ('awq', 'awq_marlin', 'gptq', 'gptq_marlin', 'marlin', 'squeezellm', 'fp8', 'bitsandbytes',
+                        'compressed-tensors', 'experts_int8')
+
+@dataclass
+class VLLMOptions:
+    """
+    Batching, scheduling and memory options for the vLLM server. None leaves vLLM's default.
+    Attributes:
+        max_num_seqs (int): Sequences batched together per step. More raises throughput and per-token latency.
+        max_num_batched_tokens (int): Tokens processed per step. With chunked prefill, a small budget keeps long
+            prompts from stalling running generations; without it, must be at least max_model_len.
+        enable_prefix_caching (bool): Reuse the KV cache of shared prompt prefixes (system prompts, few-shot examples).
+        enable_chunked_prefill (bool): Split long prompts across steps and batch them with decodes.
+        kv_cache_dtype (str): One of KV_CACHE_DTYPES. "fp8" halves KV cache memory on GPUs that support it.
+        quantization (str): One of QUANTIZATION_METHODS, for quantized checkpoints vLLM doesn't detect itself.
+        speculative_model (str): A small draft model (or "[ngram]") for speculative decoding.
+        num_speculative_tokens (int): Tokens the draft model proposes per step, required with speculative_model.
+        enforce_eager (bool): Skip CUDA graph capture, starting faster at some cost per token.
+        extra_args (dict): Any other vLLM server arguments, e.g. {"swap_space": 8}. True adds a bare flag.
+    """
+    max_num_seqs: Optional[int] = None
+    max_num_batched_tokens: Optional[int] = None
+    enable_prefix_caching: Optional[bool] = None
+    enable_chunked_prefill: Optional[bool] = None
+    kv_cache_dtype: Optional[str] = None
+    quantization: Optional[str] = None
+    speculative_model: Optional[str] = None
+    num_speculative_tokens: Optional[int] = None
+    enforce_eager: Optional[bool] = None
+    extra_args: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for name in ('max_num_seqs', 'max_num_batched_tokens', 'num_speculative_tokens'):
+            value = getattr(self, name)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+                raise ValueError(f"{name} must be a positive integer, got {value!r}.")
+        for name in ('enable_prefix_caching', 'enable_chunked_prefill', 'enforce_eager'):
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, bool):
+                raise ValueError(f"{name} must be True, False or None, got {value!r}.")
+        if self.kv_cache_dtype is not None and self.kv_cache_dtype not in KV_CACHE_DTYPES:
+            raise ValueError(f"kv_cache_dtype must be one of {', '.join(KV_CACHE_DTYPES)}, got {self.kv_cache_dtype!r}.")
+        if self.quantization is not None and self.quantization not in QUANTIZATION_METHODS:
+            raise ValueError(f"quantization must be one of {', '.join(QUANTIZATION_METHODS)}, got {self.quantization!r}.")
+        if bool(self.speculative_model) != bool(self.num_speculative_tokens):
+            raise ValueError("Speculative decoding needs both speculative_model and num_speculative_tokens.")
+        known = {f.name for f in fields(self)}
+        for name in self.extra_args:
+            if name.replace('-', '_') in known:
+                raise ValueError(f"Set {name} as an option, not in extra_args.")
+
+    @classmethod
+    def from_value(cls, value: Union['VLLMOptions', Dict[str, Any], None]) -> 'VLLMOptions':
+        """
+        Accepts options as a VLLMOptions or a dict of its fields (e.g. parsed from the command line).
+        """
+        if value is None:
+            return cls()
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            unknown = set(value) - {f.name for f in fields(cls)}
+            if unknown:
+                raise ValueError(f"Unknown vLLM options: {', '.join(sorted(unknown))}. Use extra_args for other server arguments.")
+            return cls(**value)
+        raise ValueError(f"vllm_options must be a VLLMOptions or a dict, got {type(value).__name__}.")
+
+    def merged(self, overrides: 'VLLMOptions') -> 'VLLMOptions':
+        """
+        Returns these options with every option set in `overrides` replacing this one's.
+        """
+        changes = {f.name: getattr(overrides, f.name) for f in fields(overrides)
+                   if f.name != 'extra_args' and getattr(overrides, f.name) is not None}
+        return replace(self, extra_args={**self.extra_args, **overrides.extra_args}, **changes)
+
+    def validate(self, max_model_len: Optional[int]) -> None:
+        """
+        Checks the options against the context length the job serves.
+        Raises:
+            ValueError: If vLLM would refuse to start with them.
+        """
+        if (self.max_num_batched_tokens and max_model_len and not self.enable_chunked_prefill
+                and self.max_num_batched_tokens < int(max_model_len)):
+            raise ValueError(f"max_num_batched_tokens ({self.max_num_batched_tokens}) is smaller than max_model_len "
+                             f"({max_model_len}), which vLLM only allows with enable_chunked_prefill=True.")
+
+    def to_args(self) -> List[str]:
+        """
+        The vLLM server arguments for the options that are set, e.g. ["--max-num-seqs 256", "--enable-prefix-caching"].
+        """
+        options = {f.name: getattr(self, f.name) for f in fields(self) if f.name != 'extra_args'}
+        args = []
+        for name, value in {**options, **self.extra_args}.items():
+            flag = f"--{name.replace('_', '-')}"
+            if value is None or value is False:
+                continue
+            args.append(flag if value is True else f"{flag} {_quote(value)}")
+        return args
+
+def _quote(value: Any) -> str:
+    # the server command runs inside the sbatch script's single-quoted `bash -c '...'`
+    text = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    if re.fullmatch(r'[\w.,:/@+=\[\]-]+', text):
+        return text
+    if "'" in text:
+        raise ValueError(f"vLLM option values can't contain single quotes: {text}")
+    return '"' + re.sub(r'(["\\$`])', r'\\\1', text) + '"'
+
+# tested combinations for common workloads, extra options override them
+PRESETS = {
+    # many concurrent requests (batch jobs, evaluations): big batches, shared prompt prefixes cached
+    'throughput': VLLMOptions(max_num_seqs=256, max_num_batched_tokens=4096,
+                              enable_prefix_caching=True, enable_chunked_prefill=True),
+    # interactive use: small batches and a small prefill budget per step, so tokens keep streaming
+    'low-latency': VLLMOptions(max_num_seqs=32, max_num_batched_tokens=512,
+                               enable_prefix_caching=True, enable_chunked_prefill=True),
+    # few, long prompts (documents, RAG): the model's full context, prompts prefilled in chunks
+    'long-context': VLLMOptions(max_num_seqs=8, max_num_batched_tokens=2048,
+                                enable_prefix_caching=True, enable_chunked_prefill=True),
+}
+# job configuration a preset implies, unless it is set explicitly
+PRESET_CONFIG = {
+    'long-context': {'max_model_len': 'auto'},
+}
+
+def resolve_options(preset: Optional[str], options: Union[VLLMOptions, Dict[str, Any], None]) -> VLLMOptions:
+    """
+    Combines a named preset with explicit options, which take precedence.
+    Raises:
+        ValueError: If the preset doesn't exist or an option is invalid.
+    """
+    if preset is not None and preset not in PRESETS:
+        raise ValueError(f"Unknown preset '{preset}', choose one of {', '.join(PRESETS)}.")
+    base = PRESETS[preset] if preset else VLLMOptions()
+    return base.merged(VLLMOptions.from_value(options))
@@ -0,0 +1,214 @@
+import json
+import logging
+from functools import lru_cache
+from threading import Lock, Condition
+from typing import TYPE_CHECKING, Dict, List
+
+from rosiellm.RosieHTTP import Transport, AsyncTransport, openai_httpx, shared_transport, async_transport
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+class JobRoute:
+    """
+    Where requests for one vLLM job go: its URL behind the Rosie web proxy and its API token.
+    A job serving co-located models has a server (and URL) per model, requests go to the one named in their body.
+    Also counts the requests currently in flight to the job, so it can be drained before it is cancelled.
+    """
+    def __init__(self, web_path: str, token: str, model_paths: Dict[str, str] = None):
+        self.web_path = web_path.rstrip('/')
+        self.token = token
+        # only the other servers' models, everything else (including LoRA adapters) goes to web_path
+        self.model_paths = {model: path.rstrip('/') for model, path in (model_paths or {}).items()
+                            if path.rstrip('/') != self.web_path}
+        self.in_flight = 0
+        self._idle = Condition()
+
+    def web_path_for(self, request: 'httpx.Request') -> str:
+        """
+        The URL of the server for the model a request names, web_path unless it is a co-located model.
+        """
+        if not self.model_paths or request.method != 'POST':
+            return self.web_path
+        try:
+            model = json.loads(request.content).get('model')
+        except Exception:
+            # a streamed or non-JSON body (e.g. a file upload)
+            return self.web_path
+        return self.model_paths.get(model, self.web_path)
+
+    def acquire(self) -> None:
+        with self._idle:
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._idle:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """
+        Blocks until no requests are in flight to this job.
+        Returns:
+            bool: True if the job is idle, False if the timeout expired first.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self.in_flight == 0, timeout)
+
+class Router:
+    """
+    Points every client created by a RosieLLM at its current job.
+    Clients keep the base URL they were created with; each request is rewritten to the current job's URL
+    and token when it is sent, so switching jobs (relaunch, rollover) doesn't require new clients, and
+    requests already in flight finish on the job they were sent to.
+    """
+    def __init__(self, route: JobRoute):
+        self.current = route
+        self._prefixes: List[str] = [route.web_path]
+        self._lock = Lock()
+
+    def switch(self, route: JobRoute) -> JobRoute:
+        """
+        Sends new requests to another job.
+        Returns:
+            JobRoute: The previous route, to drain and cancel.
+        """
+        with self._lock:
+            previous, self.current = self.current, route
+            if route.web_path not in self._prefixes:
+                self._prefixes.append(route.web_path)
+        logger.info(f"Routing requests to {route.web_path}")
+        return previous
+
+    def route(self, request: 'httpx.Request') -> JobRoute:
+        """
+        Rewrites a request for the current job and counts it as in flight.
+        Returns:
+            JobRoute: The route the request was sent to. Call release() on it once the response is done.
+        """
+        with self._lock:
+            route = self.current
+            route.acquire()
+            prefixes = list(self._prefixes)
+        web_path = route.web_path_for(request)
+        url = str(request.url)
+        if not url.startswith(web_path + '/'):
+            for prefix in prefixes:
+                if url.startswith(prefix + '/'):
+                    request.url = type(request.url)(web_path + url[len(prefix):])
+                    request.headers['Host'] = request.url.netloc.decode('ascii')
+                    break
+        if 'X-Authorization' in request.headers:
+            request.headers['X-Authorization'] = f'Bearer {route.token}'
+        return route
+
+class RoutedTransport(Transport):
+    """
+    An httpx transport that sends each request to the router's current job.
+    Defaults to the process-wide shared transport (see RosieHTTP.shared_transport()).
+    """
+    def __init__(self, router: Router, transport: 'httpx.BaseTransport' = None):
+        self.router = router
+        self.transport = transport or shared_transport()
+
+    def handle_request(self, request: 'httpx.Request') -> 'httpx.Response':
+        route = self.router.route(request)
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            route.release()
+            raise
+        if response.is_closed:
+            # already read by the transport (e.g. httpx.MockTransport)
+            route.release()
+        else:
+            response.stream = _httpx_stream(_ReleasingStream, openai_httpx().SyncByteStream)(response.stream, route.release)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+class RoutedAsyncTransport(AsyncTransport):
+    """
+    The async counterpart of RoutedTransport.
+    """
+    def __init__(self, router: Router, transport: 'httpx.AsyncBaseTransport' = None):
+        self.router = router
+        self.transport = transport or async_transport()
+
+    async def handle_async_request(self, request: 'httpx.Request') -> 'httpx.Response':
+        route = self.router.route(request)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            route.release()
+            raise
+        if response.is_closed:
+            # already read by the transport (e.g. httpx.MockTransport)
+            route.release()
+        else:
+            response.stream = _httpx_stream(_ReleasingAsyncStream, openai_httpx().AsyncByteStream)(response.stream, route.release)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+# the OpenAI client closes a stream as soon as it reads this event, before the end of the response body
+_STREAM_END = b'data: [DONE]'
+
+@lru_cache(maxsize=None)
+def _httpx_stream(cls: type, base: type) -> type:
+    # httpx checks that a response's stream is one of its own stream classes, which are only imported with httpx
+    return type(cls.__name__, (cls, base), {})
+
+class _ReleasingStream:
+    # a response body that ends the request's in-flight count when it is closed
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._tail = b''
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._tail = (self._tail + chunk)[-64:]
+            yield chunk
+        self._tail = b''
+
+    def close(self) -> None:
+        try:
+            if self._tail.rstrip().endswith(_STREAM_END):
+                # the body wasn't read to the end, but only the end of the chunked body is left, read it so the connection goes back to the pool
+                # instead of being dropped (a stream abandoned mid-generation is still closed, cancelling it)
+                for _ in self._stream:
+                    pass
+            self._stream.close()
+        finally:
+            if self._release:
+                self._release()
+                self._release = None
+
+class _ReleasingAsyncStream:
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._tail = b''
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._tail = (self._tail + chunk)[-64:]
+            yield chunk
+        self._tail = b''
+
+    async def aclose(self) -> None:
+        try:
+            if self._tail.rstrip().endswith(_STREAM_END):
+                async for _ in self._stream:
+                    pass
+            await self._stream.aclose()
+        finally:
+            if self._release:
+                self._release()
+                self._release = None
@@ -1,29 +1,226 @@
 import os
-import re
 import time
-import uuid
 import hashlib
 import base64
 from select import select
 from threading import Lock
 from getpass import getpass
-from typing import Tuple, Optional
+from dataclasses import dataclass
+from typing import Tuple, Optional, Dict, Callable, Iterator, Generator, List
 import logging
 
 import paramiko
 from socket import gaierror
 from cryptography.fernet import Fernet
-from dotenv import load_dotenv
 
-load_dotenv()
-USERNAME = os.getenv('USERNAME')
-ADDRESS = os.getenv('ADDRESS')
+from rosiellm.RosieTiming import LaunchTimer
+
+KEEPALIVE_INTERVAL = 30
+READ_SIZE = 32768
+
+logger = logging.getLogger(__name__)
+
+_env_loaded = False
+
+def env_defaults() -> Tuple[Optional[str], Optional[str]]:
+    """
+    The default SSH username and host, from the USERNAME and ADDRESS environment variables or a .env file.
+    The .env file is read on the first call rather than at import.
+    Returns:
+        (str, str): The username and host, each None if unset.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+    return os.getenv('USERNAME'), os.getenv('ADDRESS')
+
+class PooledConnection:
+    """
+    One authenticated SSH connection to a host, shared by every RosieSSH for the same user and host.
+    Commands, shells and SFTP sessions each get their own channel multiplexed over the connection's
+    Transport, and the connection is re-established transparently if it drops.
+    """
+    def __init__(self, username: str, host: str, get_password: Callable[[], str], keepalive: int = KEEPALIVE_INTERVAL):
+        self.username = username
+        self.host = host
+        self.keepalive = keepalive
+        self.refcount = 0
+        self._get_password = get_password
+        self._client = None
+        self._lock = Lock()
+
+    @property
+    def client(self) -> paramiko.SSHClient:
+        """
+        The connected SSHClient, reconnecting first if the transport has dropped.
+        Raises:
+            paramiko.SSHException: If the connection can't be (re-)established.
+        """
+        with self._lock:
+            if not self.is_active():
+                if self._client:
+                    logger.warning(f"SSH connection to {self.host} dropped, reconnecting...")
+                self._connect()
+            return self._client
+
+    def is_active(self) -> bool:
+        transport = self._client.get_transport() if self._client else None
+        return bool(transport and transport.is_active())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client:
+                self._client.close()
+                self._client = None
+
+    def _connect(self) -> None:
+        if self._client:
+            self._client.close()
+            self._client = None
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # hosts may carry a port ("host:port"), e.g. for a local stand-in
+        hostname, _, port = self.host.partition(':')
+        try:
+            client.connect(hostname, port=int(port or 22), username=self.username, password=self._get_password())
+        except paramiko.AuthenticationException:
+            client.close()
+            raise
+        except paramiko.SSHException as e:
+            client.close()
+            raise paramiko.SSHException(f"An error occurred while connecting to {self.host}: {e}")
+        except gaierror as e:
+            client.close()
+            raise paramiko.SSHException(f"The SSH address is either incorrect or GlobalProtect isn't connected: {e}")
+        client.get_transport().set_keepalive(self.keepalive)
+        self._client = client
+
+class SSHConnectionPool:
+    """
+    A process-wide pool of SSH connections keyed by (user, host).
+    Connections are reference counted: acquire() opens one on first use and release() closes it
+    once the last user lets go. Credentials are also shared per user, so the password is only
+    prompted for once per process.
+    """
+    _connections: Dict[Tuple[str, str], PooledConnection] = {}
+    _auths: Dict[str, 'RosieAuth'] = {}
+    _lock = Lock()
+    # held while a password is typed, so concurrent prompts don't interleave without blocking the pool
+    _prompt_lock = Lock()
+
+    @classmethod
+    def get_auth(cls, username: str, timer: LaunchTimer = None) -> 'RosieAuth':
+        """
+        Returns the credentials for a user, prompting for the password the first time.
+        Args:
+            username (str): The Rosie username.
+            timer (LaunchTimer, optional): Receives the password prompt and key derivation timings if the
+                credentials are created by this call.
+        """
+        with cls._lock:
+            auth = cls._auths.get(username)
+        if auth is not None:
+            return auth
+        with cls._prompt_lock:
+            # another thread may have prompted for this user (or set_auth() been called) while this one waited
+            with cls._lock:
+                auth = cls._auths.get(username)
+            if auth is not None:
+                return auth
+            created = RosieAuth(username)
+            with cls._lock:
+                auth = cls._auths.setdefault(username, created)
+        if timer and auth is created:
+            for phase, seconds in auth.timings.items():
+                timer.record(phase, seconds)
+        return auth
+
+    @classmethod
+    def set_auth(cls, username: str, rosie_auth: 'RosieAuth') -> None:
+        """
+        Provides the credentials for a user up front, so they aren't prompted for.
+        """
+        with cls._lock:
+            cls._auths[username] = rosie_auth
+
+    @classmethod
+    def acquire(cls, username: str, host: str, get_password: Callable[[], str]) -> PooledConnection:
+        """
+        Returns the shared connection for (username, host), connecting if it isn't open yet.
+        Args:
+            username (str): The SSH username.
+            host (str): The SSH host.
+            get_password (Callable[[], str]): Returns the password, used whenever the connection is (re-)established.
+        Returns:
+            PooledConnection: The connection. Call release() with the same username and host when done.
+        """
+        with cls._lock:
+            connection = cls._connections.get((username, host))
+            if connection is None:
+                connection = cls._connections[(username, host)] = PooledConnection(username, host, get_password)
+            connection.refcount += 1
+        try:
+            connection.client # connect now so errors surface at acquire time
+        except paramiko.AuthenticationException:
+            # don't keep a wrong password around, the next RosieSSH prompts again
+            with cls._lock:
+                cls._auths.pop(username, None)
+            cls.release(username, host)
+            raise
+        except Exception:
+            cls.release(username, host)
+            raise
+        return connection
+
+    @classmethod
+    def release(cls, username: str, host: str) -> None:
+        with cls._lock:
+            connection = cls._connections.get((username, host))
+            if connection is None:
+                return
+            connection.refcount -= 1
+            if connection.refcount > 0:
+                return
+            del cls._connections[(username, host)]
+        connection.close()
+
+@dataclass
+class CommandResult:
+    """
+    The outcome of a command run on Rosie.
+    Attributes:
+        command (str): The command that was run.
+        stdout (str): Everything the command wrote to stdout.
+        stderr (str): Everything the command wrote to stderr.
+        exit_status (int): The command's exit status (-1 if the server didn't report one).
+    """
+    command: str
+    stdout: str
+    stderr: str
+    exit_status: int
+
+    @property
+    def output(self) -> str:
+        return self.stdout + self.stderr
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_status == 0
 
 class RosieSSH:
     """
     A class to manage SSH connections and execute commands on Rosie.
+    Every command runs on its own exec channel over the shared connection, so several
+    commands can be in flight at once.
     """
-    def __init__(self, ssh_username: str = None, ssh_host: str = None):
+    def __init__(self,
+                 ssh_username: str = None,
+                 ssh_host: str = None,
+                 fallback_hosts: List[str] = None,
+                 rosie_auth: 'RosieAuth' = None,
+                 timer: LaunchTimer = None):
         """
         Initialize the SSH connection parameters.
         This method initializes the SSH connection parameters either from the provided arguments
@@ -32,156 +229,178 @@ class RosieSSH:
         Args:
             ssh_username (str, optional): The SSH username. Defaults to None.
             ssh_host (str, optional): The SSH host. Defaults to None.
+            fallback_hosts (List[str], optional): Hosts to fail over to, in order, if ssh_host can't be
+                reached or drops mid-session. Defaults to None.
+            rosie_auth (RosieAuth, optional): Credentials to use instead of prompting for the password. Defaults to None.
+            timer (LaunchTimer, optional): Records the time spent on authentication and connecting. Defaults to a new timer.
         Raises:
             ValueError: If any of the SSH credentials (username, password, host) connect be loaded.
         """
-        self.ssh_username = ssh_username or USERNAME
-        self.ssh_host = ssh_host or ADDRESS
-        self.rosie_auth = RosieAuth(self.ssh_username)
-        
+        default_username, default_host = env_defaults()
+        self.ssh_username = ssh_username or default_username
+        self.ssh_host = ssh_host or default_host
+        self.fallback_hosts = [h for h in fallback_hosts or [] if h != self.ssh_host]
+        # shared connection, one channel per command/sftp session
+        self.connection = None
+        self._channels = set()
+        self._channels_lock = Lock()
+        self.timer = timer or LaunchTimer()
+
         if not self.ssh_username or not self.ssh_host:
             raise ValueError("""All SSH credentials (USERNAME, HOST) 
                              must be provided either as arguments or environment variables.""")
-        # main client, used persistently
-        self.ssh_client = None
-        self.channel = None
-
-        # used for individual, one off commands
-        self.instance_client = None
-
-        self.lock = Lock()
+        if rosie_auth:
+            SSHConnectionPool.set_auth(self.ssh_username, rosie_auth)
+        self.rosie_auth = SSHConnectionPool.get_auth(self.ssh_username, self.timer)
 
     def __del__(self):
         self.close()
 
+    @property
+    def ssh_client(self) -> Optional[paramiko.SSHClient]:
+        """
+        The SSHClient of the shared connection, or None if not connected.
+        """
+        return self.connection.client if self.connection else None
+
+    @property
+    def instance_client(self) -> Optional[paramiko.SSHClient]:
+        # kept for compatibility, commands now share the connection's transport
+        return self.ssh_client
+
     def connect(self) -> None:
         """
-        Establishes an SSH connection to Rosie.
+        Establishes an SSH connection to Rosie, reusing the pooled connection if one is already open.
+        If ssh_host can't be reached, the fallback hosts are tried in order.
         Raises:
             paramiko.SSHException: If there is any error while connecting to the remote server.
         """
-        # Use paramiko to establish an SSH connection
-        try:
-            self.ssh_client = paramiko.SSHClient()
-            self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            self.ssh_client.connect(self.ssh_host, username=self.ssh_username, password=self.rosie_auth.get_rosie_password())
-            self.channel = self.ssh_client.invoke_shell()
-
-            self.instance_client = paramiko.SSHClient()
-            self.instance_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            self.instance_client.connect(self.ssh_host, username=self.ssh_username, password=self.rosie_auth.get_rosie_password())
-        except paramiko.SSHException as e:
-            self.close()
-            raise paramiko.SSHException(f"An error occurred while connecting to {self.ssh_host}: {e}")
-        except gaierror as e:
-            self.close()
-            raise paramiko.SSHException(f"The SSH address is either incorrect or GlobalProtect isn't connected: {e}")
-        # Flush the initial banner
-        self.flush_buffer()
+        if self.connection:
+            return
+        with self.timer.phase('ssh_connect'):
+            self._connect_any()
+
+    def _connect_any(self) -> None:
+        last_error = None
+        for host in [self.ssh_host] + self.fallback_hosts:
+            try:
+                self.connection = SSHConnectionPool.acquire(self.ssh_username, host, self.rosie_auth.get_rosie_password)
+            except paramiko.AuthenticationException:
+                # every node checks the same password, trying the others would only risk locking the account
+                raise
+            except (paramiko.SSHException, OSError) as e:
+                last_error = e
+            else:
+                if host != self.ssh_host:
+                    logger.warning(f"Failed over from {self.ssh_host} to {host}: {last_error}")
+                    self.fallback_hosts = [h for h in self.fallback_hosts if h != host] + [self.ssh_host]
+                    self.ssh_host = host
+                return
+            logger.info(f"Could not connect to {host}: {last_error}")
+        raise paramiko.SSHException(f"An error occurred while connecting to {self.ssh_host}: {last_error}")
+
+    def failover(self, error: Exception = None) -> None:
+        """
+        Drops the current connection and reconnects through the next fallback host.
+        Args:
+            error (Exception, optional): The error that triggered the failover, for logging.
+        Raises:
+            paramiko.SSHException: If there are no fallback hosts, or none of them can be reached.
+        """
+        if not self.fallback_hosts:
+            raise paramiko.SSHException(f"Connection to {self.ssh_host} failed and there is no host to fail over to: {error}")
+        logger.warning(f"Connection to {self.ssh_host} failed ({error}), failing over to {self.fallback_hosts[0]}")
+        self.cancel()
+        if self.connection:
+            self.connection = None
+            SSHConnectionPool.release(self.ssh_username, self.ssh_host)
+        failed_host = self.ssh_host
+        self.ssh_host = self.fallback_hosts.pop(0)
+        self.fallback_hosts.append(failed_host)
+        self.connect()
 
     def close(self) -> None:
         """
-        Closes the SSH connection to Rosie.
+        Cancels any commands still running and releases this session's reference to the shared connection.
+        """
+        self.cancel()
+        if getattr(self, 'connection', None):
+            self.connection = None
+            SSHConnectionPool.release(self.ssh_username, self.ssh_host)
+
+    def run_command(self,
+                    command: str,
+                    timeout: Optional[float] = None,
+                    on_line: Callable[[str, str], None] = None) -> CommandResult:
+        """
+        Runs a command on its own exec channel and waits for it to finish.
+        Args:
+            command (str): The command to be executed on the remote server.
+            timeout (float, optional): Maximum seconds to wait for new output before giving up. Defaults to None (no limit).
+            on_line (Callable[[str, str], None], optional): Called with ("stdout" or "stderr", line) for each line
+                of output as it arrives.
+        Returns:
+            CommandResult: The command's stdout, stderr and exit status.
+        Raises:
+            paramiko.SSHException: If the SSH connection is not established.
+            TimeoutError: If the command produces no output for longer than the timeout.
+        """
+        output = {'stdout': [], 'stderr': []}
+        reader = self._read_lines(command, timeout, output)
+        try:
+            while True:
+                stream, line = next(reader)
+                if on_line:
+                    on_line(stream, line)
+        except StopIteration as done:
+            exit_status = done.value
+        return CommandResult(command,
+                             b''.join(output['stdout']).decode(errors='ignore'),
+                             b''.join(output['stderr']).decode(errors='ignore'),
+                             exit_status)
+
+    def stream_command(self, command: str, timeout: Optional[float] = None) -> Iterator[str]:
         """
-        if self.channel:
-            self.channel.close()
-            self.channel = None
-        if self.ssh_client:
-            self.ssh_client.close()
-            self.ssh_client = None
-        if self.instance_client:
-            self.instance_client.close()
-            self.instance_client = None
+        Runs a command and yields its output (stdout and stderr) line by line as it arrives.
+        Closing the generator early cancels the command.
+        Args:
+            command (str): The command to be executed on the remote server.
+            timeout (float, optional): Maximum seconds to wait for new output before giving up. Defaults to None (no limit).
+        Returns:
+            Iterator[str]: The lines of output, without trailing newlines.
+        """
+        for _, line in self._read_lines(command, timeout):
+            yield line
 
     def execute_instance_command(self, command: str) -> Optional[str]:
         """
-        Executes a command on the remote server through a new SSH connection using Paramiko.
+        Executes a command on the remote server.
         Args:
             command (str): The command to be executed on the remote server.
         Returns:
-            str: The output of the command execution.
+            str: The output of the command execution (stdout followed by stderr).
         Raises:
             paramiko.SSHException: If there is any error while executing the command.
         """
-        if not self.instance_client:
-            raise paramiko.SSHException("SSH connection is not established. Call connect() method first.")
-        
-        _, stdout, stderr = self.instance_client.exec_command(command)
-        output = stdout.read().decode(errors='ignore')
-        error = stderr.read().decode(errors='ignore')
-        return output + error
+        return self.run_command(command).output
         
     def execute_command(self, command: str, streaming: bool = False, timeout=20) -> Optional[str]:
         """
-        Executes a command on the remote server through an SSH tunnel using Paramiko.
+        Executes a command on the remote server.
         Args:
             command (str): The command to be executed on the remote server.
-            streaming (bool, optional): If True, the output will be streamed as it arrives.
+            streaming (bool, optional): If True, the output will be printed line by line as it arrives.
+            timeout (float, optional): Maximum seconds to wait for new output. Defaults to 20.
         Returns:
-            str: The output of the command execution. If streaming is True, returns None.
+            str: The output of the command execution. If streaming is True, returns an empty string.
         Raises:
             paramiko.SSHException: If the SSH connection is not established, 
                 or if there is any error while executing the command.
         """
-        #NOTE: this works for the most part, has not been tested extensively
-        # this method should probably be changed in the future
-        with self.lock:
-            if not self.channel:
-                raise paramiko.SSHException("SSH connection is not established. Call connect() method first.")
-
-            # Generate random 8-character hex codes
-            start_code = uuid.uuid4().bytes[:4].hex()
-            end_code = uuid.uuid4().bytes[:4].hex()
-            # debug_buffer = ""
-
-            # Send command
-            command = f'echo "{start_code}" && {command} && echo "{end_code}"\n'
-            self.channel.send(command)
-            
-            overflow = self.__flush_buffer_until_key(f'{end_code}"')
-            # debug_buffer += (command + overflow)
-
-            output = ["", overflow]  # Initialize output list with an empty string
-            buffer_size = 32 if streaming else 4096
-            prompt_detected = False
-            
-            while not prompt_detected:
-                self.wait_for_ready_channel(timeout=timeout)
-                if self.channel.recv_ready():
-                    response = self.channel.recv(buffer_size).decode(errors='ignore')
-                    last_response = output[-1]
-                    buffer = "".join([last_response, response])
-                    # debug_buffer += response
-                    response_modified = False
-
-                    if start_code in buffer:
-                        buffer = buffer.split(start_code, 1)[1] # Remove everything before start_code
-                        output[-1] = buffer # update the last response because it has been modified
-                        response_modified = True
-                    if end_code in buffer:
-                        buffer = buffer.split(end_code, 1)[0] # Remove everything after end_code
-                        output[-1] = buffer # update the last response because it has been modified
-                        response_modified = True
-                        prompt_detected = True
-
-                    if streaming:
-                        print(output[-2], end='')  # Print buffer as it comes
-                    if not response_modified:
-                        output.append(response)
-            cleaned_output = ""
-            if streaming:
-                print(output[-1], end='')  # Print the last buffer
-            else:
-                cleaned_output = "".join(output)
-
-                # Remove ANSI escape codes
-                ansi_escape = re.compile(r'\x1B[@-_][0-?]*[ -/]*[@-~]')
-                cleaned_output = ansi_escape.sub('', cleaned_output)
-                cleaned_output = cleaned_output.replace('\r', '')
-
-        overflow = self.flush_buffer()
-        # print(f'{len(overflow)}: {overflow}')
-        return cleaned_output if not streaming else "" #or debug) else debug_buffer 
+        if streaming:
+            self.run_command(command, timeout=timeout, on_line=lambda _, line: print(line))
+            return ""
+        return self.run_command(command, timeout=timeout).output
     
     def copy_file_to_remote(self, local_file_path: str, rosie_file_path: str) -> None:
         """
@@ -190,88 +409,96 @@ class RosieSSH:
             text (str): The text to be copied to the file.
             file_path (str): The path of the file on the remote server.
         """
-        if not self.channel:
-            raise paramiko.SSHException("SSH connection is not established. Call connect() method first.")
-        sftp = self.ssh_client.open_sftp()
-        sftp.put(local_file_path, rosie_file_path)
-        sftp.close()
-    
-    def send_password(self, message: str = None) -> None:
+        sftp = self.open_sftp()
+        try:
+            sftp.put(local_file_path, rosie_file_path)
+        finally:
+            sftp.close()
+
+    def open_sftp(self) -> paramiko.SFTPClient:
         """
-        Sends the password to the remote server.
-        Args:
-            password (str): The password to be sent to the remote server.
+        Opens an SFTP session over the shared connection, failing over to the next host if the connection is gone.
+        Returns:
+            paramiko.SFTPClient: The SFTP session. The caller is responsible for closing it.
         """
-        # self.channel.send(self.ssh_password + '\n')
-        self.channel.send(self.rosie_auth.get_rosie_password() + '\n')
-        self.flush_buffer()
+        if not self.connection:
+            raise paramiko.SSHException("SSH connection is not established. Call connect() method first.")
+        try:
+            return self.ssh_client.open_sftp()
+        except (paramiko.SSHException, OSError, EOFError) as e:
+            self.failover(e)
+            return self.ssh_client.open_sftp()
 
     def cancel(self) -> None:
         """
-        Cancels the current command execution on the remote server.
+        Cancels every command this session currently has running on the remote server.
         """
-        self.channel.send('\x03')
+        with self._channels_lock:
+            channels, self._channels = self._channels, set()
+        for channel in channels:
+            channel.close()
 
-    def flush_buffer(self, num_bytes: int = 4096) -> str:
+    def _open_channel(self, timeout: Optional[float] = None) -> paramiko.Channel:
         """
-        Empties the buffer of the SSH channel.
-        """
-        self.channel.send(" ") #guard against empty buffer
-        self.wait_for_ready_channel()
-        output = []
-        while self.channel.recv_ready():
-            output.append(self.channel.recv(num_bytes))
-        return "".join([o.decode(errors='ignore') for o in output])[:-1]
-    
-    def __flush_buffer_until_key(self, key: str) -> str:
-        """
-        Clears the buffer of the SSH channel until the specified key is found, and returns the remaining buffer.
-        """
-        self.wait_for_ready_channel()
-        output = [""]
-        buffer_size = max(2*len(key), 32)
-        key_found = False
-        overflow = ""
-
-        while not key_found:
-            while self.channel.recv_ready() and not key_found:
-                response = self.channel.recv(buffer_size).decode(errors='ignore')
-                recent_buffer = "" + output[-1] + response
-                output.append(response)
-                output.pop(0)
-                if key in recent_buffer:
-                    overflow = recent_buffer.split(key, 1)[1]  # Remove everything before key
-                    key_found = True
-        return overflow
-    
-    def wait_for_ready_channel(self, timeout: int = 20) -> None:
-        """
-        Wait until the SSH channel is ready to read or until the timeout is reached.
+        Opens a new session channel, failing over to the next host if the connection is gone.
         Args:
-            timeout (int): Maximum time in seconds to wait for the channel to be ready.
-        Raises:
-            TimeoutError: If the channel is not ready within the given timeout.
+            timeout (float, optional): Seconds to wait for the server to open the channel. Defaults to paramiko's.
         """
-        start = time.time()
-        while not self.__channel_is_ready():
-            if time.time() - start > timeout:
-                raise TimeoutError("Timeout waiting for the channel to be ready.")
+        if not self.connection:
+            raise paramiko.SSHException("SSH connection is not established. Call connect() method first.")
+        try:
+            return self.ssh_client.get_transport().open_session(timeout=timeout)
+        except (paramiko.SSHException, OSError, EOFError) as e:
+            self.failover(e)
+            return self.ssh_client.get_transport().open_session(timeout=timeout)
 
-    def __channel_is_ready(self, timeout: int = 1) -> bool:
+    def _read_lines(self, command: str, timeout: Optional[float], output: dict = None) -> Generator[Tuple[str, str], None, int]:
         """
-        Check if the SSH channel is ready to read.
-        Args:
-            timeout (int): Maximum time in seconds to wait for the channel to be ready.
-        Returns:
-            bool: True if the channel is ready, False otherwise.
-        Raises:
-            paramiko.SSHException: If the SSH channel is not established.
+        Runs a command on a new exec channel and yields ("stdout" or "stderr", line) as output arrives.
+        Raw output is also appended to output["stdout"] / output["stderr"] if given.
+        Returns the exit status once the command has finished.
         """
-        if not self.channel:
-            raise paramiko.SSHException("SSH connection is not established. Call connect() method first.")
-        
-        ready_to_read, _, _ = select([self.channel], [], [], timeout)
-        return self.channel in ready_to_read
+        channel = self._open_channel(timeout)
+        with self._channels_lock:
+            self._channels.add(channel)
+        try:
+            channel.exec_command(command)
+            streams = {'stdout': (channel.recv_ready, channel.recv), 'stderr': (channel.recv_stderr_ready, channel.recv_stderr)}
+            partial = {'stdout': bytearray(), 'stderr': bytearray()}
+            last_output = time.time()
+            while True:
+                received = False
+                for name, (ready, recv) in streams.items():
+                    while ready():
+                        data = recv(READ_SIZE)
+                        received = True
+                        if output is not None:
+                            output[name].append(data)
+                        buffer = partial[name]
+                        buffer.extend(data)
+                        *lines, remainder = buffer.split(b'\n')
+                        partial[name] = bytearray(remainder)
+                        for line in lines:
+                            yield name, line.rstrip(b'\r').decode(errors='ignore')
+                if received:
+                    last_output = time.time()
+                elif channel.closed or (channel.eof_received and channel.exit_status_ready()):
+                    break
+                elif timeout is not None and time.time() - last_output > timeout:
+                    raise TimeoutError(f"No output from '{command}' for {timeout} seconds.")
+                else:
+                    # wakes as soon as stdout has data; stderr is picked up on the next pass
+                    select([channel], [], [], 0.1)
+
+            for name, buffer in partial.items():
+                if buffer:
+                    yield name, buffer.rstrip(b'\r').decode(errors='ignore')
+            # -1 if the channel closed without reporting an exit status
+            return channel.recv_exit_status()
+        finally:
+            channel.close()
+            with self._channels_lock:
+                self._channels.discard(channel)
 
 class RosieAuth:
     """
@@ -296,9 +523,12 @@ class RosieAuth:
             password (str, optional): The password to be encrypted and stored.
             iterations (int, optional): The number of iterations for key derivation. Defaults to 100000.
         """
+        start = time.perf_counter()
         salt = os.urandom(16)
         encryption_key = base64.urlsafe_b64encode(hashlib.pbkdf2_hmac('sha256', username.encode(), salt, iterations))
         self.cipher = Fernet(encryption_key)
+        # seconds spent on each step, picked up by LaunchTimer
+        self.timings = {'key_derivation': time.perf_counter() - start}
 
         self.auth_token = None
         self.password = None
@@ -306,7 +536,10 @@ class RosieAuth:
         if password:
             self.__set_credentials(username, password)
         else:
-            self.__set_credentials(username, getpass(f"Enter the Rosie Password for {username}: "))
+            start = time.perf_counter()
+            password = getpass(f"Enter the Rosie Password for {username}: ")
+            self.timings['password_prompt'] = time.perf_counter() - start
+            self.__set_credentials(username, password)
 
     def __set_credentials(self, username: str, password: str) -> None:
         """
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import tempfile
+import logging
+from threading import Lock
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR = os.getenv('ROSIELLM_STATE_DIR', os.path.join(os.path.expanduser('~'), '.rosiellm'))
+# config_dict keys that must match for a running job to be reused
+COMPATIBILITY_KEYS = ('model', 'dtype', 'gpus', 'task', 'colocate', 'lora_adapters')
+
+class SessionRegistry:
+    """
+    A local, file-backed registry of the vLLM jobs launched on Rosie.
+    Each entry records everything a new RosieLLM needs to reattach to a running job
+    (job id, node, port and token) along with the config it was launched with.
+    Updates are serialized across threads and, through a lock file, across processes sharing the state directory.
+    """
+    _lock = Lock()
+
+    def __init__(self, state_dir: str = None):
+        """
+        Initialize the registry.
+        Args:
+            state_dir (str, optional): Directory holding the state file. Defaults to ~/.rosiellm,
+                or the ROSIELLM_STATE_DIR environment variable if set.
+        """
+        self.state_dir = state_dir or STATE_DIR
+        self.path = os.path.join(self.state_dir, 'sessions.json')
+        self.lock_path = self.path + '.lock'
+
+    @staticmethod
+    def key(user: str, job_name: str) -> str:
+        return f"{user}:{job_name}"
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Reads every entry in the registry.
+        Returns:
+            dict: The entries, keyed by "user:job_name". Empty if the state file is missing or unreadable.
+        """
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable session registry {self.path}: {e}")
+            return {}
+
+    def get(self, user: str, job_name: str) -> Optional[Dict[str, Any]]:
+        return self.load().get(self.key(user, job_name))
+
+    def save(self, user: str, job_name: str, **entry) -> None:
+        """
+        Records (or replaces) the entry for a job.
+        Args:
+            user (str): The Rosie username the job runs under.
+            job_name (str): The SLURM job name.
+            **entry: The session details, e.g. job_id, node_url, port, token and the compatibility keys.
+        """
+        entry['saved_at'] = time.time()
+        with self._locked():
+            sessions = self.load()
+            sessions[self.key(user, job_name)] = entry
+            self._write(sessions)
+
+    def remove(self, user: str, job_name: str) -> None:
+        with self._locked():
+            sessions = self.load()
+            if sessions.pop(self.key(user, job_name), None) is not None:
+                self._write(sessions)
+
+    @staticmethod
+    def is_compatible(entry: Dict[str, Any], config_dict: Dict[str, Any]) -> bool:
+        """
+        Checks whether a registered job was launched with the same model, dtype, tensor parallelism, task,
+        co-located models and LoRA adapters.
+        "auto" in the config (e.g. gpus="auto") matches whatever the job was sized to.
+        """
+        return all(str(config_dict.get(k)) in ('auto', str(entry.get(k))) for k in COMPATIBILITY_KEYS)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # held from load() to _write(), so a concurrent update (e.g. from a notebook and a script) isn't lost
+        with self._lock:
+            os.makedirs(self.state_dir, mode=0o700, exist_ok=True)
+            try:
+                import fcntl
+            except ImportError:
+                # Windows, where only this process's threads are serialized
+                yield
+                return
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _write(self, sessions: Dict[str, Dict[str, Any]]) -> None:
+        # the registry holds API tokens, so keep it private and replace it atomically
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(sessions, f, indent=2)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,262 @@
+import os
+import json
+import math
+import errno
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GIB = 1024 ** 3
+# (GPU memory in GiB, GPUs per node) of each partition's nodes
+PARTITION_GPUS = {
+    'teaching': (16, 4), # T4
+    'dgx': (32, 8), # V100
+    'dgxh100': (80, 8), # H100
+}
+DEFAULT_GPUS = 2
+# CUDA context, activations and CUDA graphs, per GPU
+OVERHEAD_GIB = 2.0
+# the KV cache must hold at least this many full-length sequences, so continuous batching has room to work
+MIN_SEQUENCES = 4
+# vLLM's default, raised (up to the maximum) only when the model wouldn't fit otherwise
+DEFAULT_UTILIZATION = 0.90
+MAX_UTILIZATION = 0.95
+DTYPE_BYTES = {'half': 2, 'float16': 2, 'bfloat16': 2, 'float': 4, 'float32': 4}
+HF_URL = os.getenv('HF_ENDPOINT', 'https://huggingface.co')
+
+@dataclass
+class ModelProfile:
+    """
+    What sizing needs to know about a model, read from its config.json and weight index.
+    Attributes:
+        model (str): The HuggingFace model id.
+        params (int): The number of parameters.
+        weight_bytes (int, optional): The size of the weights on disk, used for quantized models.
+        num_layers (int): Transformer layers.
+        num_attention_heads (int): Query heads, which the tensor parallel degree must divide.
+        num_kv_heads (int): Key/value heads (fewer than num_attention_heads with grouped-query attention).
+        head_dim (int): The dimension of each head.
+        max_position_embeddings (int): The longest context the model supports.
+        torch_dtype (str): The dtype the weights are stored in.
+        quantized (bool): Whether the weights are quantized (AWQ, GPTQ, ...).
+    """
+    model: str
+    params: int
+    weight_bytes: Optional[int]
+    num_layers: int
+    num_attention_heads: int
+    num_kv_heads: int
+    head_dim: int
+    max_position_embeddings: int
+    torch_dtype: str = 'float16'
+    quantized: bool = False
+
+    @classmethod
+    def from_config(cls, model: str, config: Dict[str, Any], index: Dict[str, Any] = None,
+                    params: int = None) -> 'ModelProfile':
+        """
+        Builds a profile from a model's config.json, its model.safetensors.index.json (if sharded) and,
+        if known, its exact parameter count. Without either, the parameter count is estimated from the config.
+        """
+        # multimodal models keep the language model's config in text_config
+        text = config.get('text_config') or config
+        hidden = text['hidden_size']
+        heads = text['num_attention_heads']
+        kv_heads = text.get('num_key_value_heads') or heads
+        head_dim = text.get('head_dim') or hidden // heads
+        dtype = str(config.get('torch_dtype') or text.get('torch_dtype') or 'float16')
+        weight_bytes = (index or {}).get('metadata', {}).get('total_size')
+        if params is None and weight_bytes and 'quantization_config' not in config:
+            params = weight_bytes // DTYPE_BYTES.get(dtype, 2)
+        return cls(model=model,
+                   params=params or estimate_params(text),
+                   weight_bytes=weight_bytes,
+                   num_layers=text['num_hidden_layers'],
+                   num_attention_heads=heads,
+                   num_kv_heads=kv_heads,
+                   head_dim=head_dim,
+                   max_position_embeddings=text.get('max_position_embeddings') or 2048,
+                   torch_dtype=dtype,
+                   quantized='quantization_config' in config)
+
+    def weight_size(self, dtype: str) -> int:
+        """
+        Bytes of GPU memory the weights take when served with a vLLM --dtype.
+        """
+        if self.quantized and self.weight_bytes:
+            return self.weight_bytes
+        return self.params * dtype_bytes(dtype, self.torch_dtype)
+
+    def kv_bytes_per_token(self, dtype: str) -> int:
+        # a key and a value vector per layer and KV head
+        return 2 * self.num_layers * self.num_kv_heads * self.head_dim * dtype_bytes(dtype, self.torch_dtype)
+
+@dataclass
+class SizingPlan:
+    """
+    The smallest job that serves a model.
+    Attributes:
+        gpus (int): GPUs to allocate, also the tensor parallel degree.
+        max_model_len (int): The context length to serve.
+        gpu_memory_utilization (float): The share of each GPU's memory vLLM may use.
+        weights_gib (float): GiB of weights per GPU.
+        kv_cache_gib (float): GiB of KV cache per GPU left for MIN_SEQUENCES full-length sequences (or more).
+    """
+    gpus: int
+    max_model_len: int
+    gpu_memory_utilization: float
+    weights_gib: float
+    kv_cache_gib: float
+
+    def __str__(self) -> str:
+        return (f"{self.gpus} GPU(s), {self.weights_gib:.1f} GiB of weights and {self.kv_cache_gib:.1f} GiB "
+                f"of KV cache per GPU, max_model_len={self.max_model_len}, "
+                f"gpu_memory_utilization={self.gpu_memory_utilization:.2f}")
+
+def dtype_bytes(dtype: str, torch_dtype: str = 'float16') -> int:
+    if dtype == 'auto':
+        dtype = torch_dtype
+    return DTYPE_BYTES.get(str(dtype), 2)
+
+def estimate_params(config: Dict[str, Any]) -> int:
+    """
+    Estimates a decoder-only transformer's parameter count from its config (embeddings, attention and gated MLP,
+    including mixture-of-experts layers). Used when the weight index doesn't give the exact size.
+    """
+    hidden = config['hidden_size']
+    layers = config['num_hidden_layers']
+    heads = config['num_attention_heads']
+    kv_heads = config.get('num_key_value_heads') or heads
+    head_dim = config.get('head_dim') or hidden // heads
+    vocab = config.get('vocab_size', 32000)
+    experts = config.get('num_local_experts') or config.get('num_experts') or 1
+    intermediate = config.get('moe_intermediate_size') if experts > 1 and config.get('moe_intermediate_size') \
+        else config.get('intermediate_size', 4 * hidden)
+    attention = 2 * hidden * heads * head_dim + 2 * hidden * kv_heads * head_dim
+    mlp = 3 * hidden * intermediate * experts
+    embeddings = vocab * hidden * (1 if config.get('tie_word_embeddings') else 2)
+    return layers * (attention + mlp) + embeddings
+
+def partition_gpus(partition: str, gpu_memory_gb: float = None) -> Tuple[float, int]:
+    """
+    The GPU memory (GiB) and GPUs per node of a partition's nodes.
+    """
+    memory, per_node = PARTITION_GPUS.get(partition, (None, 4))
+    if memory is None and gpu_memory_gb is None:
+        logger.warning(f"Unknown GPU memory for partition '{partition}', assuming 16 GiB (set gpu_memory_gb).")
+        memory = 16
+    return float(gpu_memory_gb or memory), per_node
+
+def plan_job(profile: ModelProfile,
+             dtype: str = 'half',
+             max_model_len: int = None,
+             gpu_memory_gb: float = 16,
+             max_gpus: int = 4) -> SizingPlan:
+    """
+    Picks the fewest GPUs (tensor parallel degree) that fit a model's weights plus room in the KV cache for
+    MIN_SEQUENCES sequences of max_model_len tokens, and the GPU memory utilization that leaves that room.
+    Args:
+        profile (ModelProfile): The model.
+        dtype (str): The vLLM --dtype the model is served with.
+        max_model_len (int, optional): The context length to serve. Defaults to (and is capped at) the model's maximum.
+        gpu_memory_gb (float): The memory of each GPU, in GiB.
+        max_gpus (int): The most GPUs a job can use (one node).
+    Returns:
+        SizingPlan: The plan.
+    Raises:
+        ValueError: If the model doesn't fit on max_gpus GPUs at that context length.
+    """
+    if not max_model_len or int(max_model_len) > profile.max_position_embeddings:
+        if max_model_len:
+            logger.warning(f"{profile.model} supports at most {profile.max_position_embeddings} tokens, "
+                           f"lowering max_model_len from {max_model_len}.")
+        max_model_len = profile.max_position_embeddings
+    max_model_len = int(max_model_len)
+    weights = profile.weight_size(dtype)
+    kv_cache = profile.kv_bytes_per_token(dtype) * max_model_len * MIN_SEQUENCES
+    # vLLM needs the tensor parallel degree to divide the number of attention heads
+    for tp in (d for d in (1, 2, 4, 8) if d <= max_gpus and profile.num_attention_heads % d == 0):
+        needed = (weights + kv_cache) / tp + OVERHEAD_GIB * GIB
+        utilization = needed / (gpu_memory_gb * GIB)
+        if utilization <= MAX_UTILIZATION:
+            utilization = max(DEFAULT_UTILIZATION, math.ceil(utilization * 100) / 100)
+            available = gpu_memory_gb * GIB * utilization - weights / tp - OVERHEAD_GIB * GIB
+            return SizingPlan(tp, max_model_len, utilization, weights / tp / GIB, available / GIB)
+    raise ValueError(f"{profile.model} needs about {(weights + kv_cache) / GIB + OVERHEAD_GIB * max_gpus:.0f} GiB "
+                     f"of GPU memory at max_model_len={max_model_len} with dtype={dtype}, more than {max_gpus} "
+                     f"{gpu_memory_gb:.0f} GiB GPUs. Lower max_model_len or use a quantized model or a larger partition.")
+
+def read_model_metadata(rosie_ssh, download_dir: str, model: str,
+                        revision: str = None) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """
+    Reads a model's config.json and model.safetensors.index.json from the HuggingFace cache in download_dir on Rosie.
+    Returns:
+        (dict, dict): The config and the index, each None if it isn't there.
+    """
+    repo = f"{download_dir}/models--{model.replace('/', '--')}"
+    sftp = rosie_ssh.open_sftp()
+    try:
+        def read_json(path: str) -> Optional[Dict]:
+            try:
+                with sftp.open(path, 'r') as f:
+                    return json.loads(f.read())
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    logger.debug(f"Failed to read {path}: {e}")
+                return None
+
+        commit = revision or 'main'
+        try:
+            with sftp.open(f"{repo}/refs/{commit}", 'r') as f:
+                commit = f.read().decode().strip()
+        except OSError:
+            pass # not a branch or tag, or not downloaded; a commit hash is used as is
+        snapshot = f"{repo}/snapshots/{commit}"
+        return read_json(f"{snapshot}/config.json"), read_json(f"{snapshot}/model.safetensors.index.json")
+    finally:
+        sftp.close()
+
+def fetch_model_metadata(model: str, revision: str = None,
+                         timeout: float = 10.0) -> Tuple[Optional[Dict], Optional[Dict], Optional[int]]:
+    """
+    Downloads a model's config.json, its weight index and its parameter count from the HuggingFace Hub.
+    Gated models need a token in the HF_TOKEN environment variable.
+    Returns:
+        (dict, dict, int): The config, the index and the parameter count, each None if unavailable.
+    """
+    import httpx
+
+    token = os.getenv('HF_TOKEN') or os.getenv('HUGGING_FACE_HUB_TOKEN')
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    revision = revision or 'main'
+    with httpx.Client(base_url=HF_URL, headers=headers, timeout=timeout, follow_redirects=True) as client:
+        def get_json(path: str) -> Optional[Dict]:
+            try:
+                response = client.get(path)
+                return response.json() if response.status_code == 200 else None
+            except (httpx.HTTPError, ValueError) as e:
+                logger.debug(f"Failed to fetch {path}: {e}")
+                return None
+
+        config = get_json(f"/{model}/resolve/{revision}/config.json")
+        index = get_json(f"/{model}/resolve/{revision}/model.safetensors.index.json")
+        info = get_json(f"/api/models/{model}/revision/{revision}") or {}
+    params = (info.get('safetensors') or {}).get('total')
+    return config, index, params
+
+def profile_model(rosie_ssh, download_dir: str, model: str, revision: str = None) -> ModelProfile:
+    """
+    Builds a model's profile from the shared download_dir if it has been downloaded before, from the HuggingFace
+    Hub otherwise.
+    Raises:
+        RuntimeError: If the model's config.json can't be found in either.
+    """
+    config, index = read_model_metadata(rosie_ssh, download_dir, model, revision)
+    params = None
+    if config is None:
+        config, index, params = fetch_model_metadata(model, revision)
+    if config is None:
+        raise RuntimeError(f"Couldn't find config.json for {model} in {download_dir} or on the HuggingFace Hub.")
+    return ModelProfile.from_config(model, config, index, params)
@@ -0,0 +1,321 @@
+# Model weight staging for vLLM jobs.
+# This file runs in two places: RosieLLM imports it to prepare a launch, and the sbatch script runs it inside the
+# container (`python RosieStaging.py stage ...`) to copy weights to node-local scratch, so it only uses the
+# standard library at import time.
+import os
+import sys
+import json
+import time
+import errno
+import shutil
+import hashlib
+import argparse
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+STAGING_SCRIPT_DIR = '/data/ai_club/RosieLLM/staging'
+MANIFEST_NAME = 'manifest.json'
+COPY_WORKERS = 8
+COMPLETE_MARKER = '.rosiellm-complete'
+# weights in these formats are skipped when the repo also has safetensors (e.g. Llama's original/*.pth)
+DUPLICATE_WEIGHT_PATTERNS = ['original/*', '*.pth', '*.pt', '*.bin']
+
+def container_fingerprint(stat) -> str:
+    """
+    Identifies a container image by size and modification time, so a rebuilt image isn't trusted
+    on the strength of an earlier check.
+    Args:
+        stat: An os.stat_result or paramiko.SFTPAttributes of the image.
+    """
+    return f"{stat.st_size}-{int(stat.st_mtime)}"
+
+def read_manifest(rosie_ssh, manifest_path: str) -> Dict[str, Any]:
+    """
+    Reads the staging manifest from shared storage.
+    Returns:
+        dict: {"models": {...}, "containers": {...}}, empty if the manifest doesn't exist yet or can't be parsed.
+    """
+    sftp = rosie_ssh.open_sftp()
+    try:
+        with sftp.open(manifest_path, 'r') as f:
+            return _normalize(json.loads(f.read()))
+    except (OSError, ValueError) as e:
+        if not (isinstance(e, OSError) and e.errno == errno.ENOENT):
+            logger.warning(f"Ignoring unreadable staging manifest {manifest_path}: {e}")
+        return _normalize({})
+    finally:
+        sftp.close()
+
+def container_is_known_good(rosie_ssh, manifest: Dict[str, Any], container: str) -> bool:
+    """
+    Whether a job has already confirmed that vllm imports in this exact container image.
+    """
+    entry = manifest['containers'].get(container)
+    if not entry:
+        return False
+    sftp = rosie_ssh.open_sftp()
+    try:
+        return entry.get('fingerprint') == container_fingerprint(sftp.stat(container))
+    except OSError:
+        return False
+    finally:
+        sftp.close()
+
+def upload_staging_script(rosie_ssh, remote_dir: str = STAGING_SCRIPT_DIR) -> str:
+    """
+    Copies this file to Rosie for jobs to run, unless the same version is already there.
+    Returns:
+        str: The remote path of the script.
+    """
+    return upload_script(rosie_ssh, os.path.abspath(__file__), remote_dir)
+
+def upload_script(rosie_ssh, local_path: str, remote_dir: str = STAGING_SCRIPT_DIR) -> str:
+    """
+    Copies a standalone script to Rosie for jobs to run, unless the same version is already there.
+    The remote file name includes a hash of the contents, so jobs still queued keep the version they were submitted with.
+    Returns:
+        str: The remote path of the script.
+    """
+    with open(local_path, 'rb') as f:
+        content = f.read()
+    name = os.path.splitext(os.path.basename(local_path))[0]
+    remote_path = f"{remote_dir}/{name}-{hashlib.sha256(content).hexdigest()[:12]}.py"
+    sftp = rosie_ssh.open_sftp()
+    try:
+        try:
+            sftp.stat(remote_path)
+            return remote_path
+        except OSError:
+            pass
+        rosie_ssh.run_command(f'mkdir -p {remote_dir}')
+        # unique per upload: pool replicas launch from threads of one process, and other machines share the directory
+        partial = f"{remote_path}.{os.urandom(4).hex()}.part"
+        with sftp.open(partial, 'wb') as f:
+            f.write(content)
+        sftp.posix_rename(partial, remote_path)
+    finally:
+        sftp.close()
+    logger.info(f"Uploaded {name} to {remote_path}")
+    return remote_path
+
+def _normalize(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    manifest.setdefault('models', {})
+    manifest.setdefault('containers', {})
+    return manifest
+
+# --- everything below runs inside the job ---
+
+def _log(message: str) -> None:
+    # stdout is reserved for the staged path, the job's output file gets stderr
+    print(message, file=sys.stderr, flush=True)
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on `path` (created if missing). Jobs on different nodes share the
+    manifest, so this relies on the shared filesystem supporting flock; if it doesn't, writes
+    are still atomic and only concurrent updates can be lost.
+    """
+    import fcntl
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        except OSError:
+            pass
+        try:
+            yield
+        finally:
+            try:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            except OSError:
+                pass
+
+def load_manifest(manifest_path: str) -> Dict[str, Any]:
+    try:
+        with open(manifest_path, 'r') as f:
+            return _normalize(json.load(f))
+    except (OSError, ValueError):
+        return _normalize({})
+
+def update_manifest(manifest_path: str, section: str, key: str, entry: Dict[str, Any]) -> None:
+    """
+    Sets manifest[section][key] = entry, atomically and under the manifest lock.
+    """
+    with _locked(f"{manifest_path}.lock"):
+        manifest = load_manifest(manifest_path)
+        manifest[section][key] = entry
+        partial = f"{manifest_path}.{os.getpid()}.part"
+        with open(partial, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(partial, manifest_path)
+
+def _snapshot_files(snapshot: str) -> Dict[str, int]:
+    files = {}
+    for root, _, names in os.walk(snapshot):
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, snapshot)] = os.stat(path).st_size
+    return files
+
+def _entry_is_complete(entry: Dict[str, Any]) -> bool:
+    snapshot = entry.get('path', '')
+    try:
+        return all(os.stat(os.path.join(snapshot, name)).st_size == size for name, size in entry['files'].items())
+    except (OSError, KeyError):
+        return False
+
+def ensure_on_shared_storage(model: str, revision: str, download_dir: str, manifest_path: str) -> Dict[str, Any]:
+    """
+    Returns the manifest entry for a complete copy of the model on shared storage, downloading it first if needed.
+    """
+    key = f"{model}@{revision or 'main'}"
+    entry = load_manifest(manifest_path)['models'].get(key)
+    if entry and _entry_is_complete(entry):
+        _log(f"{key} is complete on shared storage ({entry['bytes'] / 1e9:.1f} GB)")
+        return entry
+
+    from huggingface_hub import snapshot_download
+    _log(f"Downloading {key} to {download_dir}")
+    snapshot = snapshot_download(model, revision=revision, cache_dir=download_dir, ignore_patterns=DUPLICATE_WEIGHT_PATTERNS)
+    if not any(name.endswith('.safetensors') for name in os.listdir(snapshot)):
+        # no safetensors, so the .bin/.pt weights aren't duplicates
+        snapshot = snapshot_download(model, revision=revision, cache_dir=download_dir, ignore_patterns=['original/*'])
+    files = _snapshot_files(snapshot)
+    entry = {
+        'model': model,
+        'revision': revision or 'main',
+        'commit': os.path.basename(os.path.normpath(snapshot)),
+        'path': snapshot,
+        'files': files,
+        'bytes': sum(files.values()),
+        'completed': time.time(),
+    }
+    update_manifest(manifest_path, 'models', key, entry)
+    return entry
+
+def _evict(stage_dir: str, needed: int, keep: str) -> bool:
+    """
+    Removes the least recently staged models from stage_dir until `needed` bytes are free.
+    Returns:
+        bool: True if enough space is free.
+    """
+    def free():
+        return shutil.disk_usage(stage_dir).free
+    if free() >= needed:
+        return True
+    staged = []
+    for name in os.listdir(stage_dir):
+        path = os.path.join(stage_dir, name)
+        if path != keep and os.path.isdir(path):
+            marker = os.path.join(path, COMPLETE_MARKER)
+            staged.append((os.path.getmtime(marker) if os.path.exists(marker) else 0, path))
+    for _, path in sorted(staged):
+        _log(f"Evicting {path} from node-local storage")
+        shutil.rmtree(path, ignore_errors=True)
+        if free() >= needed:
+            return True
+    return free() >= needed
+
+def copy_to_local(entry: Dict[str, Any], stage_dir: str, workers: int = COPY_WORKERS) -> str:
+    """
+    Copies a model's files from shared storage to node-local scratch, several files at a time.
+    Files already staged with the right size are kept, so reruns on the same node only copy what's missing.
+    Returns:
+        str: The local directory, or the shared snapshot if there isn't enough local space.
+    """
+    local = os.path.join(stage_dir, entry['commit'])
+    marker = os.path.join(local, COMPLETE_MARKER)
+    os.makedirs(local, exist_ok=True)
+    with _locked(os.path.join(stage_dir, f".{entry['commit']}.lock")):
+        if os.path.exists(marker):
+            os.utime(marker)
+            _log(f"Model weights already staged in {local}")
+            return local
+
+        missing = {}
+        for name, size in entry['files'].items():
+            dst = os.path.join(local, name)
+            if not (os.path.exists(dst) and os.path.getsize(dst) == size):
+                missing[name] = size
+        total = sum(missing.values())
+        if not _evict(stage_dir, int(total * 1.05), keep=local):
+            _log(f"Not enough node-local space to stage {total / 1e9:.1f} GB, loading from shared storage")
+            return entry['path']
+
+        def copy(name: str) -> int:
+            dst = os.path.join(local, name)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copyfile(os.path.join(entry['path'], name), f"{dst}.part")
+            os.replace(f"{dst}.part", dst)
+            return missing[name]
+
+        start = time.time()
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(copy, name) for name in sorted(missing, key=missing.get, reverse=True)]
+            for i, future in enumerate(as_completed(futures), 1):
+                done += future.result()
+                _log(f"Staging model weights: {int(100 * done / total) if total else 100}% ({i}/{len(futures)} files)")
+        elapsed = time.time() - start
+        _log(f"Staged {total / 1e9:.1f} GB to {local} in {elapsed:.1f}s")
+        open(marker, 'w').close()
+    return local
+
+def stage(model: str, revision: str, download_dir: str, stage_dir: str, manifest_path: str, workers: int = COPY_WORKERS) -> str:
+    """
+    Makes sure the model is complete on shared storage and copies it to node-local scratch.
+    Returns:
+        str: The path vLLM should load the model from.
+    """
+    if os.path.isdir(model):
+        return model
+    entry = ensure_on_shared_storage(model, revision, download_dir, manifest_path)
+    if not stage_dir:
+        return entry['path']
+    return copy_to_local(entry, stage_dir, workers)
+
+def record_container(container: str, manifest_path: str) -> None:
+    """
+    Records that vllm imports in the container image without any user-installed packages.
+    """
+    import vllm
+    update_manifest(manifest_path, 'containers', container, {
+        'fingerprint': container_fingerprint(os.stat(container)),
+        'vllm': getattr(vllm, '__version__', None),
+        'recorded': time.time(),
+    })
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Stage model weights for a RosieLLM job.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    stage_parser = commands.add_parser('stage', help='Print the path to load the model from, staging it first.')
+    stage_parser.add_argument('--model', required=True)
+    stage_parser.add_argument('--revision')
+    stage_parser.add_argument('--download-dir', required=True)
+    stage_parser.add_argument('--stage-dir')
+    stage_parser.add_argument('--manifest', required=True)
+    stage_parser.add_argument('--workers', type=int, default=COPY_WORKERS)
+    container_parser = commands.add_parser('record-container', help='Record the container image as known-good.')
+    container_parser.add_argument('--container', required=True)
+    container_parser.add_argument('--manifest', required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'record-container':
+        record_container(args.container, args.manifest)
+        return 0
+    try:
+        path = stage(args.model, args.revision, args.download_dir, args.stage_dir, args.manifest, args.workers)
+    except Exception as e:
+        # vLLM can still download/load the model itself
+        _log(f"Staging failed, vLLM will load {args.model} directly: {e!r}")
+        return 1
+    print(path)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
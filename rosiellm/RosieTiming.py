@@ -0,0 +1,133 @@
+import time
+import logging
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# launch milestones in the order they happen, used to turn milestone timestamps into phase durations
+LAUNCH_MILESTONES = (
+    'submitted',            # sbatch accepted the job
+    'scheduled',            # the job left PENDING
+    'running',              # the job is RUNNING on a node
+    'job_started',          # the sbatch script started on the node
+    'container_ready',      # python/vllm is available inside the container
+    'weights_loaded',       # vLLM finished loading the model
+    'server_started',       # Uvicorn is serving
+    'healthy',              # /health answered 200 through the proxy
+)
+MILESTONE_PHASES = {
+    'scheduled': 'queue_wait',
+    'running': 'node_assignment',
+    'job_started': 'job_start',
+    'container_ready': 'container_start',
+    'weights_loaded': 'model_load',
+    'server_started': 'server_start',
+    'healthy': 'first_healthy',
+}
+
+class LaunchTimer:
+    """
+    Records how long each phase of a launch takes.
+    Client-side steps (SSH connect, key derivation, SFTP upload, ...) are timed directly with phase(),
+    while remote progress is recorded as milestones with mark(); the time between consecutive
+    milestones becomes a phase of its own (e.g. submitted -> scheduled is "queue_wait").
+    """
+    def __init__(self, metrics_hook: Callable[[str, float], None] = None):
+        """
+        Initialize the timer.
+        Args:
+            metrics_hook (Callable[[str, float], None], optional): Called with (phase name, seconds)
+                every time a phase completes, e.g. to forward timings to a metrics system.
+        """
+        self.metrics_hook = metrics_hook
+        self.start = time.time()
+        self.phases: Dict[str, float] = {}
+        self.milestones: Dict[str, float] = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times the enclosed block as the named phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Records the duration of a phase. Repeated phases are summed.
+        """
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        logger.debug(f"{name} took {seconds:.3f}s")
+        self._emit(name, seconds)
+
+    def mark(self, milestone: str, timestamp: float = None) -> None:
+        """
+        Records when a milestone was reached. Only the first occurrence of each milestone counts.
+        Args:
+            milestone (str): The milestone, usually one of LAUNCH_MILESTONES.
+            timestamp (float, optional): When it was reached (time.time()). Defaults to now.
+        """
+        timestamp = timestamp or time.time()
+        with self._lock:
+            if milestone in self.milestones:
+                return
+            self.milestones[milestone] = timestamp
+            previous = self._previous_milestone(milestone)
+        phase = MILESTONE_PHASES.get(milestone)
+        if phase and previous is not None:
+            self._emit(phase, timestamp - previous)
+
+    def report(self) -> Dict[str, object]:
+        """
+        Returns the timings recorded so far.
+        Returns:
+            dict: "phases" maps phase names to seconds (client-side phases first, then the phases between
+                milestones), "milestones" maps milestones to seconds since the timer started, and "total"
+                is the time from the start to the last milestone.
+        """
+        with self._lock:
+            phases = dict(self.phases)
+            for milestone, phase in MILESTONE_PHASES.items():
+                previous = self._previous_milestone(milestone)
+                if milestone in self.milestones and previous is not None:
+                    phases[phase] = self.milestones[milestone] - previous
+            milestones = {m: t - self.start for m, t in sorted(self.milestones.items(), key=lambda item: item[1])}
+        return {
+            'phases': phases,
+            'milestones': milestones,
+            'total': max(milestones.values()) if milestones else time.time() - self.start,
+        }
+
+    def summary(self) -> str:
+        """
+        Formats the report as a table of phases.
+        """
+        report = self.report()
+        width = max([len(name) for name in report['phases']] + [5])
+        lines = [f"{name:<{width}}  {seconds:8.3f}s" for name, seconds in report['phases'].items()]
+        lines.append(f"{'total':<{width}}  {report['total']:8.3f}s")
+        return '\n'.join(lines)
+
+    def _previous_milestone(self, milestone: str) -> Optional[float]:
+        # the latest milestone recorded before this one, in launch order
+        if milestone not in LAUNCH_MILESTONES:
+            return None
+        for earlier in reversed(LAUNCH_MILESTONES[:LAUNCH_MILESTONES.index(milestone)]):
+            if earlier in self.milestones:
+                return self.milestones[earlier]
+        return None
+
+    def _emit(self, name: str, seconds: float) -> None:
+        if not self.metrics_hook:
+            return
+        try:
+            self.metrics_hook(name, seconds)
+        except Exception as e:
+            logger.warning(f"Metrics hook raised an error: {e}")
@@ -1 +1,54 @@
-from .RosieLLM import RosieLLM
\ No newline at end of file
+"""
+RosieLLM: language models served with vLLM on Rosie, used like an OpenAI client.
+
+    from rosiellm import RosieLLM
+
+The public classes are imported on first use, so `import rosiellm` (and the `rosiellm` command, and worker processes
+that only need configuration or cached results) doesn't pay for SSH, encryption and the OpenAI client up front.
+"""
+import sys
+import types
+import importlib
+from typing import TYPE_CHECKING
+
+# public name -> the module that defines it
+_EXPORTS = {
+    'RosieLLM': 'rosiellm.RosieLLM',
+    'RosieLLMPool': 'rosiellm.RosiePool',
+    'HTTPConfig': 'rosiellm.RosieHTTP',
+    'VLLMOptions': 'rosiellm.RosiePresets',
+    'ResponseCache': 'rosiellm.RosieCache',
+    'Gateway': 'rosiellm.RosieGateway',
+    'OfflineBatch': 'rosiellm.RosieOffline',
+}
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from rosiellm.RosieLLM import RosieLLM
+    from rosiellm.RosiePool import RosieLLMPool
+    from rosiellm.RosieHTTP import HTTPConfig
+    from rosiellm.RosiePresets import VLLMOptions
+    from rosiellm.RosieCache import ResponseCache
+    from rosiellm.RosieGateway import Gateway
+    from rosiellm.RosieOffline import OfflineBatch
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'rosiellm' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+class _Package(types.ModuleType):
+    # importing a submodule binds it on the package, which would hide the class of the same name
+    # (rosiellm.RosieLLM the module vs. the class); the class wins, the module stays in sys.modules
+    def __setattr__(self, name, value):
+        if name in _EXPORTS and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,5 @@
+import sys
+
+from rosiellm.RosieCLI import main
+
+sys.exit(main())
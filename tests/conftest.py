@@ -0,0 +1,54 @@
+"""
+Fixtures shared by the tests: a local fake of Rosie (rosiellm.RosieMock) with a mock vLLM server behind it.
+"""
+import importlib
+
+import pytest
+
+from rosiellm.RosieMock import MockVLLMServer, FakeRosieCluster
+from rosiellm.RosiePoller import JobPoller
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('ROSIELLM_STATE_DIR', str(tmp_path))
+    monkeypatch.setattr('rosiellm.RosieSession.STATE_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def cluster(state_dir, monkeypatch):
+    vllm = MockVLLMServer(healthy=False).start()
+    monkeypatch.setattr(importlib.import_module('rosiellm.RosieLLM'), 'ROSIE_WEB_URL', vllm.url)
+    # each fake cluster numbers its jobs from 1000, so a poller left from another test would see stale states
+    monkeypatch.setattr(JobPoller, '_shared', {})
+    fake = FakeRosieCluster(vllm=vllm, queue_delay=0.1, container_delay=0.05, model_load_delay=0.05,
+                            cuda_graph_delay=0.05, server_start_delay=0.05).start()
+    yield fake
+    for poller in JobPoller._shared.values():
+        poller.stop()
+    fake.stop()
+    vllm.stop()
+
+
+@pytest.fixture
+def launch(cluster):
+    """
+    Launches RosieLLMs on the fake cluster and waits until they are ready. They are closed after the test.
+    """
+    from rosiellm import RosieLLM
+    from rosiellm.RosieSSH import RosieSSH, RosieAuth
+
+    llms = []
+
+    def _launch(**kwargs):
+        ssh = RosieSSH(cluster.username, cluster.address, rosie_auth=RosieAuth(cluster.username, cluster.password))
+        ssh.connect()
+        llm = RosieLLM(rosie_ssh=ssh, monitor_health=False, **kwargs)
+        llms.append(llm)
+        assert llm.wait_until_ready(poll_interval=0.1, timeout=20)
+        return llm
+
+    yield _launch
+    for llm in llms:
+        llm.close()
@@ -0,0 +1,111 @@
+"""
+Tests for the pool autoscaler's decisions (rosiellm.RosieAutoscale.Autoscaler.step), against a stand-in pool.
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from rosiellm.RosieAutoscale import Autoscaler
+
+
+class FakePool:
+    """
+    The signals and actions of a RosieLLMPool that the autoscaler uses.
+    """
+    def __init__(self, running=1, loading=0, latencies=(), in_flight=0, idle=0.0):
+        self.replicas = [self.replica(f'job-{i}', True) for i in range(running)]
+        self.replicas += [self.replica(f'job-{running + i}', False) for i in range(loading)]
+        self.launching = 0
+        self.latencies = list(latencies)
+        self.requests = in_flight
+        self.idle = idle
+        self.added = threading.Event()
+        self.removed = []
+
+    @staticmethod
+    def replica(name, running):
+        return SimpleNamespace(isRunning=running, manager=SimpleNamespace(job_name=name))
+
+    @property
+    def in_flight(self):
+        return [self.requests] + [0] * (len(self.replicas) - 1)
+
+    def running_replicas(self):
+        return [r for r in self.replicas if r.isRunning]
+
+    def recent_latencies(self, window):
+        return self.latencies
+
+    def idle_seconds(self, replica):
+        return self.idle
+
+    def add_replica(self):
+        self.added.set()
+
+    def remove_replica(self, replica):
+        self.removed.append(replica)
+
+
+def test_replicas_are_kept_warm():
+    pool = FakePool(running=1)
+    assert Autoscaler(pool, min_replicas=2).step() == 'scale_up'
+    assert pool.added.wait(1)
+
+
+def test_scales_up_on_queueing_delay():
+    # the fastest tenth of requests took 1s, the median 4s: 3s of queueing
+    pool = FakePool(running=1, latencies=[1.0] * 5 + [4.0] * 10)
+    autoscaler = Autoscaler(pool, queue_delay_threshold=2.0)
+    assert autoscaler.queue_delay() == pytest.approx(3.0)
+    assert autoscaler.step() == 'scale_up'
+    # a delay below the threshold is left alone
+    pool.latencies = [1.0] * 5 + [2.5] * 10
+    assert Autoscaler(pool, queue_delay_threshold=2.0).step() is None
+
+
+def test_baseline_is_the_lowest_floor_seen():
+    pool = FakePool(latencies=[1.0, 1.0])
+    autoscaler = Autoscaler(pool)
+    autoscaler.queue_delay()
+    # under sustained load every request queues, the uncongested latency from before still applies
+    pool.latencies = [5.0, 5.0]
+    assert autoscaler.queue_delay() == pytest.approx(4.0)
+    assert autoscaler.baseline == 1.0
+
+
+def test_scales_up_on_requests_in_flight():
+    assert Autoscaler(FakePool(running=2, in_flight=65), max_in_flight=32).step() == 'scale_up'
+    assert Autoscaler(FakePool(running=2, in_flight=64), max_in_flight=32).step() is None
+
+
+def test_no_scale_up_while_a_replica_is_loading_or_at_the_limit():
+    busy = dict(latencies=[1.0] * 5 + [10.0] * 10, in_flight=1000)
+    assert Autoscaler(FakePool(running=1, loading=1, **busy)).step() is None
+    pool = FakePool(running=1, **busy)
+    pool.launching = 1
+    assert Autoscaler(pool).step() is None
+    assert Autoscaler(FakePool(running=4, **busy), max_replicas=4).step() is None
+
+
+def test_idle_replicas_are_cancelled_down_to_the_minimum():
+    pool = FakePool(running=2, idle=3600.0)
+    autoscaler = Autoscaler(pool, min_replicas=1, idle_timeout=0.1)
+    # idle for an hour by the pool's count, but only just seen running
+    assert autoscaler.step() is None
+    time.sleep(0.15)
+    assert autoscaler.step() == 'scale_down'
+    deadline = time.time() + 1
+    while not pool.removed and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(pool.removed) == 1
+    pool.replicas.remove(pool.removed[0])
+    assert autoscaler.step() is None
+
+
+def test_replica_bounds_are_checked():
+    with pytest.raises(ValueError):
+        Autoscaler(FakePool(), min_replicas=3, max_replicas=2)
+    with pytest.raises(ValueError):
+        Autoscaler(FakePool(), min_replicas=0)
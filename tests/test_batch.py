@@ -0,0 +1,115 @@
+"""
+Tests for RosieLLM.batch() and the batch runner in rosiellm.RosieBatch.
+"""
+import time
+import asyncio
+import threading
+
+import pytest
+
+from rosiellm.RosieBatch import run_batch, iterate_in_thread, load_checkpoint
+
+
+def completion(index: int) -> dict:
+    return {'id': f'chatcmpl-{index}', 'object': 'chat.completion', 'created': 0, 'model': 'm',
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': str(index)}}]}
+
+
+class FakeClient:
+    """
+    Answers chat.completions.create with the request's "i", after "delay" seconds if set.
+    """
+    def __init__(self):
+        self.chat = self.completions = self
+        self.sent = []
+
+    async def create(self, **request):
+        from openai.types.chat import ChatCompletion
+
+        self.sent.append(request['i'])
+        await asyncio.sleep(request.get('delay', 0))
+        return ChatCompletion.model_validate(completion(request['i']))
+
+    async def close(self):
+        pass
+
+
+def collect(iterator):
+    async def drain():
+        return [result async for result in iterator]
+    return asyncio.run(drain())
+
+
+def test_ordered_results_follow_the_requests():
+    requests = [{'i': i, 'delay': 0.01 * (5 - i)} for i in range(5)]
+    results = collect(run_batch(FakeClient(), requests, max_concurrency=5, ordered=True))
+    assert [r.index for r in results] == list(range(5))
+    assert [r.response.choices[0].message.content for r in results] == ['0', '1', '2', '3', '4']
+
+
+def test_checkpoint_resume_skips_finished_requests(tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.jsonl')
+    collect(run_batch(FakeClient(), [{'i': i} for i in range(3)], checkpoint=checkpoint))
+    with open(checkpoint, 'a') as f:
+        f.write('{"index": 3, "resp') # interrupted mid-write
+    assert sorted(load_checkpoint(checkpoint)) == [0, 1, 2]
+
+    client = FakeClient()
+    results = collect(run_batch(client, [{'i': i} for i in range(5)], checkpoint=checkpoint))
+    assert sorted(client.sent) == [3, 4]
+    assert sorted(r.index for r in results) == list(range(5))
+    assert sum(1 for r in results if r.attempts == 0) == 3
+
+
+def test_non_transient_errors_are_not_retried():
+    class Failing(FakeClient):
+        async def create(self, **request):
+            self.sent.append(request['i'])
+            raise ValueError('bad request')
+
+    client = Failing()
+    [result] = collect(run_batch(client, [{'i': 0}], max_retries=3))
+    assert not result.ok and result.attempts == 1 and client.sent == [0]
+
+
+def test_iterate_in_thread_applies_backpressure():
+    produced = []
+
+    async def numbers(client):
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    iterator = iterate_in_thread(numbers, FakeClient, max_buffered=4)
+    assert next(iterator) == 0
+    time.sleep(0.3)
+    # the buffer, the item being offered and the one handed out, not the whole sequence
+    assert len(produced) <= 7
+    assert list(iterator) == list(range(1, 100))
+
+
+def test_iterate_in_thread_stops_when_the_caller_does():
+    async def numbers(client):
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    before = threading.active_count()
+    iterator = iterate_in_thread(numbers, FakeClient, max_buffered=2)
+    assert next(iterator) == 0
+    iterator.close()
+    deadline = time.time() + 2
+    while threading.active_count() > before and time.time() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() <= before
+
+
+@pytest.mark.parametrize('max_retries', [0, 1])
+def test_batch_sends_a_failing_request_max_retries_plus_one_times(launch, cluster, max_retries):
+    llm = launch()
+    cluster.vllm.healthy = False
+    [result] = list(llm.batch([{'messages': [], 'max_tokens': 1}], max_retries=max_retries))
+    assert not result.ok and result.attempts == max_retries + 1
+    # the openai client doesn't retry on its own as well
+    assert cluster.vllm.requests_rejected == max_retries + 1
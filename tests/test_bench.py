@@ -0,0 +1,86 @@
+"""
+Tests for the load-testing benchmark (rosiellm.RosieBench and `rosiellm bench`), against the mock vLLM server.
+"""
+import asyncio
+import json
+import random
+
+import pytest
+from openai import AsyncOpenAI
+
+from rosiellm.RosieBench import BenchConfig, BenchReport, LengthDistribution, RequestResult, run_benchmark
+from rosiellm.RosieMock import MockVLLMServer
+
+
+@pytest.mark.parametrize('spec, kind, a, b', [
+    ('128', 'fixed', 128, 0),
+    ('uniform:10:20', 'uniform', 10, 20),
+    ('normal:100:15.5', 'normal', 100, 15.5),
+])
+def test_length_distributions(spec, kind, a, b):
+    dist = LengthDistribution.parse(spec)
+    assert (dist.kind, dist.a, dist.b) == (kind, a, b) and str(dist) == spec
+
+
+@pytest.mark.parametrize('spec', ['', 'x', 'uniform:20:10', 'uniform:10', 'normal:a:b', 'poisson:3:1'])
+def test_invalid_length_distributions(spec):
+    with pytest.raises(ValueError, match='length distribution'):
+        LengthDistribution.parse(spec)
+
+
+def test_samples_are_whole_and_positive():
+    rng = random.Random(0)
+    samples = [LengthDistribution.parse('uniform:10:20').sample(rng) for _ in range(200)]
+    assert min(samples) >= 10 and max(samples) <= 20 and all(isinstance(s, int) for s in samples)
+    assert min(LengthDistribution.parse('normal:1:50').sample(rng) for _ in range(200)) == 1
+
+
+def test_config_validation():
+    assert BenchConfig().requests == 100
+    assert BenchConfig(duration=5).requests is None
+    for kwargs in ({'concurrency': 0}, {'rate': 0}, {'output_tokens': 'uniform:5:1'}):
+        with pytest.raises(ValueError):
+            BenchConfig(**kwargs)
+
+
+def test_report_summary():
+    results = [RequestResult(0.0, 1.0, ttft=0.2, prompt_tokens=10, completion_tokens=5),
+               RequestResult(0.5, 1.5, ttft=0.4, prompt_tokens=10, completion_tokens=1),
+               RequestResult(1.0, 1.2, error='APIConnectionError: refused'),
+               RequestResult(1.1, 1.3, error='APIConnectionError: refused')]
+    assert results[0].tpot == pytest.approx(0.2) and results[1].tpot is None
+    report = BenchReport(BenchConfig(), 'test', 2.0, results)
+    summary = report.summary()
+    assert (summary['completed'], summary['failed'], summary['errors']) == (2, 2, {'APIConnectionError: refused': 2})
+    assert (summary['output_token_throughput'], summary['total_token_throughput']) == (3.0, 13.0)
+    assert summary['ttft']['p50'] == pytest.approx(0.3) and summary['tpot']['count'] == 1
+    assert 'Error (2x):' in str(report) and json.dumps(report.to_dict())
+
+
+def test_benchmark_measures_the_server():
+    with MockVLLMServer(ttft=0.05, inter_token_latency=0.01) as mock:
+        async def run():
+            client = AsyncOpenAI(base_url=f"{mock.url}/v1", api_key='None')
+            try:
+                return await run_benchmark(client, BenchConfig(concurrency=2, requests=6, output_tokens='5'))
+            finally:
+                await client.close()
+
+        report = asyncio.run(run())
+    summary = report.summary()
+    assert (summary['completed'], summary['completion_tokens']) == (6, 30)
+    assert summary['ttft']['p50'] >= 0.05 and summary['tpot']['p50'] >= 0.009
+    # two at a time, each taking at least 0.09s
+    assert report.duration >= 3 * 0.09
+    assert sum(1 for r in report.results if r.start < report.results[0].end) <= 2
+
+
+def test_bench_writes_json(tmp_path, capsys):
+    from rosiellm.RosieCLI import main
+
+    path = tmp_path / 'report.json'
+    assert main(['bench', '--mock', '--requests', '3', '--output-tokens', '2', '--json', str(path)]) == 0
+    data = json.loads(path.read_text())
+    assert data['summary']['completed'] == 3 and data['config']['output_tokens'] == '2'
+    assert main(['bench', '--mock', '--prompt-tokens', 'uniform:9:1']) == 2
+    assert 'Invalid length distribution' in capsys.readouterr().out
@@ -0,0 +1,114 @@
+"""
+Tests for the response cache (rosiellm.RosieCache).
+"""
+import os
+import stat
+import time
+
+from rosiellm.RosieCache import ResponseCache, cache_key, assemble_completion, replay_stream
+
+
+def completion(content: str = 'hi', usage: dict = None) -> dict:
+    return {'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 0, 'model': 'm',
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'logprobs': None,
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': usage}
+
+
+def test_cache_key_only_covers_deterministic_requests():
+    request = {'model': 'm', 'messages': [{'role': 'user', 'content': 'x'}], 'temperature': 0}
+    assert cache_key({**request, 'temperature': 0.7}) is None
+    assert cache_key({**request, 'temperature': 0.7, 'seed': 1}) is not None
+    # argument order and how the response is delivered don't matter, the content does
+    assert cache_key(request) == cache_key({'temperature': 0, **request, 'stream': True, 'user': 'u', 'top_p': None})
+    assert cache_key(request) != cache_key({**request, 'max_tokens': 5})
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ResponseCache(path, max_memory_entries=1)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    cache.put('a', completion('a'))
+    cache.put('b', completion('b'))
+    assert cache.get('b')['choices'][0]['message']['content'] == 'b'
+    assert cache.get('a')['choices'][0]['message']['content'] == 'a'
+    assert cache.get('c') is None
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses']) == (1, 1, 1)
+    cache.close()
+    assert ResponseCache(path).get('a') is not None
+
+
+def test_entries_expire(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=0.05)
+    cache.put('a', completion())
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.stats()['disk_bytes'] == cache._disk_bytes == 0
+
+
+def test_eviction_keeps_a_running_total(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ResponseCache(path, max_memory_entries=0, max_disk_bytes=1000)
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    for i in range(20):
+        cache.put(str(i), completion(str(i) * 50))
+        cache.get('0') # recently used, so it outlives the others
+    # puts never sum the whole table
+    assert not [s for s in statements if 'SUM(size)' in s]
+    stats = cache.stats()
+    assert stats['disk_bytes'] == cache._disk_bytes <= 1000 and stats['evictions'] > 0
+    assert cache.get('0') is not None and cache.get('1') is None
+
+    cache.put('0', completion('short'))
+    assert cache.stats()['disk_bytes'] == cache._disk_bytes
+    total = cache._disk_bytes
+    cache.close()
+    assert ResponseCache(path)._disk_bytes == total
+    cache = ResponseCache(path)
+    cache.clear()
+    assert cache._disk_bytes == 0
+
+
+def chunks_of(completion_dict, include_usage=False):
+    return list(replay_stream(completion_dict, include_usage))
+
+
+def test_replay_round_trips_tool_calls_and_usage():
+    usage = {'prompt_tokens': 3, 'completion_tokens': 2, 'total_tokens': 5}
+    original = completion(None, usage)
+    original['choices'][0]['finish_reason'] = 'tool_calls'
+    original['choices'][0]['message']['tool_calls'] = [
+        {'id': 'call_1', 'type': 'function', 'function': {'name': 'add', 'arguments': '{"a": 1}'}}]
+    chunks = chunks_of(original, include_usage=True)
+    assert chunks[-1].choices == [] and chunks[-1].usage.total_tokens == 5
+    rebuilt = assemble_completion(chunks)
+    assert rebuilt['choices'][0]['message'] == original['choices'][0]['message'] | {'role': 'assistant'}
+    assert {k: v for k, v in rebuilt['usage'].items() if v is not None} == usage
+    # without include_usage, no usage chunk, as from a live stream
+    assert all(chunk.choices for chunk in chunks_of(original))
+
+
+def test_incomplete_streams_are_not_assembled():
+    chunks = chunks_of(completion('hi'))
+    assert assemble_completion(chunks[:1]) is None
+    assert assemble_completion([]) is None
+
+
+def test_cached_stream_replays_usage(launch, cluster, state_dir):
+    llm = launch(cache=str(state_dir / 'cache.sqlite'))
+    request = {'model': llm.model, 'messages': [], 'max_tokens': 3, 'temperature': 0, 'stream': True}
+
+    def usage_of(**extra):
+        with llm.chat.completions.create(**request, **extra) as stream:
+            return [chunk.usage.total_tokens for chunk in stream if chunk.usage]
+
+    # recorded without usage, so a request for usage goes to the server and records it
+    assert usage_of() == []
+    served = cluster.vllm.requests_served
+    assert usage_of(stream_options={'include_usage': True}) == [3]
+    assert cluster.vllm.requests_served == served + 1
+    # now a hit, with the same trailing usage chunk as the live stream
+    assert usage_of(stream_options={'include_usage': True}) == [3]
+    assert cluster.vllm.requests_served == served + 1
@@ -0,0 +1,90 @@
+"""
+Tests for launching from async code (RosieLLM.create() and ready()) on the fake cluster.
+"""
+import asyncio
+import time
+
+import pytest
+
+from rosiellm import RosieLLM
+from rosiellm.RosieSSH import RosieSSH, RosieAuth
+
+
+@pytest.fixture
+def create(cluster):
+    """
+    Connects to the fake cluster and returns a RosieLLM.create() coroutine. The RosieLLMs are closed after the test.
+    """
+    llms = []
+
+    def _create(**kwargs):
+        ssh = RosieSSH(cluster.username, cluster.address, rosie_auth=RosieAuth(cluster.username, cluster.password))
+        ssh.connect()
+
+        async def created():
+            llm = await RosieLLM.create(rosie_ssh=ssh, monitor_health=False, **kwargs)
+            llms.append(llm)
+            return llm
+        return created()
+
+    yield _create
+    for llm in llms:
+        llm.close()
+
+
+def test_launches_run_in_the_background(create, cluster):
+    cluster.delays['queue'] = 1.0
+    ticks = []
+
+    async def heartbeat():
+        while True:
+            ticks.append(time.time())
+            await asyncio.sleep(0.05)
+
+    async def main():
+        launches = [create(job_name='chat'), create(job_name='judge')]
+        beat = asyncio.create_task(heartbeat())
+        start = time.time()
+        chat, judge = await asyncio.gather(*launches)
+        # returned once connected, while the jobs wait in the queue
+        created = time.time() - start
+        states = {chat.launch_state, judge.launch_state}
+        await asyncio.gather(chat.ready(poll_interval=0.1, timeout=20), judge.ready(poll_interval=0.1, timeout=20))
+        beat.cancel()
+        return chat, judge, created, states
+
+    chat, judge, created, states = asyncio.run(main())
+    assert created < 1.0 and states <= {'submitting', 'queued'}
+    assert chat.launch_state == judge.launch_state == 'ready' and chat.manager.job_id != judge.manager.job_id
+    # the event loop kept running throughout
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.5
+    assert chat.chat.completions.create(model=chat.model, messages=[], max_tokens=1).choices
+
+
+def test_ready_times_out_in_the_queue(create, cluster):
+    cluster.delays['queue'] = 30
+
+    async def main():
+        llm = await create()
+        with pytest.raises(TimeoutError, match='launch state: (submitting|queued)'):
+            await llm.ready(poll_interval=0.1, timeout=0.5)
+        return llm
+
+    llm = asyncio.run(main())
+    llm.manager.cancel_vllm_server()
+
+
+def test_ready_reports_a_failed_launch(create, cluster):
+    cluster.delays['queue'] = 30
+
+    async def main():
+        llm = await create()
+        while not llm.manager.job_id:
+            await asyncio.sleep(0.05)
+        # the job is cancelled before it leaves the queue
+        await asyncio.to_thread(llm.rosie_ssh.execute_instance_command, f'scancel {llm.manager.job_id}')
+        with pytest.raises(RuntimeError, match='failed to launch'):
+            await llm.ready(poll_interval=0.1, timeout=20)
+        assert llm.launch_state == 'failed'
+
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Tests for the bulk embedding pipeline (rosiellm.RosieEmbed and RosieLLM.embed_corpus), against the mock server.
+"""
+import json
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from rosiellm.RosieEmbed import chunk_text, count_documents, open_output, progress_path, read_documents
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_chunks_split_at_whitespace():
+    text = ' '.join(f'word{i}' for i in range(100))
+    chunks = chunk_text(text, max_tokens=10)
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert ' '.join(chunks) == text and not any(chunk.startswith(' ') for chunk in chunks)
+    assert chunk_text('short', 10) == ['short']
+    # without whitespace, the text is cut at the limit
+    assert chunk_text('x' * 100, 10) == ['x' * 40, 'x' * 40, 'x' * 20]
+
+
+def test_documents_are_streamed(tmp_path):
+    jsonl = tmp_path / 'corpus.jsonl'
+    jsonl.write_text(''.join(json.dumps({'id': i, 'body': f'doc {i}'}) + '\n' for i in range(3)))
+    assert list(read_documents(str(jsonl), text_field='body')) == ['doc 0', 'doc 1', 'doc 2']
+    assert count_documents(str(jsonl)) == 3
+    text = tmp_path / 'corpus.txt'
+    text.write_text('a\nb\n')
+    assert list(read_documents(text)) == ['a', 'b']
+    assert count_documents(['a', 'b', 'c']) == 3 and count_documents(iter(['a'])) is None
+
+
+def test_resuming_checks_the_output(tmp_path):
+    path = str(tmp_path / 'vectors.npy')
+    vectors, done = open_output(path, rows=4, dim=8, model='m')
+    done[1] = 1
+    done.flush()
+    vectors, done = open_output(path, rows=4, dim=8, model='m')
+    assert list(done) == [0, 1, 0, 0]
+    with pytest.raises(ValueError):
+        open_output(path, rows=5, dim=8, model='m')
+    with pytest.raises(ValueError):
+        open_output(path, rows=4, dim=8, model='other')
+    # without resuming, the file is started over
+    vectors, done = open_output(path, rows=5, dim=8, model='other', resume=False)
+    assert vectors.shape == (5, 8) and not done.any()
+
+
+def test_embed_corpus_resumes(launch, cluster, tmp_path):
+    llm = launch(task='embed')
+    documents = [f'document number {i}' for i in range(50)]
+    path = str(tmp_path / 'vectors.npy')
+    run = llm.embed_corpus(documents, path, batch_tokens=64, max_concurrency=4)
+    assert (run.rows, run.dim, run.embedded, run.skipped, run.failed) == (50, cluster.vllm.embedding_dim, 50, 0, 0)
+    expected = np.stack([unit(cluster.vllm.embed_text(text)) for text in documents])
+    np.testing.assert_allclose(run.vectors, expected, rtol=1e-5)
+
+    # as if the run had been interrupted with the last 20 rows unwritten
+    done = np.lib.format.open_memmap(progress_path(path), mode='r+')
+    done[30:] = 0
+    done.flush()
+    del done
+    served = cluster.vllm.requests_served
+    run = llm.embed_corpus(documents, path, batch_tokens=64, max_concurrency=4)
+    assert (run.embedded, run.skipped) == (20, 30)
+    # the remaining rows and the dimension probe were all that was sent
+    assert cluster.vllm.requests_served - served <= 1 + 20
+    np.testing.assert_allclose(run.vectors, expected, rtol=1e-5)
+
+
+def test_long_documents_average_their_chunks(launch, cluster, tmp_path):
+    llm = launch(task='embed')
+    document = ' '.join(f'word{i}' for i in range(60))
+    run = llm.embed_corpus([document], str(tmp_path / 'vectors.npy'), chunk_tokens=20)
+    chunks = chunk_text(document, 20)
+    assert len(chunks) > 1
+    weights = [len(chunk) // 4 + 1 for chunk in chunks]
+    average = sum(w * np.asarray(cluster.vllm.embed_text(c), dtype=np.float32) for w, c in zip(weights, chunks))
+    np.testing.assert_allclose(run.vectors[0], unit(average), rtol=1e-5)
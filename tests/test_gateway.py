@@ -0,0 +1,114 @@
+"""
+Tests for the local OpenAI-compatible gateway (rosiellm.RosieGateway), in front of a job on the fake cluster.
+"""
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import openai
+import pytest
+
+from rosiellm.RosieGateway import Gateway
+
+
+class OneReplicaPool:
+    """
+    The part of RosieLLMPool the gateway uses, over a single job, recording each acquire() and release().
+    """
+    def __init__(self, llm):
+        self.replicas = [llm]
+        self.acquired = 0
+        self.released = []
+
+    def acquire(self, exclude=None):
+        self.acquired += 1
+        return self.replicas[0]
+
+    def release(self, replica, latency=None):
+        self.released.append(latency)
+
+
+@pytest.fixture
+def serve():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    gateways = []
+
+    def _serve(backend, **kwargs):
+        gateway = Gateway(backend, port=0, **kwargs)
+        asyncio.run_coroutine_threadsafe(gateway.start(), loop).result(5)
+        gateways.append(gateway)
+        return gateway
+
+    yield _serve
+    for gateway in gateways:
+        asyncio.run_coroutine_threadsafe(gateway.stop(), loop).result(5)
+    asyncio.run_coroutine_threadsafe(close_connections(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+async def close_connections():
+    # keep-alive connections outlive the server, waiting for their client's next request
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def test_requests_and_streams_are_forwarded(launch, cluster, serve):
+    llm = launch()
+    gateway = serve(llm, api_key='k')
+    client = openai.OpenAI(api_key='k', base_url=gateway.url, max_retries=0)
+    request = {'model': llm.model, 'messages': [{'role': 'user', 'content': 'x'}], 'max_tokens': 3}
+    assert client.chat.completions.create(**request).choices[0].message.content == 'token token token'
+    with client.chat.completions.create(**request, stream=True) as stream:
+        assert ''.join(chunk.choices[0].delta.content or '' for chunk in stream if chunk.choices) == 'token token token'
+    with pytest.raises(openai.AuthenticationError):
+        openai.OpenAI(api_key='wrong', base_url=gateway.url, max_retries=0).models.list()
+
+
+def test_responses_are_requested_uncompressed(launch, cluster, serve):
+    llm = launch()
+    gateway = serve(llm)
+    client = openai.OpenAI(api_key='-', base_url=gateway.url, max_retries=0,
+                           default_headers={'Accept-Encoding': 'gzip, br'})
+    client.chat.completions.create(model=llm.model, messages=[], max_tokens=1)
+    assert cluster.vllm.last_headers['accept-encoding'] == 'identity'
+    assert cluster.vllm.last_headers['x-authorization'] == f'Bearer {llm.manager.token}'
+
+
+def test_expect_100_continue(launch, serve):
+    llm = launch()
+    gateway = serve(llm)
+    body = json.dumps({'model': llm.model, 'messages': [], 'max_tokens': 1}).encode()
+    with socket.create_connection((gateway.host, gateway.port), timeout=5) as sock:
+        sock.sendall(b'POST /v1/chat/completions HTTP/1.1\r\nHost: gateway\r\nContent-Type: application/json\r\n'
+                     b'Expect: 100-continue\r\nConnection: close\r\n'
+                     b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n')
+        # nothing is sent until the gateway asks for the body
+        assert sock.recv(1024) == b'HTTP/1.1 100 Continue\r\n\r\n'
+        sock.sendall(body)
+        response = b''
+        while chunk := sock.recv(65536):
+            response += chunk
+    assert response.startswith(b'HTTP/1.1 200 ')
+
+
+def test_pool_replicas_are_acquired_and_released(launch, serve):
+    pool = OneReplicaPool(launch())
+    gateway = serve(pool)
+    client = openai.OpenAI(api_key='-', base_url=gateway.url, max_retries=0)
+    for _ in range(2):
+        client.chat.completions.create(model=pool.replicas[0].model, messages=[], max_tokens=1)
+    # the gateway releases the replica just after the response's last byte, which the client may have read first
+    deadline = time.time() + 5
+    while len(pool.released) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert pool.acquired == 2 and len(pool.released) == 2
+    assert all(latency > 0 for latency in pool.released)
+    assert gateway.status()['jobs'][0]['running']
@@ -0,0 +1,83 @@
+"""
+Tests for the circuit breaker and the background health monitor (rosiellm.RosieHealth).
+"""
+import time
+
+import pytest
+
+from rosiellm.RosieHealth import CircuitBreaker, HealthMonitor
+
+
+def wait_until(condition, timeout: float = 10.0) -> bool:
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    assert not breaker.record_failure() and not breaker.record_failure()
+    breaker.record_success()
+    # a success in between starts the count over
+    assert not breaker.record_failure() and not breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+    assert breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow_request()
+
+
+def test_breaker_half_opens_for_a_trial_request():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.state == CircuitBreaker.HALF_OPEN and breaker.allow_request()
+    # a failed trial opens it for another reset_timeout, without reporting a new opening
+    assert not breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.15)
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_trip_opens_immediately():
+    breaker = CircuitBreaker(failure_threshold=5)
+    breaker.trip()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.failures == 5
+
+
+def test_monitor_refuses_requests_while_unhealthy(launch, cluster):
+    llm = launch()
+    states = []
+    monitor = HealthMonitor(llm, min_interval=0.05, max_interval=0.2, on_state_change=states.append).start()
+    try:
+        assert wait_until(lambda: monitor.state == 'healthy')
+        cluster.vllm.healthy = False
+        monitor.check_now()
+        assert wait_until(lambda: llm.breaker.state != CircuitBreaker.CLOSED)
+        assert monitor.state == 'unhealthy' and not llm.isRunning
+        with pytest.raises(ConnectionError):
+            llm.http_client
+        cluster.vllm.healthy = True
+        assert wait_until(lambda: monitor.state == 'healthy')
+        assert llm.breaker.state == CircuitBreaker.CLOSED and llm.http_client
+        assert states == ['healthy', 'unhealthy', 'healthy']
+    finally:
+        monitor.stop()
+
+
+def test_monitor_relaunches_an_ended_job(launch, cluster):
+    llm = launch()
+    monitor = HealthMonitor(llm, min_interval=0.05, max_interval=0.2, auto_relaunch=True).start()
+    try:
+        assert wait_until(lambda: monitor.state == 'healthy')
+        old_job_id = llm.manager.job_id
+        # ended outside this RosieLLM, as by the time limit or an admin
+        llm.manager.rosie_ssh.execute_instance_command(f'scancel {old_job_id}')
+        assert wait_until(lambda: monitor.relaunches == 1, timeout=20)
+        assert llm.manager.job_id != old_job_id
+        assert wait_until(lambda: monitor.state == 'healthy', timeout=20)
+        assert llm.chat.completions.create(model=llm.model, messages=[], max_tokens=1).choices
+    finally:
+        monitor.stop()
@@ -0,0 +1,49 @@
+"""
+Tests for the shared HTTP transport (rosiellm.RosieHTTP), against the mock vLLM server.
+"""
+import pytest
+
+from rosiellm import RosieHTTP
+from rosiellm.RosieHTTP import HTTPConfig, close_shared_transports, openai_httpx, shared_transport
+from rosiellm.RosieMock import MockVLLMServer
+
+
+@pytest.fixture(autouse=True)
+def transports(monkeypatch):
+    monkeypatch.setattr(RosieHTTP, '_transports', {})
+    yield
+    close_shared_transports()
+
+
+def connections(transport) -> int:
+    return len(transport.transport._pool.connections)
+
+
+def test_one_transport_per_config():
+    assert shared_transport() is shared_transport(HTTPConfig())
+    assert shared_transport(HTTPConfig(max_connections=10)) is not shared_transport()
+    config = HTTPConfig(connect_timeout=1.0, read_timeout=2.0, http2=False)
+    assert (config.timeout.connect, config.timeout.read, config.use_http2) == (1.0, 2.0, False)
+    assert config.limits.max_keepalive_connections == 100
+
+
+def test_closing_a_client_leaves_the_transport_open():
+    with MockVLLMServer() as vllm:
+        for _ in range(2):
+            with openai_httpx().Client(transport=shared_transport()) as client:
+                assert client.get(f"{vllm.url}/health").status_code == 200
+        # the second client reused the first one's connection
+        assert connections(shared_transport()) == 1
+    close_shared_transports()
+    assert RosieHTTP._transports == {}
+
+
+def test_clients_share_warm_connections(launch):
+    first, second = launch(job_name='first'), launch(job_name='second')
+    transport = shared_transport(first.http_config)
+    assert first.http_config == second.http_config
+    for llm in (first, second, first):
+        response = llm.chat.completions.create(model=llm.model, messages=[], max_tokens=2)
+        assert response.choices[0].message.content == 'token token'
+    # health checks and completions of both went over one kept-alive connection
+    assert connections(transport) == 1
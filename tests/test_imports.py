@@ -0,0 +1,20 @@
+"""
+Import-time checks: each import in benchmarks/import_benchmark.py must not load the modules it lists (the OpenAI
+client, SSH, encryption and the HTTP stack). Each runs in a fresh interpreter, as the test session has already
+imported them. The timings are left to the benchmark, as they depend on the machine.
+"""
+import os
+import importlib.util
+
+import pytest
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'import_benchmark.py')
+spec = importlib.util.spec_from_file_location('import_benchmark', BENCHMARK)
+import_benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(import_benchmark)
+
+
+@pytest.mark.parametrize('statement, forbidden', [(statement, forbidden) for statement, _, forbidden in import_benchmark.CHECKS],
+                         ids=[statement for statement, _, _ in import_benchmark.CHECKS])
+def test_import_stays_light(statement, forbidden):
+    assert import_benchmark.probe(statement, forbidden)['loaded'] == []
@@ -0,0 +1,79 @@
+"""
+Tests for following a job's output file (rosiellm.RosieLogs) over the fake cluster's SFTP.
+"""
+import os
+
+import pytest
+
+from rosiellm.RosieLogs import START_MARKER, LogTailer, StartupMonitor, parse_startup_line
+from rosiellm.RosieSSH import RosieSSH, RosieAuth
+
+
+@pytest.fixture
+def ssh(cluster):
+    session = RosieSSH(cluster.username, cluster.address, rosie_auth=RosieAuth(cluster.username, cluster.password))
+    session.connect()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def log(cluster):
+    """
+    Writes to the job's output file, /out/job.txt on the cluster.
+    """
+    path = cluster.local_path('/out/job.txt')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(text: str, mode: str = 'a') -> None:
+        with open(path, mode) as f:
+            f.write(text)
+
+    return write
+
+
+@pytest.mark.parametrize('line, kind, progress', [
+    ('vllm not found. Installing...', 'pip_install', None),
+    ('Staging model weights: 40% (2/5 files)', 'staging', 0.4),
+    ('Loading safetensors checkpoint shards:  75% Completed | 3/4', 'loading_weights', 0.75),
+    ('model-00001-of-00004.safetensors:  12%|█▏        | 600M/5.0G', 'download', 0.12),
+    ('INFO: Loading model weights took 14.96 GB', 'weights_loaded', None),
+    ('INFO: Capturing cudagraphs for decoding.', 'cuda_graph_capture', None),
+    ('INFO: Graph capturing finished in 5 secs', 'cuda_graph_done', None),
+    ('INFO:     Uvicorn running on http://0.0.0.0:8000', 'server_started', None),
+    ('torch.OutOfMemoryError: CUDA out of memory.', 'error', None),
+    ('INFO: Started server process [1234]', None, None),
+])
+def test_startup_lines(line, kind, progress):
+    event = parse_startup_line(line, timestamp=1.0)
+    if kind is None:
+        assert event is None
+    else:
+        assert (event.kind, event.progress, event.timestamp) == (kind, progress, 1.0)
+
+
+def test_tailer_reads_only_new_lines(ssh, log):
+    tailer = LogTailer(ssh, '/out/job.txt')
+    # the job hasn't created its output file yet
+    assert tailer.read_lines() == []
+    log('first\nsec')
+    assert tailer.read_lines() == ['first']
+    log('ond\nloading  10%\rloading  20%\r\n\n')
+    assert tailer.read_lines() == ['second', 'loading  10%', 'loading  20%']
+    assert tailer.read_lines() == []
+    # a new job truncated the file
+    log('new\n', mode='w')
+    assert tailer.read_lines() == ['new']
+    tailer.close()
+
+
+def test_monitor_skips_earlier_jobs_and_repeated_progress(ssh, log):
+    log('INFO:     Uvicorn running on http://0.0.0.0:8000\n')
+    monitor = StartupMonitor(ssh, '/out/job.txt', job_id='1001')
+    assert monitor.poll() == [] and monitor.phase is None
+    log(START_MARKER.format(job_id='1001') + '\nStaging model weights: 50%\nStaging model weights: 50%\n')
+    assert [(e.kind, e.progress) for e in monitor.poll()] == [('job_started', None), ('staging', 0.5)]
+    log('Staging model weights: 100%\nApplication startup complete.\n')
+    assert [e.kind for e in monitor.poll()] == ['staging', 'server_started']
+    assert monitor.phase == 'server_started' and len(monitor.events) == 4
+    monitor.close()
@@ -0,0 +1,60 @@
+"""
+Tests for serving LoRA adapters and co-located models from one job, on the fake cluster.
+"""
+import pytest
+
+from rosiellm.RosieJob import JobManager
+from rosiellm.RosieMock import DEFAULT_MODEL_CONFIG
+
+SMALL_MODEL = 'Qwen/Qwen2.5-0.5B-Instruct'
+SMALL_MODEL_CONFIG = {**DEFAULT_MODEL_CONFIG, 'hidden_size': 896, 'intermediate_size': 4864, 'num_hidden_layers': 24,
+                      'num_attention_heads': 14, 'num_key_value_heads': 2, 'vocab_size': 151936,
+                      'max_position_embeddings': 32768, 'tie_word_embeddings': True}
+
+
+def test_settings_are_normalized():
+    assert JobManager.parse_lora_adapters(['/data/me/adapters/math-v2/', 'org/code']) == \
+        {'math-v2': '/data/me/adapters/math-v2/', 'code': 'org/code'}
+    assert JobManager.parse_lora_adapters({}) == {} and JobManager.parse_lora_adapters(None) is None
+    with pytest.raises(ValueError, match='LoRA adapter'):
+        JobManager.parse_lora_adapters({'my adapter': '/data/x'})
+    assert JobManager.parse_colocated('a', 'b') == ['b'] and JobManager.parse_colocated('a', []) is None
+    with pytest.raises(ValueError, match='different'):
+        JobManager.parse_colocated('a', ['b', 'a'])
+
+
+def test_adapters_are_served_and_loaded_at_runtime(launch, cluster):
+    llm = launch(lora_adapters={'math': '/data/me/math'}, max_loras=2)
+    assert '--enable-lora --max-loras 2 ' in llm.manager.engine_args()
+    assert '--lora-modules math=/data/me/math ' in llm.manager.server_command()
+    assert [model.id for model in llm.models.list()] == [cluster.vllm.model, 'math']
+
+    llm.load_adapter('code', '/data/me/code')
+    response = llm.chat.completions.create(model='code', messages=[], max_tokens=2)
+    assert response.choices[0].message.content == 'token token'
+    llm.unload_adapter('code')
+    with pytest.raises(RuntimeError, match='404'):
+        llm.unload_adapter('code')
+    assert 'code' not in cluster.vllm.lora_adapters
+
+
+def test_adapters_need_lora_enabled(launch):
+    llm = launch()
+    assert '--enable-lora' not in llm.manager.engine_args()
+    with pytest.raises(RuntimeError, match='lora_adapters'):
+        llm.load_adapter('code', '/data/me/code')
+
+
+def test_colocated_models_get_their_own_server(launch, cluster):
+    cluster.add_model(SMALL_MODEL, SMALL_MODEL_CONFIG)
+    llm = launch(partition='dgxh100', colocate=[SMALL_MODEL])
+    assert llm.manager.served_models == {llm.model: 1234, SMALL_MODEL: 1235}
+    # both models fit half of an 80 GiB GPU, which each server gets half the memory utilization of
+    cfg = llm.manager.config_dict
+    assert (cfg['gpus'], cfg['max_model_len']) == (1, 2048)
+    utilization = f"--gpu-memory-utilization {round(cfg['gpu_memory_utilization'] / 2, 3)} "
+    assert utilization in llm.manager.engine_args() and utilization in llm.manager.engine_args(SMALL_MODEL)
+    cluster.vllm.routes.clear()
+    for model in (llm.model, SMALL_MODEL, SMALL_MODEL):
+        assert llm.chat.completions.create(model=model, messages=[], max_tokens=1).choices
+    assert {prefix.rsplit('/', 1)[-1]: count for prefix, count in cluster.vllm.routes.items()} == {'1234': 1, '1235': 2}
@@ -0,0 +1,88 @@
+"""
+Tests for per-request latency and throughput metrics (rosiellm.RosieMetrics), against the mock vLLM server.
+"""
+import asyncio
+import math
+import random
+
+import pytest
+
+from rosiellm.RosieMetrics import LATENCY_BUCKETS, Histogram, RequestMetrics, percentile
+
+
+def test_exact_percentiles():
+    assert percentile([4, 1, 3, 2], 0.5) == 2.5
+    assert (percentile([1, 2, 3], 0), percentile([1, 2, 3], 1)) == (1, 3)
+    assert percentile([7], 0.99) == 7
+    assert math.isnan(percentile([], 0.5))
+
+
+def test_histogram_percentiles_are_within_a_bucket():
+    rng = random.Random(0)
+    values = [rng.lognormvariate(-3, 1) for _ in range(5000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(value)
+    for q in (0.5, 0.9, 0.99):
+        # buckets are sqrt(2) wide, so an estimate is off by less than that factor
+        assert percentile(values, q) / 2 ** 0.5 < histogram.percentile(q) < percentile(values, q) * 2 ** 0.5
+    summary = histogram.summary()
+    assert (summary['count'], summary['max']) == (5000, max(values))
+    assert summary['mean'] == pytest.approx(sum(values) / 5000)
+
+
+def test_histogram_estimates_stay_within_the_observed_range():
+    histogram = Histogram()
+    assert histogram.percentile(0.5) is None
+    histogram.observe(0.0123)
+    assert histogram.percentile(0.01) == histogram.percentile(0.99) == 0.0123
+    histogram.observe(LATENCY_BUCKETS[-1] * 10)
+    assert histogram.percentile(1.0) == pytest.approx(LATENCY_BUCKETS[-1] * 10)
+
+
+def test_requests_are_recorded_and_exported():
+    exported = []
+
+    def export(name, value, labels):
+        exported.append((name, labels['job']))
+        raise RuntimeError('collector is down')
+
+    metrics = RequestMetrics(labels=lambda: {'job': '1000'}, export=export)
+    metrics.record_request(start=10.0, end=12.0, prompt_tokens=5, completion_tokens=21, first_token=10.5)
+    metrics.record_request(start=20.0, end=20.5, prompt_tokens=None, completion_tokens=0)
+    metrics.record_error()
+    summary = metrics.summary()
+    assert (summary['requests'], summary['errors'], summary['prompt_tokens'], summary['completion_tokens']) == (2, 1, 5, 21)
+    assert summary['tokens_per_second']['max'] == 10.5 and summary['decode_tokens_per_second']['max'] == 20 / 1.5
+    assert summary['e2e_latency']['count'] == 2 and 'ttft' not in summary
+    assert exported == [('e2e_latency', '1000'), ('tokens_per_second', '1000'), ('decode_tokens_per_second', '1000'),
+                        ('e2e_latency', '1000')]
+
+
+def test_streams_are_timed(launch, cluster):
+    exported = []
+    cluster.vllm.inter_token_latency = 0.02
+    llm = launch(metrics_export=lambda name, value, labels: exported.append((name, labels)))
+    # only health checks have been timed so far
+    assert llm.metrics.requests == 0 and {name for name, _ in exported} <= {'proxy_rtt'}
+    stream = llm.chat.completions.create(model=llm.model, messages=[], max_tokens=5, stream=True,
+                                         stream_options={'include_usage': True})
+    assert ''.join(chunk.choices[0].delta.content or '' for chunk in stream if chunk.choices).split() == ['token'] * 5
+    llm.chat.completions.create(model=llm.model, messages=[], max_tokens=3)
+    summary = llm.metrics.summary()
+    assert (summary['requests'], summary['completion_tokens']) == (2, 8)
+    assert summary['ttft']['count'] == 1 and summary['inter_token_latency']['count'] == 4
+    assert summary['inter_token_latency']['p50'] >= 0.015
+    assert summary['decode_tokens_per_second']['max'] < 60
+    assert exported[-1][1] == {'job': str(llm.manager.job_id), 'node': str(llm.manager.node_url), 'model': llm.model}
+
+
+def test_async_requests_are_timed(launch):
+    llm = launch(async_client=True)
+
+    async def requests():
+        return await asyncio.gather(*(llm.chat.completions.create(model=llm.model, messages=[], max_tokens=2)
+                                      for _ in range(3)))
+
+    asyncio.run(requests())
+    assert llm.metrics.requests == 3 and llm.metrics.summary()['e2e_latency']['count'] == 3
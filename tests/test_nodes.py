@@ -0,0 +1,98 @@
+"""
+Tests for picking the fastest management node (rosiellm.RosieNodes) and failing over between nodes.
+"""
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from rosiellm import RosieNodes
+from rosiellm.RosieLLM import select_management_nodes
+from rosiellm.RosieNodes import probe_node, rank_management_nodes
+from rosiellm.RosieSSH import RosieSSH, RosieAuth, SSHConnectionPool
+
+LATENCIES = {'dh-mgmt1': 0.03, 'dh-mgmt2': None, 'dh-mgmt3': 0.01, 'dh-mgmt4': 0.02}
+
+
+@pytest.fixture
+def probes(tmp_path, monkeypatch):
+    monkeypatch.setattr(RosieNodes, 'STATE_DIR', str(tmp_path))
+    monkeypatch.setattr(RosieNodes, '_ranking_cache', {'ranked_at': 0.0, 'nodes': []})
+    probed = []
+
+    def probe(node, port=22, timeout=2.0):
+        probed.append(node)
+        return LATENCIES[node]
+
+    monkeypatch.setattr(RosieNodes, 'probe_node', probe)
+    return probed
+
+
+def serve_once(banner: bytes) -> int:
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+
+    def answer():
+        conn, _ = server.accept()
+        conn.sendall(banner)
+        conn.close()
+        server.close()
+
+    threading.Thread(target=answer, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def test_probe_waits_for_the_ssh_banner():
+    assert probe_node('127.0.0.1', serve_once(b'SSH-2.0-OpenSSH_8.9\r\n'), timeout=2) > 0
+    assert probe_node('127.0.0.1', serve_once(b'HTTP/1.1 400 Bad Request\r\n'), timeout=2) is None
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+    assert probe_node('127.0.0.1', port, timeout=0.5) is None
+
+
+def test_nodes_are_ranked_by_latency(probes, tmp_path):
+    assert rank_management_nodes() == ['dh-mgmt3', 'dh-mgmt4', 'dh-mgmt1', 'dh-mgmt2']
+    assert sorted(probes) == sorted(LATENCIES)
+    # the ranking is reused, from memory and then from the state directory
+    assert rank_management_nodes()[0] == 'dh-mgmt3'
+    RosieNodes._ranking_cache.update(ranked_at=0.0, nodes=[])
+    assert rank_management_nodes()[0] == 'dh-mgmt3' and len(probes) == 4
+    assert stat.S_IMODE(os.stat(tmp_path / 'nodes.json').st_mode) == 0o600
+    rank_management_nodes(refresh=True)
+    rank_management_nodes(ttl=0)
+    assert len(probes) == 12
+
+
+def test_failed_rankings_are_not_cached(probes, monkeypatch, tmp_path):
+    monkeypatch.setitem(LATENCIES, 'dh-mgmt1', None)
+    monkeypatch.setitem(LATENCIES, 'dh-mgmt3', None)
+    monkeypatch.setitem(LATENCIES, 'dh-mgmt4', None)
+    assert sorted(rank_management_nodes()) == sorted(LATENCIES)
+    assert not os.path.exists(tmp_path / 'nodes.json')
+    rank_management_nodes()
+    assert len(probes) == 8
+
+
+def test_a_chosen_node_is_tried_first(probes):
+    assert select_management_nodes('dh-mgmt2') == ['dh-mgmt2.hpc.msoe.edu', 'dh-mgmt3.hpc.msoe.edu',
+                                                   'dh-mgmt4.hpc.msoe.edu', 'dh-mgmt1.hpc.msoe.edu']
+    assert select_management_nodes('dh-mgmt9')[0] == 'dh-mgmt3.hpc.msoe.edu'
+
+
+def test_unreachable_nodes_fail_over(cluster, monkeypatch):
+    monkeypatch.setattr(SSHConnectionPool, '_connections', {})
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        down = f"127.0.0.1:{closed.getsockname()[1]}"
+    session = RosieSSH(cluster.username, down, fallback_hosts=[cluster.address],
+                       rosie_auth=RosieAuth(cluster.username, cluster.password))
+    session.connect()
+    try:
+        assert session.ssh_host == cluster.address and session.fallback_hosts == [down]
+        assert session.run_command('squeue -h').ok
+    finally:
+        session.close()
@@ -0,0 +1,98 @@
+"""
+Tests for offline batch jobs (rosiellm.RosieOffline), with the mock engine and the fake cluster.
+"""
+import json
+
+import pytest
+
+from rosiellm import RosieOffline
+from rosiellm.RosieMock import MockOfflineEngine
+from rosiellm.RosieOffline import OfflineBatch, read_results, request_prompt, sampling_kwargs
+from rosiellm.RosieSSH import RosieSSH, RosieAuth
+
+
+def chat(i: int, **kwargs) -> dict:
+    return {'messages': [{'role': 'user', 'content': f'request {i}'}], 'max_tokens': 2, **kwargs}
+
+
+def write_jsonl(path, entries) -> None:
+    path.write_text(''.join(json.dumps(entry) + '\n' for entry in entries))
+
+
+def read_jsonl(path) -> list:
+    entries = []
+    for line in path.read_text().splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            pass
+    return entries
+
+
+def test_requests_map_onto_sampling_params():
+    request = {'model': 'ignored', 'messages': [], 'temperature': 0.5, 'top_p': None, 'max_tokens': 10,
+               'max_completion_tokens': 20, 'seed': 1, 'stream': False, 'extra_body': {'top_k': 5}}
+    assert sampling_kwargs(request) == {'temperature': 0.5, 'seed': 1, 'max_tokens': 20, 'top_k': 5}
+    # unknown arguments are passed on, for vLLM to reject rather than ignore
+    assert sampling_kwargs({'prompt': 'x', 'best_of': 2}) == {'best_of': 2}
+    assert request_prompt({'prompt': 'x'}) == (False, 'x')
+    assert request_prompt(chat(0))[0]
+    with pytest.raises(ValueError):
+        request_prompt({'prompt': ['x', 'y']})
+
+
+@pytest.mark.parametrize('key, value', [('logprobs', True), ('top_logprobs', 5)])
+def test_logprobs_are_rejected(key, value):
+    with pytest.raises(ValueError, match='batch\\(\\)'):
+        sampling_kwargs(chat(0, **{key: value}))
+    # unset or False is fine
+    assert key not in sampling_kwargs(chat(0, logprobs=False, top_logprobs=None))
+
+
+def test_read_results(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    assert read_results(str(path)) == (set(), False)
+    path.write_text('{"index": 0, "response": {}}\n{"index": 1, "error": "x"}\n{"index": 2, "resp')
+    # errors are retried by the next job, and the cut-off line is reported
+    assert read_results(str(path)) == ({0}, True)
+
+
+def test_run_resumes_and_reports_bad_requests(tmp_path):
+    requests, results = tmp_path / 'requests.jsonl', tmp_path / 'results.jsonl'
+    write_jsonl(requests, [chat(0), chat(1, logprobs=True), {'oops': 1}, chat(3, n=2), chat(4, best_of=2)])
+    # request 0 was answered by an earlier job, which was killed while writing another
+    results.write_text(json.dumps({'index': 0, 'response': {'id': 'earlier'}}) + '\n{"index": 3, "resp')
+    completed, failed = RosieOffline.run(MockOfflineEngine(batch_size=1), str(requests), str(results), max_pending=2)
+    assert (completed, failed) == (1, 3)
+    entries = {entry['index']: entry for entry in read_jsonl(results)}
+    assert sorted(entries) == [0, 1, 2, 3, 4]
+    assert entries[0]['response']['id'] == 'earlier'
+    assert 'logprobs' in entries[1]['error'] and 'ValueError' in entries[2]['error'] and 'best_of' in entries[4]['error']
+    response = entries[3]['response']
+    assert response['object'] == 'chat.completion' and len(response['choices']) == 2
+    assert response['usage'] == {'prompt_tokens': 2, 'completion_tokens': 4, 'total_tokens': 6}
+
+
+def test_batch_resumes_after_the_job_ends(cluster, monkeypatch):
+    # results are synced to the file as they're written, and the job takes a few slow steps, long enough to interrupt
+    monkeypatch.setattr(RosieOffline, 'SYNC_INTERVAL', 0.0)
+    cluster.offline_step_latency = 0.3
+    ssh = RosieSSH(cluster.username, cluster.address, rosie_auth=RosieAuth(cluster.username, cluster.password))
+    batch = OfflineBatch([chat(i) for i in range(200)], rosie_ssh=ssh)
+    seen = []
+    with pytest.raises(RuntimeError, match='submit'):
+        for result in batch.results(poll_interval=0.05, timeout=20):
+            assert result.response.choices[0].message.content == 'token token'
+            seen.append(result.index)
+            if len(seen) == 1:
+                batch.cancel()
+    first_job = batch.job_id
+    assert 0 < len(seen) < 200
+    batch.submit()
+    assert batch.job_id != first_job
+    # the second job only runs the requests the first didn't finish
+    seen += [result.index for result in batch.results(poll_interval=0.05, timeout=20)]
+    assert sorted(seen) == list(range(200))
+    with open(cluster.local_path(batch.results_path)) as f:
+        assert sorted(json.loads(line)['index'] for line in f if line.strip()) == list(range(200))
+    ssh.close()
@@ -0,0 +1,99 @@
+"""
+Tests for the shared SLURM status poller (rosiellm.RosiePoller) and job id tracking.
+"""
+import time
+
+import pytest
+
+from rosiellm.RosieJob import JobManager
+from rosiellm.RosiePoller import JobPoller, JobEvent
+from rosiellm.RosieSSH import CommandResult
+
+
+class FakeSlurm:
+    """
+    Answers squeue and sacct from a dict of job id -> "STATE|NODE|REASON", recording every command and timeout.
+    """
+    def __init__(self, queued=None, finished=None):
+        self.queued = queued or {}
+        self.finished = finished or {}
+        self.commands = []
+        self.hang = False
+
+    def run_command(self, command, timeout=None):
+        self.commands.append((command.split()[0], timeout))
+        if self.hang:
+            raise TimeoutError(f"No output from '{command}' for {timeout} seconds.")
+        jobs = self.queued if command.startswith('squeue') else self.finished
+        return CommandResult(command, ''.join(f'{j}|{row}\n' for j, row in jobs.items()), '', 0)
+
+
+@pytest.mark.parametrize('output, job_id', [
+    ('1234\n', '1234'),
+    ('1234;rosie\n', '1234'),
+    ('sbatch: warning: using the default partition\n1234\n', '1234'),
+    ('sbatch: error: Batch job submission failed\n', None),
+    ('', None),
+])
+def test_parse_job_id(output, job_id):
+    assert JobManager.parse_job_id(output) == job_id
+
+
+def test_query_falls_back_to_sacct_for_finished_jobs():
+    slurm = FakeSlurm(queued={'1': 'RUNNING|dh-node3|None', '2': 'PENDING|(null)|Priority'},
+                      finished={'3': 'CANCELLED by 42|dh-node1|None'})
+    statuses = JobPoller(slurm, command_timeout=7).query(['1', '2', '3'])
+    assert (statuses['1'].state, statuses['1'].node, statuses['1'].reason) == ('RUNNING', 'dh-node3', None)
+    assert (statuses['2'].state, statuses['2'].node, statuses['2'].reason) == ('PENDING', None, 'Priority')
+    assert statuses['3'].state == 'CANCELLED'
+    assert slurm.commands == [('squeue', 7), ('sacct', 7)]
+
+
+def test_poll_once_dispatches_only_changes():
+    slurm = FakeSlurm(queued={'1': 'PENDING||Priority'})
+    poller = JobPoller(slurm)
+    events = []
+    poller._jobs['1'] = None
+    poller._listeners['1'] = [events.append]
+    assert poller.poll_once()
+    assert not poller.poll_once()
+    slurm.queued['1'] = 'RUNNING|dh-node1|None'
+    assert poller.poll_once()
+    assert [(e.state, e.previous_state) for e in events] == [('PENDING', None), ('RUNNING', 'PENDING')]
+
+
+def test_wait_for_times_out():
+    poller = JobPoller(FakeSlurm(queued={'1': 'PENDING||Priority'}), min_interval=0.01)
+    try:
+        with pytest.raises(TimeoutError):
+            poller.wait_for('1', timeout=0.2)
+        assert poller.status('1').state == 'PENDING'
+    finally:
+        poller.stop()
+
+
+def test_hung_queries_back_off():
+    slurm = FakeSlurm()
+    slurm.hang = True
+    poller = JobPoller(slurm, min_interval=0.01, max_interval=0.2, backoff=2.0, command_timeout=1)
+    poller.track('1')
+    try:
+        time.sleep(1.0)
+        calls = len(slurm.commands)
+        # 0.01, 0.02, 0.04, ... then every 0.2s, instead of every 0.01s
+        assert 3 <= calls <= 12
+        assert all(timeout == 1 for _, timeout in slurm.commands)
+        # a query that works again is picked up
+        slurm.hang = False
+        slurm.queued['1'] = 'RUNNING|dh-node1|None'
+        assert poller.wait_for('1', timeout=2).node == 'dh-node1'
+    finally:
+        poller.stop()
+
+
+def test_jobs_are_tracked_by_id(launch):
+    llm = launch()
+    manager = llm.manager
+    assert manager.poller is JobPoller.shared(manager.rosie_ssh)
+    status = manager.poller.status(manager.job_id)
+    assert isinstance(status, JobEvent) and status.state == 'RUNNING' and status.node == manager.node_url
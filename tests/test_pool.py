@@ -0,0 +1,91 @@
+"""
+Tests for RosieLLMPool's least-loaded routing and failover (rosiellm.RosiePool), on the fake cluster.
+"""
+import asyncio
+
+import openai
+import pytest
+
+from rosiellm import RosieLLMPool
+from rosiellm.RosieSSH import RosieAuth, SSHConnectionPool
+
+
+@pytest.fixture
+def make_pool(cluster, monkeypatch):
+    monkeypatch.setattr(SSHConnectionPool, '_auths', {})
+    SSHConnectionPool.set_auth(cluster.username, RosieAuth(cluster.username, cluster.password))
+    monkeypatch.setattr('rosiellm.RosiePool.select_management_nodes', lambda node: [cluster.address])
+    pools = []
+
+    def _make_pool(**kwargs):
+        pool = RosieLLMPool(rosie_username=cluster.username, monitor_health=False, **kwargs)
+        pools.append(pool)
+        for replica in pool.replicas:
+            assert replica.wait_until_ready(poll_interval=0.1, timeout=20)
+        return pool
+
+    yield _make_pool
+    for pool in pools:
+        pool.shutdown()
+
+
+def request(pool, **kwargs):
+    return pool.chat.completions.create(model=pool.model, messages=[], max_tokens=2, **kwargs)
+
+
+def test_requests_go_to_the_least_loaded_replica(make_pool, cluster):
+    pool = make_pool(replicas=2)
+    assert len({r.manager.job_id for r in pool.replicas}) == 2
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second and pool.in_flight == [1, 1]
+    pool.release(first, 0.5)
+    assert pool.acquire(exclude=[second]) is first
+    pool.release(first)
+    pool.release(second)
+    assert pool.in_flight == [0, 0] and pool.recent_latencies() == [0.5]
+
+    assert request(pool).choices[0].message.content == 'token token'
+    with request(pool, stream=True) as stream:
+        chunks = iter(stream)
+        next(chunks)
+        # a stream counts against its replica until it is closed
+        assert sum(pool.in_flight) == 1
+    assert pool.in_flight == [0, 0] and len(pool.recent_latencies()) == 3
+
+
+def test_unreachable_replicas_are_routed_around(make_pool):
+    pool = make_pool(replicas=2)
+    broken, working = pool.replicas
+    broken._http_client = openai.OpenAI(api_key='-', base_url='http://127.0.0.1:9/v1', max_retries=0)
+    for _ in range(3):
+        assert request(pool).choices
+    assert not broken.isRunning and working.isRunning
+    # until a health check shows it is back
+    pool.health_check_interval = 0
+    assert pool.acquire(exclude=[working]) is broken
+    pool.release(broken)
+
+
+def test_no_running_replica(make_pool):
+    pool = make_pool(replicas=1)
+    with pytest.raises(ConnectionError):
+        pool.acquire(exclude=pool.replicas)
+
+
+def test_async_pool(make_pool):
+    pool = make_pool(replicas=2, async_client=True)
+
+    async def requests():
+        return await asyncio.gather(*(request(pool) for _ in range(4)))
+
+    assert all(response.choices for response in asyncio.run(requests()))
+    assert pool.in_flight == [0, 0]
+
+
+def test_replicas_are_added_and_removed(make_pool, cluster):
+    pool = make_pool(replicas=1)
+    replica = pool.add_replica()
+    assert replica.manager.job_name == 'RosieLLM-1' and len(pool.replicas) == 2
+    pool.remove_replica(replica, drain_timeout=1)
+    assert pool.replicas == pool.replicas[:1] and cluster.jobs[int(replica.manager.job_id)].state == 'CANCELLED'
@@ -0,0 +1,74 @@
+"""
+Tests for the vLLM options and presets (rosiellm.RosiePresets) and how jobs apply them.
+"""
+import pytest
+
+from rosiellm.RosieJob import JobManager
+from rosiellm.RosiePresets import PRESETS, VLLMOptions, resolve_options
+from rosiellm.RosieSSH import RosieSSH, RosieAuth
+
+
+@pytest.fixture
+def manager(cluster):
+    ssh = RosieSSH(cluster.username, cluster.address, rosie_auth=RosieAuth(cluster.username, cluster.password))
+    ssh.connect()
+    yield lambda **kwargs: JobManager('RosieLLM', ssh, **kwargs)
+    ssh.close()
+
+
+@pytest.mark.parametrize('options', [
+    {'max_num_seqs': 0},
+    {'max_num_seqs': '256'},
+    {'max_num_batched_tokens': True},
+    {'enable_prefix_caching': 'yes'},
+    {'kv_cache_dtype': 'int4'},
+    {'quantization': 'nf4'},
+    {'speculative_model': '[ngram]'},
+    {'num_speculative_tokens': 4},
+    {'extra_args': {'max-num-seqs': 8}},
+    {'max_seqs': 8},
+])
+def test_invalid_options_are_rejected(options):
+    with pytest.raises(ValueError):
+        VLLMOptions.from_value(options)
+
+
+def test_options_become_server_arguments():
+    options = VLLMOptions(max_num_seqs=64, enable_prefix_caching=True, enable_chunked_prefill=False,
+                          extra_args={'swap_space': 8, 'disable_log_requests': True,
+                                      'override_generation_config': {'temperature': 0.5}})
+    assert options.to_args() == ['--max-num-seqs 64', '--enable-prefix-caching', '--swap-space 8',
+                                 '--disable-log-requests',
+                                 '--override-generation-config "{\\"temperature\\": 0.5}"']
+    assert VLLMOptions().to_args() == []
+    with pytest.raises(ValueError):
+        VLLMOptions(extra_args={'chat_template': "{{ 'x' }}"}).to_args()
+
+
+def test_explicit_options_override_the_preset():
+    options = resolve_options('throughput', {'max_num_seqs': 64, 'extra_args': {'swap_space': 8}})
+    assert (options.max_num_seqs, options.max_num_batched_tokens) == (64, PRESETS['throughput'].max_num_batched_tokens)
+    assert options.enable_prefix_caching and options.extra_args == {'swap_space': 8}
+    # presets are shared, merging never changes them
+    assert PRESETS['throughput'].max_num_seqs == 256 and PRESETS['throughput'].extra_args == {}
+    assert resolve_options(None, None) == VLLMOptions()
+    with pytest.raises(ValueError, match='Unknown preset'):
+        resolve_options('fast', None)
+
+
+def test_batched_tokens_must_cover_the_context_without_chunked_prefill():
+    VLLMOptions(max_num_batched_tokens=512, enable_chunked_prefill=True).validate(8192)
+    VLLMOptions(max_num_batched_tokens=8192).validate(8192)
+    with pytest.raises(ValueError, match='enable_chunked_prefill'):
+        VLLMOptions(max_num_batched_tokens=512).validate(8192)
+
+
+def test_jobs_apply_presets(manager):
+    job = manager(preset='low-latency', vllm_options={'max_num_seqs': 16})
+    args = job.engine_args()
+    assert '--max-num-seqs 16 ' in args and '--max-num-batched-tokens 512 ' in args and '--enable-chunked-prefill ' in args
+    # the long-context preset serves the model's full context unless max_model_len is set
+    assert manager(preset='long-context').config_dict['max_model_len'] == 'auto'
+    assert manager(preset='long-context', max_model_len=4096).config_dict['max_model_len'] == 4096
+    with pytest.raises(ValueError):
+        manager(preset='fastest')
@@ -0,0 +1,67 @@
+"""
+Tests for replacing a job before its SLURM time limit (RosieLLM.rollover and rollover_lead_time).
+"""
+import threading
+import time
+
+import pytest
+
+from rosiellm.RosieJob import JobManager
+
+
+@pytest.mark.parametrize('duration, seconds', [
+    ('05:30', 330.0),
+    ('1:00:00', 3600.0),
+    ('2-03:04:05', 183845.0),
+    (' 0:07 ', 7.0),
+    ('UNLIMITED', None),
+    ('INVALID', None),
+    ('', None),
+])
+def test_parse_slurm_duration(duration, seconds):
+    assert JobManager.parse_slurm_duration(duration) == seconds
+
+
+def test_time_left(launch, cluster):
+    cluster.time_limit = 600
+    llm = launch()
+    assert 590 <= llm.manager.get_time_left() <= 600
+    assert llm.manager.get_time_left('999999') is None
+
+
+def test_rollover_drains_the_old_job(launch, cluster):
+    cluster.vllm.inter_token_latency = 0.05
+    llm = launch()
+    old_job = cluster.jobs[int(llm.manager.job_id)]
+    request = {'model': llm.model, 'messages': [], 'max_tokens': 20}
+    stream = llm.chat.completions.create(**request, stream=True)
+    chunks = iter(stream)
+    next(chunks)
+
+    rollover = threading.Thread(target=llm.rollover, kwargs={'drain_timeout': 30})
+    rollover.start()
+    deadline = time.time() + 10
+    while llm.manager.job_id == str(old_job.job_id) and time.time() < deadline:
+        time.sleep(0.05)
+    new_job_id = llm.manager.job_id
+    assert new_job_id != str(old_job.job_id)
+    # new requests go to the replacement while the old job finishes the stream it's serving
+    assert llm.chat.completions.create(**request).choices
+    assert old_job.state == 'RUNNING'
+
+    assert ''.join(chunk.choices[0].delta.content or '' for chunk in chunks if chunk.choices) == ' token' * 19
+    rollover.join(10)
+    assert not rollover.is_alive()
+    assert old_job.state == 'CANCELLED'
+    assert llm.manager.registry.get(llm.manager.user, llm.manager.job_name)['job_id'] == new_job_id
+
+
+def test_rollover_before_the_time_limit(launch, cluster):
+    cluster.time_limit = 30
+    llm = launch(rollover_lead_time=29)
+    first_job_id = llm.manager.job_id
+    deadline = time.time() + 15
+    while llm.manager.job_id == first_job_id and time.time() < deadline:
+        time.sleep(0.1)
+    assert llm.manager.job_id != first_job_id
+    assert llm.chat.completions.create(model=llm.model, messages=[], max_tokens=1).choices
@@ -0,0 +1,65 @@
+"""
+Tests for the local registry of launched jobs (rosiellm.RosieSession).
+"""
+import multiprocessing
+import os
+import stat
+
+from rosiellm.RosieSession import SessionRegistry
+
+
+def mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def save_jobs(state_dir, worker, count):
+    registry = SessionRegistry(state_dir)
+    for i in range(count):
+        registry.save('user', f'job-{worker}-{i}', job_id=str(i), token='secret')
+
+
+def test_entries_round_trip(tmp_path):
+    registry = SessionRegistry(str(tmp_path))
+    assert registry.get('user', 'job') is None
+    registry.save('user', 'job', job_id='1234', node_url='dh-node3', port=8000, token='secret')
+    entry = SessionRegistry(str(tmp_path)).get('user', 'job')
+    assert (entry['job_id'], entry['port'], entry['token']) == ('1234', 8000, 'secret')
+    assert registry.get('other', 'job') is None
+    registry.remove('user', 'job')
+    assert registry.load() == {}
+
+
+def test_unreadable_registry_is_ignored(tmp_path):
+    (tmp_path / 'sessions.json').write_text('{not json')
+    registry = SessionRegistry(str(tmp_path))
+    assert registry.load() == {}
+    registry.save('user', 'job', job_id='1')
+    assert list(registry.load()) == ['user:job']
+
+
+def test_files_are_private(tmp_path):
+    state_dir = tmp_path / 'state'
+    registry = SessionRegistry(str(state_dir))
+    registry.save('user', 'job', job_id='1', token='secret')
+    assert mode(state_dir) == 0o700
+    assert mode(registry.path) == 0o600 and mode(registry.lock_path) == 0o600
+    assert sorted(os.listdir(state_dir)) == ['sessions.json', 'sessions.json.lock']
+
+
+def test_concurrent_processes_keep_every_entry(tmp_path):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=save_jobs, args=(str(tmp_path), w, 25)) for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+    assert len(SessionRegistry(str(tmp_path)).load()) == 100
+
+
+def test_compatibility():
+    entry = {'model': 'm', 'dtype': 'auto', 'gpus': 2, 'task': 'generate', 'colocate': None, 'lora_adapters': None}
+    assert SessionRegistry.is_compatible(entry, dict(entry))
+    assert SessionRegistry.is_compatible(entry, {**entry, 'gpus': 'auto'})
+    assert not SessionRegistry.is_compatible(entry, {**entry, 'gpus': 1})
+    assert not SessionRegistry.is_compatible(entry, {**entry, 'model': 'other'})
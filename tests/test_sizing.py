@@ -0,0 +1,77 @@
+"""
+Tests for sizing jobs from model metadata (rosiellm.RosieSizing and JobManager.size_job).
+"""
+import pytest
+
+from rosiellm.RosieMock import DEFAULT_MODEL_CONFIG, DEFAULT_MODEL_INDEX
+from rosiellm.RosieSizing import GIB, ModelProfile, estimate_params, partition_gpus, plan_job
+
+LLAMA_8B = ModelProfile.from_config('llama-8b', DEFAULT_MODEL_CONFIG, DEFAULT_MODEL_INDEX)
+
+
+def profile(params: float, heads: int = 32, **kwargs) -> ModelProfile:
+    fields = dict(model='m', params=int(params), weight_bytes=None, num_layers=32, num_attention_heads=heads,
+                  num_kv_heads=8, head_dim=128, max_position_embeddings=8192)
+    return ModelProfile(**{**fields, **kwargs})
+
+
+def test_profile_from_config():
+    # the weight index gives the exact size, 2 bytes per bfloat16 parameter
+    assert LLAMA_8B.params == DEFAULT_MODEL_INDEX['metadata']['total_size'] // 2
+    # without it, the estimate from the architecture is within a fraction of a percent (norms aren't counted)
+    assert estimate_params(DEFAULT_MODEL_CONFIG) == pytest.approx(LLAMA_8B.params, rel=1e-3)
+    assert (LLAMA_8B.num_kv_heads, LLAMA_8B.head_dim, LLAMA_8B.torch_dtype) == (8, 128, 'bfloat16')
+    # a key and a value of 8 heads x 128 dims in 32 layers, 2 bytes each
+    assert LLAMA_8B.kv_bytes_per_token('half') == 2 * 32 * 8 * 128 * 2
+    assert LLAMA_8B.kv_bytes_per_token('float32') == 2 * LLAMA_8B.kv_bytes_per_token('auto')
+
+
+def test_quantized_weights_use_their_size_on_disk():
+    config = {**DEFAULT_MODEL_CONFIG, 'quantization_config': {'quant_method': 'awq'}}
+    quantized = ModelProfile.from_config('m', config, {'metadata': {'total_size': 5 * GIB}})
+    assert quantized.quantized and quantized.weight_size('half') == 5 * GIB
+
+
+def test_fewest_gpus_that_fit():
+    plan = plan_job(LLAMA_8B, 'half', 2048, gpu_memory_gb=16, max_gpus=4)
+    # 15 GiB of weights don't fit a 16 GiB T4 with the overhead, half of them do
+    assert (plan.gpus, plan.max_model_len, plan.gpu_memory_utilization) == (2, 2048, 0.90)
+    assert plan.weights_gib == pytest.approx(LLAMA_8B.params * 2 / GIB / 2)
+    assert plan.kv_cache_gib == pytest.approx(16 * 0.90 - plan.weights_gib - 2.0)
+    assert plan_job(LLAMA_8B, 'half', None, gpu_memory_gb=80, max_gpus=8).gpus == 1
+
+
+def test_context_length_defaults_to_and_is_capped_at_the_model_maximum():
+    assert plan_job(LLAMA_8B, 'half', None, 80, 8).max_model_len == 8192
+    assert plan_job(LLAMA_8B, 'half', 100000, 80, 8).max_model_len == 8192
+
+
+def test_utilization_is_raised_only_as_needed():
+    # 12 GiB of weights, 0.78 GiB of KV cache for 4 x 1600 tokens and 2 GiB of overhead: 92.4% of a 16 GiB GPU
+    plan = plan_job(profile(6 * GIB), 'half', 1600, gpu_memory_gb=16, max_gpus=1)
+    assert (plan.gpus, plan.gpu_memory_utilization) == (1, 0.93)
+    assert plan.kv_cache_gib >= 4 * 1600 * profile(1).kv_bytes_per_token('half') / GIB
+
+
+def test_tensor_parallelism_divides_the_attention_heads():
+    # 30 GiB of weights need 4 GPUs, which 6 heads can't be split over
+    assert plan_job(profile(15 * GIB, heads=8), 'half', 2048, 16, 4).gpus == 4
+    with pytest.raises(ValueError, match='more than 4 16 GiB GPUs'):
+        plan_job(profile(15 * GIB, heads=6), 'half', 2048, 16, 4)
+
+
+def test_partitions():
+    assert partition_gpus('teaching') == (16.0, 4)
+    assert partition_gpus('dgxh100') == (80.0, 8)
+    assert partition_gpus('dgx', gpu_memory_gb=40) == (40.0, 8)
+    assert partition_gpus('unknown') == (16.0, 4)
+
+
+def test_jobs_are_sized_on_launch(launch):
+    llm = launch(partition='dgxh100', max_model_len='auto')
+    cfg = llm.manager.config_dict
+    assert (cfg['gpus'], cfg['max_model_len'], cfg['gpu_memory_utilization']) == (1, 8192, 0.90)
+    assert '-tp 1 ' in llm.manager.engine_args()
+    # explicit settings are kept
+    llm = launch(job_name='fixed', gpus=4, max_model_len=1024)
+    assert (llm.manager.config_dict['gpus'], llm.manager.sizing) == (4, None)
@@ -0,0 +1,38 @@
+"""
+Smoke tests: a RosieLLM launched against the local fake of Rosie (rosiellm.RosieMock) sends real requests through
+the installed openai client, the routed transports and the shared connection pool.
+
+Run with:
+    python -m pytest tests
+"""
+import asyncio
+
+import pytest
+
+
+def test_chat_completion(launch):
+    llm = launch()
+    completion = llm.chat.completions.create(model=llm.model, messages=[{'role': 'user', 'content': 'hi'}],
+                                             max_tokens=3)
+    assert completion.choices[0].message.content == 'token token token'
+    with llm.chat.completions.create(model=llm.model, messages=[], max_tokens=2, stream=True) as stream:
+        assert [chunk.choices[0].delta.content for chunk in stream if chunk.choices][:2] == ['token', ' token']
+    assert llm.in_flight == 0
+
+
+def test_async_chat_completion(launch):
+    llm = launch()
+
+    async def request():
+        client = llm.create_openai_client(async_client=True)
+        return await client.chat.completions.create(model=llm.model, messages=[], max_tokens=2)
+
+    assert asyncio.run(request()).usage.completion_tokens == 2
+
+
+@pytest.mark.parametrize('stream', ['--stream', '--no-stream'])
+def test_bench_mock(stream, capsys):
+    from rosiellm.RosieCLI import main
+
+    assert main(['bench', '--mock', '--requests', '5', '--output-tokens', '4', stream]) == 0
+    assert '5 completed, 0 failed' in capsys.readouterr().out
@@ -0,0 +1,131 @@
+"""
+Tests for the shared SSH connections and credentials in rosiellm.RosieSSH, against the fake cluster.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+import pytest
+
+from rosiellm import RosieSSH as ssh_module
+from rosiellm.RosieSSH import RosieSSH, RosieAuth, SSHConnectionPool
+
+
+@pytest.fixture(autouse=True)
+def clean_pool(monkeypatch):
+    monkeypatch.setattr(SSHConnectionPool, '_auths', {})
+    monkeypatch.setattr(SSHConnectionPool, '_connections', {})
+
+
+@pytest.fixture
+def session(cluster, monkeypatch):
+    # commands the fake cluster doesn't have: `sleep SECONDS` and `lines`, which writes a few lines in pieces
+    def sleep(args):
+        time.sleep(float(args[0]))
+        return '', '', 0
+
+    monkeypatch.setattr(cluster, '_cmd_sleep', sleep, raising=False)
+    monkeypatch.setattr(cluster, '_cmd_lines', lambda args: ('one\r\ntwo\n\nthree', 'warning\n', 3), raising=False)
+    ssh = RosieSSH(cluster.username, cluster.address, rosie_auth=RosieAuth(cluster.username, cluster.password))
+    ssh.connect()
+    yield ssh
+    ssh.close()
+
+
+def test_sessions_share_one_connection(cluster):
+    auth = RosieAuth(cluster.username, cluster.password)
+    first = RosieSSH(cluster.username, cluster.address, rosie_auth=auth)
+    second = RosieSSH(cluster.username, cluster.address, rosie_auth=auth)
+    first.connect()
+    second.connect()
+    assert first.connection is second.connection and first.connection.refcount == 2
+    assert second.run_command('squeue -h').ok
+    first.close()
+    assert second.connection.refcount == 1 and second.connection.is_active()
+    second.close()
+    assert SSHConnectionPool._connections == {}
+
+
+def test_password_prompt_does_not_block_the_pool(monkeypatch):
+    typing = threading.Event()
+    typed = threading.Event()
+
+    class SlowAuth:
+        created = 0
+
+        def __init__(self, username):
+            SlowAuth.created += 1
+            self.timings = {}
+            typing.set()
+            typed.wait(5)
+
+    monkeypatch.setattr(ssh_module, 'RosieAuth', SlowAuth)
+    results = []
+    prompts = [threading.Thread(target=lambda: results.append(SSHConnectionPool.get_auth('a'))) for _ in range(2)]
+    for thread in prompts:
+        thread.start()
+    assert typing.wait(5)
+    # other users' credentials and connections are usable while the password is typed
+    done = threading.Event()
+    threading.Thread(target=lambda: (SSHConnectionPool.set_auth('b', object()), SSHConnectionPool.release('b', 'h'),
+                                     done.set())).start()
+    assert done.wait(1)
+    typed.set()
+    for thread in prompts:
+        thread.join(5)
+    assert SlowAuth.created == 1 and results[0] is results[1]
+
+
+def test_wrong_password_does_not_fail_over(cluster, monkeypatch):
+    hosts = []
+    acquire = SSHConnectionPool.acquire.__func__
+
+    def counting_acquire(cls, username, host, get_password):
+        hosts.append(host)
+        return acquire(cls, username, host, get_password)
+
+    monkeypatch.setattr(SSHConnectionPool, 'acquire', classmethod(counting_acquire))
+    session = RosieSSH(cluster.username, cluster.address, fallback_hosts=[cluster.address, cluster.address],
+                       rosie_auth=RosieAuth(cluster.username, 'wrong'))
+    with pytest.raises(paramiko.AuthenticationException):
+        session.connect()
+    assert hosts == [cluster.address]
+
+
+def test_commands_report_their_output_and_exit_status(session):
+    lines = []
+    result = session.run_command('lines', on_line=lambda stream, line: lines.append((stream, line)))
+    assert (result.stdout, result.stderr, result.exit_status, result.ok) == ('one\r\ntwo\n\nthree', 'warning\n', 3, False)
+    assert sorted(lines) == [('stderr', 'warning'), ('stdout', ''), ('stdout', 'one'), ('stdout', 'three'), ('stdout', 'two')]
+    assert [line for stream, line in lines if stream == 'stdout'] == ['one', 'two', '', 'three']
+    assert sorted(session.stream_command('lines')) == sorted(line for _, line in lines)
+    missing = session.run_command('nonexistent --flag')
+    assert missing.exit_status == 127 and 'command not found' in missing.output
+    assert session.execute_command('mkdir -p /data') == ''
+
+
+def test_commands_run_concurrently(session):
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: session.run_command('sleep 0.5'), range(4)))
+    assert all(result.ok for result in results)
+    assert time.time() - start < 1.5
+    assert session._channels == set()
+
+
+def test_silent_commands_time_out(session):
+    with pytest.raises(TimeoutError):
+        session.run_command('sleep 2', timeout=0.3)
+    assert session._channels == set()
+
+
+def test_cancel_ends_running_commands(session, cluster):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(session.run_command('sleep 5')))
+    thread.start()
+    while 'sleep 5' not in cluster.commands:
+        time.sleep(0.01)
+    session.cancel()
+    thread.join(2)
+    assert not thread.is_alive() and not results[0].ok
@@ -0,0 +1,83 @@
+"""
+Tests for model weight staging (rosiellm.RosieStaging): the shared manifest, copies to node-local scratch, and script uploads.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rosiellm import RosieStaging
+from rosiellm.RosieSSH import RosieSSH, RosieAuth
+from rosiellm.RosieStaging import COMPLETE_MARKER, copy_to_local, load_manifest, stage, update_manifest, upload_script
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / 'shared' / 'abc123'
+    (path / 'nested').mkdir(parents=True)
+    files = {'model.safetensors': b'w' * 1000, 'config.json': b'{}', 'nested/tokenizer.json': b't' * 10}
+    for name, content in files.items():
+        (path / name).write_bytes(content)
+    return {'commit': 'abc123', 'path': str(path), 'files': {name: len(content) for name, content in files.items()}}
+
+
+def test_manifest_updates_keep_other_entries(tmp_path):
+    path = str(tmp_path / 'manifest.json')
+    assert load_manifest(path) == {'models': {}, 'containers': {}}
+    update_manifest(path, 'models', 'a@main', {'bytes': 1})
+    update_manifest(path, 'containers', 'vllm.sif', {'vllm': '0.6'})
+    update_manifest(path, 'models', 'b@main', {'bytes': 2})
+    assert load_manifest(path) == {'models': {'a@main': {'bytes': 1}, 'b@main': {'bytes': 2}},
+                                   'containers': {'vllm.sif': {'vllm': '0.6'}}}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+
+
+def test_weights_are_copied_once(tmp_path, snapshot):
+    stage_dir = str(tmp_path / 'scratch')
+    os.makedirs(stage_dir)
+    local = copy_to_local(snapshot, stage_dir, workers=2)
+    assert local == os.path.join(stage_dir, 'abc123') and os.path.exists(os.path.join(local, COMPLETE_MARKER))
+    for name, size in snapshot['files'].items():
+        assert os.path.getsize(os.path.join(local, name)) == size
+    # the marker makes later jobs on the node skip the copy
+    os.remove(os.path.join(snapshot['path'], 'model.safetensors'))
+    assert copy_to_local(snapshot, stage_dir) == local
+
+
+def test_partial_copies_are_resumed(tmp_path, snapshot):
+    stage_dir = tmp_path / 'scratch'
+    (stage_dir / 'abc123').mkdir(parents=True)
+    # a job was killed after copying the config but part way through the weights
+    (stage_dir / 'abc123' / 'config.json').write_bytes(b'{}')
+    (stage_dir / 'abc123' / 'model.safetensors').write_bytes(b'w' * 10)
+    os.remove(os.path.join(snapshot['path'], 'config.json'))
+    local = copy_to_local(snapshot, str(stage_dir))
+    assert os.path.getsize(os.path.join(local, 'model.safetensors')) == 1000
+
+
+def test_weights_load_from_shared_storage_without_local_space(tmp_path, snapshot, monkeypatch):
+    monkeypatch.setattr(RosieStaging, '_evict', lambda stage_dir, needed, keep: False)
+    assert copy_to_local(snapshot, str(tmp_path)) == snapshot['path']
+
+
+def test_local_models_are_not_staged(tmp_path):
+    assert stage(str(tmp_path), None, 'unused', 'unused', 'unused') == str(tmp_path)
+
+
+def test_concurrent_uploads(cluster, tmp_path):
+    # pool replicas upload the same script from threads of one process
+    script = tmp_path / 'RosieScript.py'
+    script.write_text('print("hello")\n')
+    ssh = RosieSSH(cluster.username, cluster.address, rosie_auth=RosieAuth(cluster.username, cluster.password))
+    ssh.connect()
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            paths = set(executor.map(lambda _: upload_script(ssh, str(script), '/staging'), range(8)))
+    finally:
+        ssh.close()
+    assert len(paths) == 1
+    remote_path = paths.pop()
+    assert remote_path.startswith('/staging/RosieScript-')
+    with open(cluster.local_path(remote_path)) as f:
+        assert f.read() == 'print("hello")\n'
+    assert os.listdir(cluster.local_path('/staging')) == [os.path.basename(remote_path)]
@@ -0,0 +1,57 @@
+"""
+Tests for timing launch phases (rosiellm.RosieTiming) and the launch report.
+"""
+from rosiellm.RosieTiming import LAUNCH_MILESTONES, MILESTONE_PHASES, LaunchTimer
+
+
+def test_phases_are_timed_and_summed():
+    timer = LaunchTimer()
+    timer.record('sftp_upload', 0.25)
+    timer.record('sftp_upload', 0.5)
+    with timer.phase('ssh_connect'):
+        pass
+    phases = timer.report()['phases']
+    assert phases['sftp_upload'] == 0.75 and 0 <= phases['ssh_connect'] < 1
+    assert timer.summary().splitlines()[0] == 'sftp_upload     0.750s'
+
+
+def test_milestones_become_phases():
+    timer = LaunchTimer()
+    timer.start = 100.0
+    timer.mark('submitted', 101.0)
+    timer.mark('scheduled', 111.0)
+    # the job was RUNNING before the first poll saw it, and vLLM's lines were missed
+    timer.mark('job_started', 112.5)
+    timer.mark('server_started', 140.0)
+    timer.mark('scheduled', 150.0)
+    report = timer.report()
+    assert report['phases'] == {'queue_wait': 10.0, 'job_start': 1.5, 'server_start': 27.5}
+    assert report['milestones'] == {'submitted': 1.0, 'scheduled': 11.0, 'job_started': 12.5, 'server_started': 40.0}
+    assert report['total'] == 40.0
+
+
+def test_the_metrics_hook_sees_every_phase():
+    seen = []
+
+    def hook(name, seconds):
+        seen.append((name, seconds))
+        raise RuntimeError('metrics backend is down')
+
+    timer = LaunchTimer(hook)
+    timer.record('key_derivation', 0.5)
+    timer.mark('submitted', 10.0)
+    timer.mark('scheduled', 12.0)
+    timer.mark('unknown', 13.0)
+    assert seen == [('key_derivation', 0.5), ('queue_wait', 2.0)]
+
+
+def test_launches_are_timed(launch):
+    seen = []
+    llm = launch(metrics_hook=lambda name, seconds: seen.append(name))
+    report = llm.launch_report()
+    assert list(report['milestones']) == list(LAUNCH_MILESTONES)
+    # client-side steps first, then every phase between milestones
+    assert {'sbatch_render', 'sftp_upload', 'sbatch_submit'} <= set(report['phases'])
+    assert list(report['phases'])[-len(MILESTONE_PHASES):] == list(MILESTONE_PHASES.values())
+    assert all(seconds >= 0 for seconds in report['phases'].values())
+    assert set(seen) == set(report['phases'])